@@ -147,6 +147,22 @@ try:
 except Exception as e:
     print(f"⚠️  API routes registration failed: {e}")
 
+# 注册 prompt 提交钩子（根据工作流图提前准备模型）
+try:
+    from .core.prefetch import install_prompt_hook
+    if install_prompt_hook():
+        print("✅ Model prefetch planner registered")
+except Exception as e:
+    print(f"⚠️  Model prefetch planner registration failed: {e}")
+
+# 启动预热：按使用历史在后台加载常用模型（GGUF_VLM_WARM_POOL=N 开启）
+try:
+    from .core.usage_history import start_warm_pool
+    if start_warm_pool():
+        print("✅ Warm pool restore started in background")
+except Exception as e:
+    print(f"⚠️  Warm pool restore failed to start: {e}")
+
 print(f"📦 ComfyUI-GGUF-VLM loaded: {len(NODE_CLASS_MAPPINGS)} nodes available")
 
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS', 'WEB_DIRECTORY']
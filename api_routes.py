@@ -8,7 +8,9 @@ from aiohttp import web
 from server import PromptServer
 from .core.inference.nexa_engine import get_nexa_engine
 from .core.model_loader import ModelLoader
-from .utils.registry import RegistryManager
+from .core.model_catalog import get_vision_model_catalog, get_text_model_catalog
+from .core.cache_manager import get_cache_manager
+from .utils.registry import get_registry_manager
 
 
 # 注册 API 路由
@@ -74,40 +76,14 @@ async def refresh_local_vision_models(request):
         JSON: {"success": bool, "models": list, "error": str}
     """
     try:
-        # 创建加载器和注册表
+        # 创建加载器，使用共享的注册表实例
         loader = ModelLoader()
-        registry = RegistryManager()
+        registry = get_registry_manager()
         
-        # 获取所有本地模型
-        all_local_models = loader.list_models()
-        print(f"📦 Found {len(all_local_models)} local GGUF files")
-        
-        # 过滤视觉模型
-        local_models = []
-        for model_file in all_local_models:
-            model_info = registry.find_model_by_filename(model_file)
-            # 如果是视觉模型或未知模型（可能是视觉模型）
-            if model_info is None or model_info.get('business_type') in ['image_analysis', 'video_analysis']:
-                local_models.append(model_file)
-        
-        # 获取可下载的模型
-        image_models = registry.get_downloadable_models(business_type='image_analysis', model_loader=loader)
-        video_models = registry.get_downloadable_models(business_type='video_analysis', model_loader=loader)
-        
-        # 构建分类列表
-        categorized_models = []
-        
-        if image_models:
-            categorized_models.append("--- 🖼️ 图像分析模型 ---")
-            categorized_models.extend([name for name, _ in image_models])
-        
-        if video_models:
-            categorized_models.append("--- 🎥 视频分析模型 ---")
-            categorized_models.extend([name for name, _ in video_models])
-        
-        if local_models:
-            categorized_models.append("--- 💾 本地模型 ---")
-            categorized_models.extend(local_models)
+        # 手动刷新时强制校验一次目录签名，目录未变化时直接返回缓存的列表
+        get_cache_manager().invalidate()
+        categorized_models = get_vision_model_catalog(loader, registry)
+        print(f"📦 Vision model catalog: {len(categorized_models)} entries")
         
         if not categorized_models:
             return web.json_response({
@@ -140,61 +116,14 @@ async def refresh_local_text_models(request):
         JSON: {"success": bool, "models": list, "error": str}
     """
     try:
-        # 创建加载器和注册表
+        # 创建加载器，使用共享的注册表实例
         loader = ModelLoader()
-        registry = RegistryManager()
-        
-        # 获取所有本地模型
-        all_local_models = loader.list_models()
-        print(f"📦 Found {len(all_local_models)} local GGUF files")
-        
-        # 视觉模型关键词列表（用于排除）
-        vision_keywords = [
-            'llava', 'vision', 'multimodal', 'mm', 
-            'clip', 'minicpm-v', 'phi-3-vision', 
-            'internvl', 'cogvlm', 'mmproj'
-        ]
-        
-        # 特定的视觉模型模式
-        vision_patterns = [
-            'qwen-vl', 'qwen2-vl', 'qwen2.5-vl', 'qwen3-vl',
-            '-vl-', '_vl_', '.vl.',
-        ]
-        
-        # 过滤文本模型
-        local_models = []
-        for model_file in all_local_models:
-            model_lower = model_file.lower()
-            
-            # 首先检查registry信息
-            model_info = registry.find_model_by_filename(model_file)
-            if model_info:
-                business_type = model_info.get('business_type')
-                if business_type == 'text_generation':
-                    local_models.append(model_file)
-                    continue
-                elif business_type in ['image_analysis', 'video_analysis']:
-                    continue
-            
-            # 使用关键词过滤
-            is_vision_model = False
-            for pattern in vision_patterns:
-                if pattern in model_lower:
-                    is_vision_model = True
-                    break
-            
-            if not is_vision_model:
-                is_vision_model = any(keyword in model_lower for keyword in vision_keywords)
-            
-            if not is_vision_model:
-                local_models.append(model_file)
-        
-        # 获取可下载的文本模型
-        downloadable = registry.get_downloadable_models(business_type='text_generation', model_loader=loader)
-        downloadable_names = [name for name, _ in downloadable]
+        registry = get_registry_manager()
         
-        # 合并列表
-        all_models = local_models + downloadable_names
+        # 手动刷新时强制校验一次目录签名，目录未变化时直接返回缓存的列表
+        get_cache_manager().invalidate()
+        all_models = get_text_model_catalog(loader, registry)
+        print(f"📦 Text model catalog: {len(all_models)} entries")
         
         if not all_models:
             return web.json_response({
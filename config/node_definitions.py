@@ -114,6 +114,20 @@ SYSTEM_PROMPT_INPUT = {
     )
 }
 
+# 思考 token 预算 - 统一定义（可选）
+THINKING_BUDGET_INPUT = {
+    "thinking_budget": (
+        "INT",
+        {
+            "default": -1,
+            "min": -1,
+            "max": 32768,
+            "step": 1,
+            "tooltip": "推理模型 <think> 块的最大 token 数（-1=不限制，0=跳过思考；关闭 enable_thinking 不会改变预算，需要时显式设为 0）；本地/Transformers 模型超出后强制结束思考并继续生成答案，远程 API 超出后停止请求"
+        }
+    )
+}
+
 # ============================================================================
 # 统一的输出类型定义
 # ============================================================================
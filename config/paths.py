@@ -26,6 +26,12 @@ class PathConfig:
     # VAE 模型目录
     VAE_MODELS_DIR = "LLM/GGUF"
     
+    # 插件缓存目录名（模型索引等持久化数据）
+    CACHE_DIR_NAME = "gguf-vlm"
+    
+    # KV 状态快照目录（体积较大，放在模型目录下）
+    KV_CACHE_DIR = "LLM/kv_cache"
+    
     # ============================================================================
     # 辅助方法
     # ============================================================================
@@ -64,6 +70,34 @@ class PathConfig:
         """
         return folder_paths.get_folder_paths("clip")[0]
     
+    @classmethod
+    def get_cache_dir(cls):
+        """
+        获取插件的持久化缓存目录（位于 ComfyUI user 目录下）
+        
+        Returns:
+            缓存目录的绝对路径
+        """
+        try:
+            base_path = folder_paths.get_user_directory()
+        except Exception:
+            base_path = os.path.join(folder_paths.models_dir, "LLM")
+        path = os.path.join(base_path, cls.CACHE_DIR_NAME)
+        os.makedirs(path, exist_ok=True)
+        return path
+    
+    @classmethod
+    def get_kv_cache_dir(cls):
+        """
+        获取 KV 状态快照目录的完整路径（前缀缓存的磁盘层）
+        
+        Returns:
+            KV 状态快照目录的绝对路径
+        """
+        path = os.path.join(folder_paths.models_dir, cls.KV_CACHE_DIR)
+        os.makedirs(path, exist_ok=True)
+        return path
+    
     @classmethod
     def get_model_path(cls, model_type, model_name):
         """
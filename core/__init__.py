@@ -3,7 +3,14 @@ Core module for GGUF model management
 """
 
 from .model_loader import ModelLoader
-from .inference_engine import InferenceEngine
-from .cache_manager import CacheManager
+from .inference_engine import InferenceEngine, get_inference_engine
+from .cache_manager import CacheManager, get_cache_manager
+from .model_index import ModelIndex, get_model_index
+from .model_pool import ModelPool, get_model_pool
+from .load_spec import LoadSpec
+from .prefix_cache import PrefixCache, get_prefix_cache
+from .response_cache import ResponseCache, get_response_cache
 
-__all__ = ['ModelLoader', 'InferenceEngine', 'CacheManager']
+__all__ = ['ModelLoader', 'InferenceEngine', 'get_inference_engine', 'CacheManager', 'get_cache_manager', 'ModelIndex', 'get_model_index',
+           'ModelPool', 'get_model_pool', 'LoadSpec', 'PrefixCache', 'get_prefix_cache',
+           'ResponseCache', 'get_response_cache']
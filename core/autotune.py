@@ -0,0 +1,573 @@
+"""
+Autotune - llama.cpp 加载参数自动调优
+在本机对指定 GGUF 模型运行简短的预填充（prompt processing）和生成（token generation）基准测试，
+在一个小的参数网格上选出最快的 n_gpu_layers / n_batch / n_ubatch / 线程数 / KV 缓存类型，
+按 (模型哈希, 主机指纹, 加载档位, n_ctx) 保存；加载器节点之后以相同档位和上下文长度加载同一模型时自动使用
+"""
+
+import hashlib
+import json
+import os
+import platform
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .load_spec import DEFAULT_KV_TYPE, GGML_TYPES, LoadSpec, get_load_profile
+    from .model_pool import estimate_kv_bytes, split_allocations
+except ImportError:
+    from core.load_spec import DEFAULT_KV_TYPE, GGML_TYPES, LoadSpec, get_load_profile
+    from core.model_pool import estimate_kv_bytes, split_allocations
+
+try:
+    from ..config.paths import PathConfig
+    from ..models.text_models import fit_context_to_metadata
+    from ..utils.device_optimizer import detect_cpu_topology
+    from ..utils.file_store import file_fingerprint, load_json, save_json
+    from ..utils.gguf_reader import get_gguf_metadata
+    from ..utils.offload_planner import plan_gpu_layers
+except (ImportError, ValueError):
+    from config.paths import PathConfig
+    from models.text_models import fit_context_to_metadata
+    from utils.device_optimizer import detect_cpu_topology
+    from utils.file_store import file_fingerprint, load_json, save_json
+    from utils.gguf_reader import get_gguf_metadata
+    from utils.offload_planner import plan_gpu_layers
+
+# ComfyUI 的中断异常（不在 ComfyUI 中运行时使用占位类型）
+try:
+    from comfy.model_management import InterruptProcessingException
+except ImportError:
+    class InterruptProcessingException(Exception):
+        pass
+
+
+AUTOTUNE_FILE = "autotune.json"
+
+# 环境变量：设为 0 时加载器节点不使用已保存的调优结果
+AUTOTUNE_ENV = "GGUF_VLM_AUTOTUNE"
+
+# 调优结果中会应用到加载参数的字段
+TUNED_FIELDS = ('n_gpu_layers', 'n_batch', 'n_ubatch', 'n_threads', 'n_threads_batch', 'type_k', 'type_v')
+
+# 参数网格（quick：常用取值；full：更大的范围）
+GRIDS = {
+    'quick': {
+        'n_batch': [512, 1024],
+        'n_ubatch': [256, 512],
+        'kv': [('f16', 'f16')],
+    },
+    'full': {
+        'n_batch': [256, 512, 1024, 2048],
+        'n_ubatch': [128, 256, 512, 1024],
+        'kv': [('f16', 'f16'), ('q8_0', 'f16')],
+    },
+}
+
+
+def _check_interrupted():
+    """ComfyUI 请求中断当前执行时抛出 InterruptProcessingException（不在 ComfyUI 中运行时不做任何事）"""
+    try:
+        import comfy.model_management
+    except ImportError:
+        return
+    comfy.model_management.throw_exception_if_processing_interrupted()
+
+
+def host_fingerprint() -> str:
+    """
+    主机指纹：CPU 架构与可用核心、GPU 型号与显存、llama-cpp-python 版本
+    
+    不包含主机名（容器每次启动可能不同）
+    
+    Returns:
+        十六进制指纹（16 位）
+    """
+    topology = detect_cpu_topology()
+    info: Dict[str, Any] = {
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'processor': platform.processor(),
+        'cpus': [topology['logical'], topology['physical'], topology['quota'], topology['numa_nodes']],
+    }
+    try:
+        import torch
+        if torch.cuda.is_available():
+            info['gpus'] = [
+                [torch.cuda.get_device_name(i), torch.cuda.get_device_properties(i).total_memory]
+                for i in range(torch.cuda.device_count())
+            ]
+    except Exception:
+        pass
+    try:
+        import llama_cpp
+        info['llama_cpp'] = getattr(llama_cpp, '__version__', None)
+        info['gpu_offload'] = bool(llama_cpp.llama_supports_gpu_offload())
+    except Exception:
+        pass
+    return hashlib.sha256(json.dumps(info, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _gpu_offload_supported() -> bool:
+    try:
+        import llama_cpp
+        return bool(llama_cpp.llama_supports_gpu_offload())
+    except Exception:
+        return False
+
+
+def _profile_kv(profile) -> Optional[Tuple[str, str]]:
+    """加载档位固定的 KV 缓存类型（档位使用默认 f16 时返回 None，可以调优）"""
+    if profile.type_k == DEFAULT_KV_TYPE and profile.type_v == DEFAULT_KV_TYPE:
+        return None
+    return profile.type_k, profile.type_v
+
+
+def _fewer_layers(n_gpu_layers: int, limit: int) -> bool:
+    """n_gpu_layers 是否不多于 limit（-1 表示全部层）"""
+    if limit < 0:
+        return True
+    return 0 <= n_gpu_layers <= limit
+
+
+def _workload_seconds(pp_tps: float, tg_tps: float, pp_tokens: int, tg_tokens: int) -> float:
+    """参考负载（pp_tokens 预填充 + tg_tokens 生成）的耗时，越小越好"""
+    if not pp_tps or not tg_tps:
+        return float('inf')
+    return pp_tokens / pp_tps + tg_tokens / tg_tps
+
+
+class Autotuner:
+    """llama.cpp 加载参数自动调优器"""
+    
+    def __init__(self, path: str = None):
+        """
+        初始化调优器
+        
+        Args:
+            path: 调优结果文件路径，None 时只保存在内存中
+        """
+        self.path = path
+        self._results: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._host = None
+        self._load()
+    
+    # ------------------------------------------------------------------
+    # 结果存储
+    # ------------------------------------------------------------------
+    
+    def _load(self):
+        self._results = load_json(self.path, 'results', "autotune results")
+    
+    def _save(self):
+        """保存到磁盘（调用方持有 _lock）"""
+        save_json(self.path, 'results', self._results, "autotune results")
+    
+    @property
+    def host(self) -> str:
+        if self._host is None:
+            self._host = host_fingerprint()
+        return self._host
+    
+    def _prefix(self, model_path: str) -> str:
+        fingerprint = file_fingerprint(model_path)
+        if fingerprint is None:
+            raise FileNotFoundError(f"Cannot read model file: {model_path}")
+        return f"{fingerprint[:16]}@{self.host}"
+    
+    def _key(self, model_path: str, profile: str, n_ctx: int) -> str:
+        return f"{self._prefix(model_path)}/{profile}/{int(n_ctx)}"
+    
+    def lookup(self, model_path: str, profile: str = None, n_ctx: int = 8192) -> Optional[Dict]:
+        """
+        查找模型在本机的调优结果
+        
+        只返回在相同加载档位和上下文长度下测得的结果（档位决定批大小上限和 KV 类型，
+        上下文长度决定 KV 缓存大小和可卸载的层数）
+        
+        Args:
+            model_path: 模型文件路径
+            profile: 加载档位名（None 表示默认档位）
+            n_ctx: 上下文长度
+        
+        Returns:
+            调优后的加载参数（TUNED_FIELDS），没有结果时返回 None
+        """
+        if not self._results:
+            return None
+        try:
+            key = self._key(model_path, get_load_profile(profile).name, n_ctx)
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            entry = self._results.get(key)
+        return dict(entry['params']) if entry else None
+    
+    def save(self, model_path: str, result: Dict):
+        """保存调优结果"""
+        entry = {
+            'model': os.path.basename(model_path),
+            'profile': result['profile'],
+            'n_ctx': result['n_ctx'],
+            'params': {name: result['params'][name] for name in TUNED_FIELDS if name in result['params']},
+            'pp_tps': result.get('pp_tps'),
+            'tg_tps': result.get('tg_tps'),
+            'created': time.time(),
+        }
+        key = self._key(model_path, result['profile'], result['n_ctx'])
+        with self._lock:
+            self._results[key] = entry
+            self._save()
+    
+    def forget(self, model_path: str) -> bool:
+        """删除模型在本机的全部调优结果（所有档位和上下文长度）"""
+        prefix = f"{self._prefix(model_path)}/"
+        with self._lock:
+            keys = [key for key in self._results if key.startswith(prefix)]
+            if not keys:
+                return False
+            for key in keys:
+                del self._results[key]
+            self._save()
+            return True
+    
+    # ------------------------------------------------------------------
+    # 基准测试
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def benchmark(llm: Any, params: Dict, pp_tokens: int = 512, tg_tokens: int = 64) -> Tuple[float, float]:
+        """
+        在与已加载模型共享权重的独立上下文中测量预填充和生成速度（与 llama-bench 的 pp / tg 测试相同）
+        
+        Args:
+            llm: 已加载的 Llama 实例
+            params: n_batch, n_ubatch, n_threads, n_threads_batch, type_k, type_v
+            pp_tokens: 预填充 token 数
+            tg_tokens: 生成 token 数
+        
+        Returns:
+            (预填充 tokens/s, 生成 tokens/s)
+        """
+        from llama_cpp import _internals as internals
+        
+        n_batch = params['n_batch']
+        n_ctx = pp_tokens + tg_tokens + 1
+        context_params = type(llm.context_params).from_buffer_copy(llm.context_params)
+        fields = {
+            'n_ctx': n_ctx,
+            'n_batch': n_batch,
+            'n_ubatch': min(params['n_ubatch'], n_batch),
+            'n_seq_max': 1,
+            'n_threads': params['n_threads'],
+            'n_threads_batch': params['n_threads_batch'],
+            'type_k': GGML_TYPES[params['type_k']],
+            'type_v': GGML_TYPES[params['type_v']],
+            'logits_all': False,
+            'embeddings': False,
+        }
+        for name, value in fields.items():
+            if hasattr(context_params, name):
+                setattr(context_params, name, value)
+        
+        ctx = internals.LlamaContext(model=llm._model, params=context_params, verbose=False)
+        batch = internals.LlamaBatch(n_tokens=n_batch, embd=0, n_seq_max=1, verbose=False)
+        rng = random.Random(0)
+        n_vocab = llm.n_vocab()
+        
+        def decode(tokens: List[int], start: int):
+            for offset in range(0, len(tokens), n_batch):
+                chunk = tokens[offset:offset + n_batch]
+                batch.reset()
+                b = batch.batch
+                for i, token in enumerate(chunk):
+                    b.token[i] = token
+                    b.pos[i] = start + offset + i
+                    b.seq_id[i][0] = 0
+                    b.n_seq_id[i] = 1
+                    b.logits[i] = i == len(chunk) - 1
+                b.n_tokens = len(chunk)
+                ctx.decode(batch)
+        
+        try:
+            # 预热（分配计算缓冲区），不计时
+            decode([rng.randrange(n_vocab)], 0)
+            ctx.kv_cache_seq_rm(0, -1, -1)
+            
+            start = time.perf_counter()
+            decode([rng.randrange(n_vocab) for _ in range(pp_tokens)], 0)
+            pp_time = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            for i in range(tg_tokens):
+                decode([rng.randrange(n_vocab)], pp_tokens + i)
+            tg_time = time.perf_counter() - start
+        finally:
+            batch.close()
+            ctx.close()
+        
+        return (pp_tokens / pp_time if pp_time > 0 else 0.0,
+                tg_tokens / tg_time if tg_time > 0 else 0.0)
+    
+    def _gpu_layer_candidates(self, model_path: str, mode: str, spec: LoadSpec) -> List[int]:
+        """
+        n_gpu_layers 候选值（每个取值都需要重新加载权重）
+        
+        上限为卸载规划器在该上下文长度和 KV 类型下给出的层数，不测试放不下的取值
+        """
+        if not _gpu_offload_supported():
+            return [0]
+        plan = plan_gpu_layers(
+            model_path, n_ctx=spec.n_ctx, type_k=spec.type_k, type_v=spec.type_v,
+            n_ubatch=spec.thread_kwargs()['n_ubatch'], flash_attn=spec.flash_attn,
+        )
+        planned = plan.n_gpu_layers if plan is not None else -1
+        if mode == 'quick':
+            return [planned]
+        if planned >= 0:
+            layers = planned
+        else:
+            metadata = get_gguf_metadata(model_path)
+            layers = metadata.block_count if metadata is not None else None
+        candidates = [planned]
+        if layers:
+            candidates.append(layers // 2)
+        candidates.append(0)
+        return list(dict.fromkeys(candidates))
+    
+    @staticmethod
+    def _thread_candidates(base: Dict, mode: str) -> List[Tuple[int, int]]:
+        """(n_threads, n_threads_batch) 候选值"""
+        n_threads, n_threads_batch = base['n_threads'], base['n_threads_batch']
+        candidates = [(n_threads, n_threads_batch)]
+        if mode == 'full':
+            candidates += [(max(1, n_threads // 2), n_threads_batch), (n_threads, n_threads)]
+        return list(dict.fromkeys(candidates))
+    
+    def tune(
+        self,
+        model_path: str,
+        mode: str = 'quick',
+        pp_tokens: int = 512,
+        tg_tokens: int = 64,
+        n_ctx: int = 8192,
+        profile: str = None,
+        save: bool = True,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Dict:
+        """
+        对模型运行基准测试并选出最快的加载参数
+        
+        依次调优 n_gpu_layers、n_batch、n_ubatch、线程数和 KV 缓存类型（坐标下降：每一轴在其余参数
+        取当前最优值的情况下比较），评分为参考负载（pp_tokens 预填充 + tg_tokens 生成）的耗时
+        
+        Args:
+            model_path: GGUF 模型文件路径
+            mode: 'quick'（少量常用取值）或 'full'（完整网格，包括部分 GPU 卸载和量化 K 缓存）
+            pp_tokens: 预填充测试的 token 数
+            tg_tokens: 生成测试的 token 数
+            n_ctx: 加载模型时使用的上下文长度（决定可卸载的层数，结果只用于以相同 n_ctx 加载的模型；
+                测试使用独立的小上下文）
+            profile: 加载档位（批大小不超过档位上限，档位固定 KV 类型时不调优 KV 类型）
+            save: 是否保存结果（加载器节点之后自动使用）
+            on_progress: 进度回调 (已完成次数, 总次数)
+        
+        Returns:
+            {'params', 'profile', 'n_ctx', 'pp_tps', 'tg_tps', 'seconds', 'trials': [...]}
+        """
+        try:
+            from .inference_engine import get_inference_engine
+        except ImportError:
+            from core.inference_engine import get_inference_engine
+        
+        if mode not in GRIDS:
+            raise ValueError(f"Unknown autotune mode: {mode} (available: {', '.join(GRIDS)})")
+        grid = GRIDS[mode]
+        load_profile = get_load_profile(profile)
+        # 与加载器节点一样把上下文长度限制在模型训练长度内，保证结果能按 n_ctx 匹配
+        n_ctx = fit_context_to_metadata(int(n_ctx), get_gguf_metadata(model_path))
+        engine = get_inference_engine()
+        
+        base_spec = LoadSpec.from_kwargs(model_path, n_ctx=n_ctx, profile=load_profile.name)
+        gpu_candidates = self._gpu_layer_candidates(model_path, mode, base_spec)
+        best = {'n_batch': base_spec.n_batch, 'type_k': base_spec.type_k, 'type_v': base_spec.type_v}
+        best.update(base_spec.thread_kwargs())
+        thread_candidates = self._thread_candidates(best, mode)
+        
+        # 加载档位限制批大小；档位固定 KV 类型（如 lean 的 q8_0 K 缓存）时不调优 KV 类型
+        batch_candidates = [value for value in grid['n_batch'] if value <= load_profile.n_batch] or [best['n_batch']]
+        kv_candidates = [_profile_kv(load_profile)] if _profile_kv(load_profile) else grid['kv']
+        
+        total = (len(gpu_candidates) + len(batch_candidates) + len(grid['n_ubatch'])
+                 + len(thread_candidates) + len(kv_candidates))
+        trials: List[Dict] = []
+        tested: Dict[tuple, Dict] = {}
+        progress = [0]
+        
+        def advance():
+            progress[0] += 1
+            if on_progress is not None:
+                on_progress(min(progress[0], total), total)
+        
+        def run(llm: Any, params: Dict) -> Dict:
+            """测试一组参数（相同参数只测一次）"""
+            key = tuple(params[name] for name in TUNED_FIELDS)
+            if key in tested:
+                return tested[key]
+            trial = {'params': dict(params)}
+            try:
+                kv_bytes = estimate_kv_bytes(model_path, pp_tokens + tg_tokens + 1, params['type_k'], params['type_v'])
+                engine.loaded_models.make_room(
+                    split_allocations(model_path, {'kv_cache': kv_bytes}, params['n_gpu_layers']),
+                    exclude=(model_path,),
+                )
+                trial['pp_tps'], trial['tg_tps'] = self.benchmark(llm, params, pp_tokens, tg_tokens)
+                trial['seconds'] = _workload_seconds(trial['pp_tps'], trial['tg_tps'], pp_tokens, tg_tokens)
+                print(f"   {self._describe(params)}: pp {trial['pp_tps']:.1f} tok/s, tg {trial['tg_tps']:.1f} tok/s")
+            except Exception as e:
+                trial['error'] = str(e)
+                trial['seconds'] = float('inf')
+                print(f"   {self._describe(params)}: failed ({e})")
+            tested[key] = trial
+            trials.append(trial)
+            return trial
+        
+        def sweep(llm: Any, updates: List[Dict]):
+            """在一个参数轴上比较，保留最优值"""
+            nonlocal best
+            results = []
+            for update in updates:
+                _check_interrupted()
+                results.append((run(llm, {**best, **update}), update))
+                advance()
+            trial, update = min(results, key=lambda item: item[0]['seconds'])
+            if trial['seconds'] != float('inf'):
+                best = {**best, **update}
+        
+        print(f"🎛️  Autotuning {os.path.basename(model_path)} ({mode}, {load_profile.name}, n_ctx {n_ctx}, "
+              f"pp{pp_tokens} / tg{tg_tokens})")
+        start = time.perf_counter()
+        
+        # n_gpu_layers：每个取值需要重新加载权重，在其默认参数下比较
+        gpu_results = []
+        for n_gpu_layers in gpu_candidates:
+            _check_interrupted()
+            params = {**best, 'n_gpu_layers': n_gpu_layers}
+            # 试验性加载不写入使用历史
+            if engine.load_model(model_path, record=False, n_ctx=n_ctx, n_gpu_layers=n_gpu_layers,
+                                 n_batch=best['n_batch'], profile=load_profile.name):
+                with engine.loaded_models.pinned(model_path):
+                    gpu_results.append((run(engine.loaded_models.get(model_path), params), n_gpu_layers))
+            else:
+                print(f"   n_gpu_layers={n_gpu_layers}: load failed")
+            advance()
+        
+        gpu_results = [item for item in gpu_results if item[0]['seconds'] != float('inf')]
+        if not gpu_results:
+            raise RuntimeError(f"Autotune could not load {os.path.basename(model_path)}")
+        best_trial, n_gpu_layers = min(gpu_results, key=lambda item: item[0]['seconds'])
+        best = dict(best_trial['params'])
+        
+        if not engine.load_model(model_path, record=False, n_ctx=n_ctx, n_gpu_layers=n_gpu_layers,
+                                 n_batch=best['n_batch'], profile=load_profile.name):
+            raise RuntimeError(f"Autotune could not reload {os.path.basename(model_path)}")
+        with engine.loaded_models.pinned(model_path):
+            llm = engine.loaded_models.get(model_path)
+            sweep(llm, [{'n_batch': value, 'n_ubatch': min(best['n_ubatch'], value)} for value in batch_candidates])
+            sweep(llm, [{'n_ubatch': value} for value in grid['n_ubatch'] if value <= best['n_batch']])
+            sweep(llm, [{'n_threads': t, 'n_threads_batch': tb} for t, tb in thread_candidates])
+            sweep(llm, [{'type_k': k, 'type_v': v} for k, v in kv_candidates])
+        
+        final = tested[tuple(best[name] for name in TUNED_FIELDS)]
+        result = {
+            'params': {name: best[name] for name in TUNED_FIELDS},
+            'profile': load_profile.name,
+            'n_ctx': n_ctx,
+            'pp_tps': final.get('pp_tps'),
+            'tg_tps': final.get('tg_tps'),
+            'seconds': time.perf_counter() - start,
+            'trials': trials,
+        }
+        print(f"✅ Autotune finished in {result['seconds']:.1f} s: {self._describe(result['params'])}")
+        
+        if save:
+            self.save(model_path, result)
+        return result
+    
+    @staticmethod
+    def _describe(params: Dict) -> str:
+        return (f"ngl={params['n_gpu_layers']} batch={params['n_batch']}/{params['n_ubatch']} "
+                f"threads={params['n_threads']}/{params['n_threads_batch']} kv={params['type_k']}/{params['type_v']}")
+    
+    @staticmethod
+    def format_result(model_path: str, result: Dict) -> str:
+        """格式化调优结果（用于节点输出）"""
+        lines = [f"🎛️ Autotune: {os.path.basename(model_path)} ({len(result['trials'])} trial(s), "
+                 f"{result['seconds']:.1f} s)"]
+        for trial in sorted(result['trials'], key=lambda trial: trial['seconds']):
+            if 'error' in trial:
+                lines.append(f"   ❌ {Autotuner._describe(trial['params'])}: {trial['error']}")
+            else:
+                lines.append(f"   {Autotuner._describe(trial['params'])}: "
+                             f"pp {trial['pp_tps']:.1f} tok/s, tg {trial['tg_tps']:.1f} tok/s")
+        lines.append(f"✅ Best: {Autotuner._describe(result['params'])} "
+                     f"(pp {result['pp_tps']:.1f} tok/s, tg {result['tg_tps']:.1f} tok/s)")
+        return "\n".join(lines)
+
+
+def apply_tuned_params(config: Dict, model_path: str, device: str = "Auto") -> Dict:
+    """
+    把已保存的调优结果合并到加载器节点的模型配置中
+    
+    只使用在相同加载档位和 n_ctx 下测得的结果；调优的 n_gpu_layers 只在 device 为 Auto 且
+    不多于配置中（卸载规划器给出）的层数时使用，档位固定的 KV 类型和批大小上限优先于调优结果
+    
+    Args:
+        config: 模型配置字典（n_ctx, n_gpu_layers, profile, n_batch ...）
+        model_path: 模型文件路径
+        device: 加载器节点的设备选项
+    
+    Returns:
+        合并后的配置（新字典）
+    """
+    if os.environ.get(AUTOTUNE_ENV, "1").strip().lower() in ("0", "false", "no"):
+        return config
+    profile = get_load_profile(config.get('profile'))
+    tuned = get_autotuner().lookup(model_path, profile.name, config.get('n_ctx', 8192))
+    if not tuned:
+        return config
+    
+    n_gpu_layers = tuned.pop('n_gpu_layers', None)
+    if device == "Auto" and n_gpu_layers is not None and _fewer_layers(n_gpu_layers, config.get('n_gpu_layers', -1)):
+        tuned['n_gpu_layers'] = n_gpu_layers
+    if _profile_kv(profile):
+        tuned.pop('type_k', None)
+        tuned.pop('type_v', None)
+    if tuned.get('n_batch', 0) > profile.n_batch:
+        tuned['n_batch'] = profile.n_batch
+    if 'n_ubatch' in tuned:
+        tuned['n_ubatch'] = min(tuned['n_ubatch'], tuned.get('n_batch', profile.n_batch))
+    print("🎛️  Using autotuned parameters: " + ", ".join(f"{k}={v}" for k, v in tuned.items()))
+    return {**config, **tuned}
+
+
+# 全局单例
+_autotuner = None
+_autotuner_lock = threading.Lock()
+
+
+def get_autotuner() -> Autotuner:
+    """获取全局调优器实例"""
+    global _autotuner
+    with _autotuner_lock:
+        if _autotuner is None:
+            path = None
+            try:
+                path = os.path.join(PathConfig.get_cache_dir(), AUTOTUNE_FILE)
+            except Exception as e:
+                print(f"⚠️  Autotune results directory unavailable: {e}")
+            _autotuner = Autotuner(path)
+        return _autotuner
@@ -0,0 +1,351 @@
+"""
+Batch Generation - 多序列并行生成
+在同一个 llama 上下文中为每个 prompt 分配独立的序列 ID（slot），每一步把所有活跃序列的
+token 合并成一个 batch 解码；某个序列结束后立即把下一个 prompt 放入空出的 slot（连续批处理）
+"""
+
+import inspect
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+# 默认并行序列数
+DEFAULT_PARALLEL = 4
+
+# 每个序列的上下文长度按此对齐
+CTX_ALIGN = 256
+
+# 重复惩罚考虑的最近 token 数（与 llama-cpp-python 的 last_n_tokens_size 默认值一致）
+PENALTY_LAST_N = 64
+
+
+def is_supported(llm: Any) -> bool:
+    """
+    检查已加载的 Llama 实例是否提供并行解码所需的内部接口
+    
+    依赖 llama-cpp-python 0.3.x 的 _model / context_params 以及 _internals 中的
+    LlamaContext / LlamaBatch / LlamaSampler
+    """
+    if getattr(llm, '_model', None) is None or getattr(llm, 'context_params', None) is None:
+        return False
+    try:
+        from llama_cpp import _internals as internals
+    except ImportError:
+        return False
+    return all(hasattr(internals, name) for name in ('LlamaContext', 'LlamaBatch', 'LlamaSampler'))
+
+
+def _accepts_argument(func: Callable, name: str) -> bool:
+    """检查函数是否接受指定参数（不同 llama-cpp-python 版本的 _internals 签名不同）"""
+    try:
+        return name in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def per_sequence_ctx(prompt_lengths: Sequence[int], max_tokens: int, n_ctx: int) -> int:
+    """
+    计算每个序列需要的上下文长度（最长 prompt + max_tokens，按 CTX_ALIGN 对齐，不超过模型上下文）
+    
+    Args:
+        prompt_lengths: 各 prompt 的 token 数
+        max_tokens: 最大生成 token 数
+        n_ctx: 模型加载时的上下文长度
+    
+    Returns:
+        每个序列的上下文长度
+    """
+    needed = max(prompt_lengths, default=0) + max_tokens
+    aligned = (needed + CTX_ALIGN - 1) // CTX_ALIGN * CTX_ALIGN
+    return max(CTX_ALIGN, min(aligned, n_ctx))
+
+
+class _Slot:
+    """一个并行序列的状态"""
+    
+    __slots__ = ('seq_id', 'index', 'pending', 'n_past', 'sampler', 'output', 'text', 'next_token', 'logits_index')
+    
+    def __init__(self, seq_id: int, index: int, tokens: List[int], sampler: Any):
+        self.seq_id = seq_id
+        self.index = index
+        self.pending = tokens          # 尚未预填充的 prompt token
+        self.n_past = 0               # 已写入 KV 缓存的位置数
+        self.sampler = sampler
+        self.output: List[int] = []
+        self.text = b""
+        self.next_token: Optional[int] = None
+        self.logits_index: Optional[int] = None
+
+
+class ParallelGenerator:
+    """
+    多序列并行生成器
+    
+    使用与已加载模型共享权重的独立上下文（n_seq_max = 并行数），不影响模型自身的
+    KV 缓存（以及前缀缓存）；每次调用结束后释放该上下文
+    """
+    
+    def __init__(self, llm: Any, n_parallel: int = DEFAULT_PARALLEL):
+        """
+        初始化并行生成器
+        
+        Args:
+            llm: 已加载的 Llama 实例
+            n_parallel: 并行序列数（slot 数）
+        """
+        self.llm = llm
+        self.n_parallel = max(1, int(n_parallel))
+        
+        # 最近一次运行的统计
+        self.stats: Dict = {}
+    
+    def _max_sequences(self) -> int:
+        """llama.cpp 支持的最大并行序列数"""
+        try:
+            import llama_cpp
+            return int(llama_cpp.llama_max_parallel_sequences())
+        except Exception:
+            return 64
+    
+    def _create_sampler(self, temperature: float, top_p: float, top_k: int, min_p: float,
+                        repeat_penalty: float, seed: int) -> Any:
+        """创建单个序列的采样器链（与 Llama._init_sampler 的默认链一致）"""
+        from llama_cpp import _internals as internals
+        
+        sampler = internals.LlamaSampler()
+        penalties = {
+            'penalty_last_n': PENALTY_LAST_N,
+            'penalty_repeat': repeat_penalty,
+            'penalty_freq': 0.0,
+            'penalty_present': 0.0,
+        }
+        # 部分版本的 add_penalties 还需要 n_vocab
+        if _accepts_argument(sampler.add_penalties, 'n_vocab'):
+            penalties['n_vocab'] = self.llm.n_vocab()
+        sampler.add_penalties(**penalties)
+        if temperature <= 0:
+            sampler.add_greedy()
+        else:
+            sampler.add_top_k(top_k)
+            sampler.add_top_p(top_p, 1)
+            sampler.add_min_p(min_p, 1)
+            sampler.add_temp(temperature)
+            sampler.add_dist(seed)
+        return sampler
+    
+    def _is_eog(self, token: int) -> bool:
+        """是否为生成结束 token（EOS / EOT 等）"""
+        try:
+            import llama_cpp
+            vocab = getattr(self.llm._model, 'vocab', None)
+            if vocab is not None and hasattr(llama_cpp, 'llama_vocab_is_eog'):
+                return bool(llama_cpp.llama_vocab_is_eog(vocab, token))
+        except Exception:
+            pass
+        return token == self.llm.token_eos()
+    
+    @staticmethod
+    def _add_token(batch: Any, token: int, pos: int, seq_id: int, logits: bool):
+        """向 batch 追加一个 token"""
+        b = batch.batch
+        j = b.n_tokens
+        b.token[j] = token
+        b.pos[j] = pos
+        b.seq_id[j][0] = seq_id
+        b.n_seq_id[j] = 1
+        b.logits[j] = logits
+        b.n_tokens = j + 1
+    
+    def generate(
+        self,
+        prompts: Sequence[str],
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        top_k: int = 40,
+        min_p: float = 0.05,
+        repeat_penalty: float = 1.1,
+        stop: Optional[Sequence[str]] = None,
+        seeds: Optional[Sequence[int]] = None,
+        on_result: Optional[Callable[[int, str], None]] = None,
+        reserve: Optional[Callable[[int], None]] = None,
+    ) -> List[str]:
+        """
+        并行生成所有 prompt 的结果
+        
+        Args:
+            prompts: prompt 列表
+            max_tokens: 每个 prompt 的最大生成 token 数
+            temperature: 温度参数（<= 0 时使用贪心解码）
+            top_p: Top-p 采样参数
+            top_k: Top-k 采样参数
+            min_p: Min-p 采样参数
+            repeat_penalty: 重复惩罚
+            stop: 停止字符串（不包含在结果中）
+            seeds: 每个 prompt 的随机种子，None 时随机
+            on_result: 某个 prompt 完成时的回调 (序号, 文本)
+            reserve: 创建并行上下文之前的回调（参数为总上下文长度），用于腾出 KV 缓存所需的内存
+        
+        Returns:
+            与 prompts 一一对应的生成结果
+        """
+        from llama_cpp import _internals as internals
+        
+        llm = self.llm
+        stop = [s for s in (stop or []) if s]
+        if seeds is None:
+            seeds = [random.randint(0, 2 ** 31 - 1) for _ in prompts]
+        
+        tokenized = [llm.tokenize(prompt.encode('utf-8'), add_bos=True, special=True) for prompt in prompts]
+        n_ctx_seq = per_sequence_ctx([len(t) for t in tokenized], max_tokens, llm.n_ctx())
+        n_batch = max(llm.n_batch, 1)
+        
+        results: List[Optional[str]] = [None] * len(prompts)
+        queue = []
+        for index, tokens in enumerate(tokenized):
+            if len(tokens) >= n_ctx_seq:
+                results[index] = f"Error: prompt too long ({len(tokens)} tokens, context {n_ctx_seq})"
+            else:
+                queue.append(index)
+        queue.reverse()
+        
+        if not queue:
+            return results
+        n_slots = min(self.n_parallel, len(queue), n_batch, self._max_sequences())
+        
+        if reserve is not None:
+            reserve(n_ctx_seq * n_slots)
+        
+        # 与已加载模型共享权重的并行上下文（每个序列 n_ctx_seq 个位置）
+        params = type(llm.context_params).from_buffer_copy(llm.context_params)
+        params.n_ctx = n_ctx_seq * n_slots
+        params.n_batch = n_batch
+        params.n_seq_max = n_slots
+        if hasattr(params, 'n_ubatch'):
+            params.n_ubatch = min(params.n_ubatch, n_batch)
+        for name in ('logits_all', 'embeddings', 'kv_unified'):
+            if hasattr(params, name):
+                setattr(params, name, False)
+        
+        ctx = internals.LlamaContext(model=llm._model, params=params, verbose=llm.verbose)
+        batch = internals.LlamaBatch(n_tokens=n_batch, embd=0, n_seq_max=1, verbose=llm.verbose)
+        
+        slots: List[_Slot] = []
+        prompt_tokens = 0
+        generated_tokens = 0
+        start_time = time.perf_counter()
+        
+        def fill(seq_id: int) -> Optional[_Slot]:
+            """把队列中的下一个 prompt 放入空闲 slot"""
+            if not queue:
+                return None
+            index = queue.pop()
+            sampler = self._create_sampler(temperature, top_p, top_k, min_p, repeat_penalty, seeds[index])
+            return _Slot(seq_id, index, list(tokenized[index]), sampler)
+        
+        def finish(slot: _Slot):
+            """序列结束：输出结果、释放其 KV 缓存并让出 slot"""
+            text = llm.detokenize(slot.output).decode('utf-8', errors='ignore')
+            for s in stop:
+                position = text.find(s)
+                if position >= 0:
+                    text = text[:position]
+            results[slot.index] = text
+            ctx.kv_cache_seq_rm(slot.seq_id, -1, -1)
+            slot.sampler.close()
+            if on_result is not None:
+                on_result(slot.index, text)
+        
+        try:
+            for seq_id in range(n_slots):
+                slot = fill(seq_id)
+                if slot is not None:
+                    slots.append(slot)
+            
+            while slots:
+                batch.reset()
+                
+                # 正在生成的序列各追加一个 token
+                for slot in slots:
+                    if slot.next_token is not None:
+                        slot.logits_index = batch.n_tokens()
+                        self._add_token(batch, slot.next_token, slot.n_past, slot.seq_id, True)
+                        slot.n_past += 1
+                        slot.next_token = None
+                
+                # 剩余容量用于预填充 prompt（长 prompt 分多步写入）
+                for slot in slots:
+                    space = n_batch - batch.n_tokens()
+                    if space <= 0:
+                        break
+                    if not slot.pending:
+                        continue
+                    chunk, slot.pending = slot.pending[:space], slot.pending[space:]
+                    for i, token in enumerate(chunk):
+                        last = not slot.pending and i == len(chunk) - 1
+                        if last:
+                            slot.logits_index = batch.n_tokens()
+                        self._add_token(batch, token, slot.n_past, slot.seq_id, last)
+                        slot.n_past += 1
+                    prompt_tokens += len(chunk)
+                
+                ctx.decode(batch)
+                
+                # 为本步输出了 logits 的序列采样下一个 token
+                active = []
+                for slot in slots:
+                    if slot.logits_index is None:
+                        active.append(slot)
+                        continue
+                    # llama_sampler_sample 内部已经 accept 该 token（更新重复惩罚的历史）
+                    token = slot.sampler.sample(ctx, slot.logits_index)
+                    slot.logits_index = None
+                    
+                    done = self._is_eog(token)
+                    if not done:
+                        slot.output.append(token)
+                        generated_tokens += 1
+                        if stop:
+                            slot.text += llm.detokenize([token])
+                            tail = slot.text.decode('utf-8', errors='ignore')
+                            done = any(s in tail for s in stop)
+                        done = done or len(slot.output) >= max_tokens or slot.n_past >= n_ctx_seq
+                    
+                    if done:
+                        finish(slot)
+                        slot = fill(slot.seq_id)
+                        if slot is None:
+                            continue
+                    else:
+                        slot.next_token = token
+                    active.append(slot)
+                slots = active
+        
+        finally:
+            for slot in slots:
+                slot.sampler.close()
+            batch.close()
+            ctx.close()
+        
+        elapsed = time.perf_counter() - start_time
+        self.stats = {
+            'prompts': len(prompts),
+            'slots': n_slots,
+            'n_ctx_seq': n_ctx_seq,
+            'prompt_tokens': prompt_tokens,
+            'generated_tokens': generated_tokens,
+            'elapsed': elapsed,
+            'tokens_per_second': generated_tokens / elapsed if elapsed > 0 else None,
+        }
+        return results
+    
+    def format_stats(self) -> str:
+        """格式化最近一次运行的统计信息"""
+        stats = self.stats
+        if not stats:
+            return "⚡ Batch: no run"
+        speed = f"{stats['tokens_per_second']:.1f} tok/s" if stats['tokens_per_second'] else "n/a"
+        return (f"⚡ Batch: {stats['prompts']} prompt(s) on {stats['slots']} slot(s), "
+                f"{stats['prompt_tokens']} prompt + {stats['generated_tokens']} generated tokens "
+                f"in {stats['elapsed']:.2f} s ({speed})")
@@ -1,23 +1,212 @@
 """
 Cache Manager - 管理模型缓存和签名验证
+优先使用 watchdog 监听模型目录变化，不可用时退回按目录 mtime 计算的轻量签名
 """
 
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
+
+# 可选依赖：watchdog（inotify / FSEvents / ReadDirectoryChangesW）
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _CatalogEventHandler(FileSystemEventHandler):
+    """将文件系统事件转换为缓存失效标记"""
+    
+    def __init__(self, manager: 'CacheManager'):
+        super().__init__()
+        self._manager = manager
+    
+    def on_any_event(self, event):
+        paths = [getattr(event, 'src_path', ''), getattr(event, 'dest_path', '')]
+        if event.is_directory or any(str(p).lower().endswith(".gguf") for p in paths if p):
+            self._manager.invalidate()
+
+
+class _ConfigEventHandler(FileSystemEventHandler):
+    """监听配置文件所在目录，只有配置文件本身变化时才标记缓存失效"""
+    
+    def __init__(self, manager: 'CacheManager'):
+        super().__init__()
+        self._manager = manager
+    
+    def on_any_event(self, event):
+        paths = [getattr(event, 'src_path', ''), getattr(event, 'dest_path', '')]
+        if any(p and self._manager.is_config_path(p) for p in paths):
+            self._manager.invalidate()
 
 
 class CacheManager:
-    """模型缓存管理器"""
+    """模型缓存管理器 - 模型目录读取的统一入口"""
     
-    def __init__(self):
+    def __init__(self, verify_interval: float = 60.0, min_check_interval: float = 1.0):
+        """
+        初始化缓存管理器
+        
+        Args:
+            verify_interval: 使用文件监听时，仍然按此间隔（秒）校验一次目录签名，
+                             用于覆盖网络存储等监听不可靠的场景
+            min_check_interval: 未使用文件监听时，两次签名校验之间的最小间隔（秒），
+                                避免同一次节点执行中重复 stat 目录
+        """
         self._cache: Dict = {}
         self._cache_signature: Optional[Tuple] = None
+        self._lock = threading.RLock()
+        
+        self._search_paths: List[str] = []
+        self._config_paths: List[Path] = []
+        self._known_dirs: Dict[str, int] = {}
+        
+        self._observer = None
+        self._watched: set = set()
+        self._dirty = True
+        self._last_verify = 0.0
+        self.verify_interval = verify_interval
+        self.min_check_interval = min_check_interval
+        
+        # 每次检测到变化时递增，消费者用它判断自己的数据是否过期
+        self.generation = 0
+    
+    def watch(self, search_paths: List[str], config_paths: List[Path] = None):
+        """
+        注册需要监听的模型目录和配置文件（可多次调用，路径会合并）
+        
+        Args:
+            search_paths: 模型搜索路径列表
+            config_paths: 配置文件路径列表
+        """
+        with self._lock:
+            added = False
+            for path in search_paths:
+                if path not in self._search_paths:
+                    self._search_paths.append(path)
+                    added = True
+            for path in config_paths or []:
+                path = Path(path)
+                if path not in self._config_paths:
+                    self._config_paths.append(path)
+                    added = True
+            
+            if not added:
+                return
+            
+            self._dirty = True
+            self._start_watchers()
+    
+    def is_config_path(self, path) -> bool:
+        """判断路径是否为已注册的配置文件"""
+        target = os.path.normcase(os.path.abspath(str(path)))
+        return any(os.path.normcase(os.path.abspath(str(p))) == target for p in self._config_paths)
+    
+    def _config_dirs(self) -> List[str]:
+        """配置文件所在的目录（watchdog 按目录监听，编辑器保存时常常是替换文件）"""
+        dirs = []
+        for config_path in self._config_paths:
+            parent = str(Path(config_path).resolve().parent)
+            if parent not in dirs:
+                dirs.append(parent)
+        return dirs
+    
+    def _unwatched_paths(self) -> List[str]:
+        """已存在但尚未监听的模型目录和配置目录（启动后才创建的目录）"""
+        return [
+            p for p in self._search_paths + self._config_dirs()
+            if p not in self._watched and os.path.isdir(p)
+        ]
+    
+    def _start_watchers(self):
+        """为尚未监听的目录启动 watchdog 监听"""
+        if Observer is None:
+            return
+        
+        try:
+            if self._observer is None:
+                self._observer = Observer()
+                self._observer.daemon = True
+                self._observer.start()
+            
+            handler = _CatalogEventHandler(self)
+            for path in self._search_paths:
+                if path in self._watched or not os.path.isdir(path):
+                    continue
+                self._observer.schedule(handler, path, recursive=True)
+                self._watched.add(path)
+            
+            config_handler = _ConfigEventHandler(self)
+            for path in self._config_dirs():
+                if path in self._watched or not os.path.isdir(path):
+                    continue
+                self._observer.schedule(config_handler, path, recursive=False)
+                self._watched.add(path)
+        except Exception as e:
+            # 监听失败（如 inotify 句柄耗尽）时退回目录签名校验
+            print(f"⚠️  File watcher unavailable, falling back to mtime signatures: {e}")
+            self._observer = None
+            self._watched.clear()
+    
+    @property
+    def is_watching(self) -> bool:
+        """是否所有目录和配置文件都处于监听状态"""
+        return self._observer is not None and not self._unwatched_paths()
+    
+    def invalidate(self):
+        """标记缓存已失效（由文件监听或下载完成触发）"""
+        self._dirty = True
+    
+    def _walk_dirs(self, search_paths: List[str]) -> Dict[str, int]:
+        """遍历所有目录（只列举子目录，不 stat 文件），返回 {dir: mtime_ns}"""
+        dirs = {}
+        stack = [p for p in search_paths if os.path.isdir(p)]
+        
+        while stack:
+            current = stack.pop()
+            if current in dirs:
+                continue
+            try:
+                dirs[current] = os.stat(current).st_mtime_ns
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+        
+        return dirs
+    
+    def _known_dirs_changed(self) -> bool:
+        """只 stat 已知目录，判断是否有文件增删（新增子目录会改变父目录 mtime）"""
+        if not self._known_dirs:
+            return True
+        
+        # 启动后才创建的模型根目录
+        for path in self._search_paths:
+            if path not in self._known_dirs and os.path.isdir(path):
+                return True
+        
+        for path, mtime_ns in self._known_dirs.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        
+        return False
     
     def compute_signature(self, search_paths: List[str], config_paths: List[Path]) -> Tuple:
         """
         生成缓存签名，用于检测文件系统变化
         
+        只使用目录 mtime（文件增删、重命名都会改变所在目录的 mtime），
+        不再对每个 GGUF 文件执行 stat。
+        
         Args:
             search_paths: 模型搜索路径列表
             config_paths: 配置文件路径列表
@@ -25,30 +214,18 @@ class CacheManager:
         Returns:
             签名元组
         """
-        file_entries = []
+        if self._known_dirs and not self._known_dirs_changed():
+            dirs = self._known_dirs
+        else:
+            dirs = self._walk_dirs(search_paths)
+            self._known_dirs = dirs
         
-        # 扫描所有 GGUF 文件
+        dir_entries = []
         for base in search_paths:
             if not os.path.exists(base):
-                file_entries.append((base, "__missing__", 0, 0))
-                continue
-            
-            for root, _, files in os.walk(base):
-                for file in files:
-                    if file.lower().endswith(".gguf"):
-                        full_path = os.path.join(root, file)
-                        try:
-                            stat_result = os.stat(full_path)
-                            size = stat_result.st_size
-                            mtime = int(stat_result.st_mtime)
-                        except OSError:
-                            size = 0
-                            mtime = 0
-                        
-                        rel_path = os.path.relpath(full_path, base)
-                        file_entries.append((base, rel_path, size, mtime))
-        
-        file_entries.sort()
+                dir_entries.append((base, "__missing__", 0))
+        dir_entries.extend((path, "", mtime_ns) for path, mtime_ns in dirs.items())
+        dir_entries.sort()
         
         # 配置文件签名
         config_sigs = []
@@ -62,7 +239,7 @@ class CacheManager:
                 config_sigs.append((str(config_path), "error", 0))
         
         return (
-            tuple(file_entries),
+            tuple(dir_entries),
             tuple(sorted(search_paths)),
             tuple(config_sigs)
         )
@@ -82,6 +259,55 @@ class CacheManager:
         
         return self._cache_signature == current_signature
     
+    def check(self) -> int:
+        """
+        检查监听目录是否发生变化，变化时清空缓存并递增 generation
+        
+        监听可用时只读取内存标记；否则（或到达校验间隔时）计算目录签名。
+        
+        Returns:
+            当前 generation
+        """
+        with self._lock:
+            # 启动后才创建的模型根目录或配置目录：补充监听并立即校验（只对未监听的路径执行 isdir）
+            if self._observer is not None and self._unwatched_paths():
+                self._start_watchers()
+                self._dirty = True
+            
+            now = time.monotonic()
+            interval = self.verify_interval if self.is_watching else self.min_check_interval
+            need_verify = self._dirty or now - self._last_verify >= interval
+            if not need_verify:
+                return self.generation
+            
+            self._dirty = False
+            self._last_verify = now
+            signature = self.compute_signature(self._search_paths, self._config_paths)
+            
+            if not self.is_cache_valid(signature):
+                self._cache.clear()
+                self._cache_signature = signature
+                self.generation += 1
+            
+            return self.generation
+    
+    def get_or_compute(self, key: str, builder: Callable):
+        """
+        获取缓存值；目录发生变化或缓存缺失时调用 builder 重新计算
+        
+        Args:
+            key: 缓存键
+            builder: 无参函数，返回需要缓存的值
+        
+        Returns:
+            缓存值
+        """
+        with self._lock:
+            self.check()
+            if key not in self._cache:
+                self._cache[key] = builder()
+            return self._cache[key]
+    
     def get(self, key: str, default=None):
         """获取缓存值"""
         return self._cache.get(key, default)
@@ -106,9 +332,24 @@ class CacheManager:
         else:
             print("🔄 Clearing cache")
         
-        self._cache.clear()
-        self._cache_signature = None
+        with self._lock:
+            self._cache.clear()
+            self._cache_signature = None
+            self._known_dirs = {}
+            self._dirty = True
     
     def has_key(self, key: str) -> bool:
         """检查缓存中是否存在指定键"""
         return key in self._cache
+
+
+# 全局单例
+_cache_manager = None
+
+
+def get_cache_manager() -> CacheManager:
+    """获取全局缓存管理器实例"""
+    global _cache_manager
+    if _cache_manager is None:
+        _cache_manager = CacheManager()
+    return _cache_manager
@@ -20,11 +20,13 @@ try:
     # 方式1: 尝试从当前包导入
     from config.paths import PathConfig
     from utils.download_manager import get_download_manager
+    from core.response_cache import get_response_cache, is_deterministic, make_key
 except ImportError:
     try:
         # 方式2: 尝试相对导入
         from ...config.paths import PathConfig
         from ...utils.download_manager import get_download_manager
+        from ..response_cache import get_response_cache, is_deterministic, make_key
     except (ImportError, ValueError):
         # 方式3: 动态导入（最可靠）
         import importlib.util
@@ -42,6 +44,100 @@ except ImportError:
         dm_module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(dm_module)
         get_download_manager = dm_module.get_download_manager
+        
+        # 导入结果缓存
+        rc_file = module_path / 'core' / 'response_cache.py'
+        spec = importlib.util.spec_from_file_location('core.response_cache', rc_file)
+        rc_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(rc_module)
+        get_response_cache = rc_module.get_response_cache
+        is_deterministic = rc_module.is_deterministic
+        make_key = rc_module.make_key
+
+
+class ThinkingBudgetProcessor:
+    """
+    思考 token 预算（transformers logits processor）
+    
+    统计最后一个 <think> 之后、尚未出现 </think> 的生成 token 数，超出预算后
+    逐个强制输出 </think> 的 token，让模型闭合思考块后继续生成回答。
+    每行只保存扫描状态（是否在思考块内、已用 token 数、尾部窗口），每步只处理新 token
+    """
+    
+    def __init__(self, tokenizer, budget: int, prompt_length: int,
+                 open_tag: str = "<think>", close_tag: str = "</think>"):
+        """
+        初始化处理器
+        
+        Args:
+            tokenizer: 分词器
+            budget: 允许的思考 token 数
+            prompt_length: 输入（prompt）的 token 数，聊天模板可能已在 prompt 末尾打开思考块
+            open_tag: 思考开始标签
+            close_tag: 思考结束标签
+        """
+        self.budget = max(0, int(budget))
+        self.prompt_length = prompt_length
+        self.open_ids = tokenizer.encode(open_tag, add_special_tokens=False)
+        self.close_ids = tokenizer.encode(close_tag, add_special_tokens=False)
+        self.window = max(len(self.open_ids), len(self.close_ids))
+        self.triggered = False
+        self._rows: List[Dict[str, Any]] = []
+    
+    def _new_state(self) -> Dict[str, Any]:
+        return {"inside": False, "used": 0, "checked": 0, "tail": []}
+    
+    def _advance(self, state: Dict[str, Any], tokens: List[int]):
+        """把新 token 依次送入行状态（只看尾部窗口，与序列总长度无关）"""
+        tail = state["tail"]
+        position = state["checked"]
+        for token in tokens:
+            tail.append(token)
+            if len(tail) > self.window:
+                del tail[0]
+            if tail[-len(self.close_ids):] == self.close_ids:
+                state["inside"] = False
+            elif tail[-len(self.open_ids):] == self.open_ids:
+                state["inside"] = True
+                state["used"] = 0
+            elif state["inside"] and position >= self.prompt_length:
+                state["used"] += 1
+            position += 1
+        state["checked"] = position
+    
+    def _forced(self, state: Dict[str, Any]) -> int:
+        """已输出的结束标签前缀长度（强制闭合进行中）"""
+        tail = state["tail"]
+        for size in range(min(len(self.close_ids) - 1, state["used"]), 0, -1):
+            if tail[-size:] == self.close_ids[:size]:
+                return size
+        return 0
+    
+    def __call__(self, input_ids, scores):
+        if not self.open_ids or not self.close_ids:
+            return scores
+        length = input_ids.shape[1]
+        while len(self._rows) < input_ids.shape[0]:
+            self._rows.append(self._new_state())
+        for row in range(input_ids.shape[0]):
+            state = self._rows[row]
+            if state["checked"] > length:
+                # 序列变短（不是同一次生成），重新扫描
+                state = self._rows[row] = self._new_state()
+            if state["checked"] < length:
+                self._advance(state, input_ids[row, state["checked"]:].tolist())
+            if not state["inside"]:
+                continue
+            
+            forced = self._forced(state)
+            if state["used"] - forced < self.budget:
+                continue
+            
+            self.triggered = True
+            next_id = self.close_ids[forced]
+            scores[row, :] = float('-inf')
+            scores[row, next_id] = 0.0
+        return scores
 
 
 class TransformersInferenceEngine:
@@ -52,7 +148,7 @@ class TransformersInferenceEngine:
         self.processor = None
         self.current_model_id = None
         self.current_config = None
-        
+    
     def load_model(self, config: Dict) -> bool:
         """
         加载模型
@@ -190,7 +286,7 @@ class TransformersInferenceEngine:
             print(f"✅ Model loaded: {model_name}")
             
             return True
-            
+        
         except Exception as e:
             print(f"❌ Failed to load model: {e}")
             import traceback
@@ -205,7 +301,8 @@ class TransformersInferenceEngine:
         seed: int = 0,
         top_p: float = 0.8,
         top_k: int = 20,
-        repetition_penalty: float = 1.0
+        repetition_penalty: float = 1.0,
+        thinking_budget: int = -1
     ) -> str:
         """
         执行推理（使用 Qwen3-VL 新 API）
@@ -218,6 +315,7 @@ class TransformersInferenceEngine:
             top_p: nucleus sampling 参数
             top_k: top-k sampling 参数
             repetition_penalty: 重复惩罚
+            thinking_budget: 思考 token 预算（Thinking 模型），负数表示不限制
         
         Returns:
             生成的文本
@@ -225,6 +323,32 @@ class TransformersInferenceEngine:
         if self.model is None or self.processor is None:
             raise RuntimeError("Model not loaded. Call load_model() first.")
         
+        # 确定性请求（temperature=0 或 seed>0）直接复用之前的结果；相同请求正在生成时共享结果
+        key = make_key(
+            'transformers',
+            (self.current_model_id, self.current_config),
+            {
+                'messages': messages,
+                'temperature': temperature,
+                'max_new_tokens': max_new_tokens,
+                'seed': seed,
+                'top_p': top_p,
+                'top_k': top_k,
+                'repetition_penalty': repetition_penalty,
+                'thinking_budget': thinking_budget if thinking_budget >= 0 else None,
+            }
+        )
+        
+        return get_response_cache().get_or_generate(
+            key,
+            lambda: self._generate(messages, temperature, max_new_tokens, seed, top_p, top_k, repetition_penalty,
+                                   thinking_budget),
+            cacheable=is_deterministic(temperature, seed, random_seeds=(None, 0, -1))
+        )
+    
+    def _generate(self, messages, temperature, max_new_tokens, seed, top_p, top_k, repetition_penalty,
+                  thinking_budget=-1) -> str:
+        """执行实际的生成（不经过结果缓存）"""
         try:
             # 设置随机种子
             if seed > 0:
@@ -284,8 +408,19 @@ class TransformersInferenceEngine:
                 # 移除 None 值
                 generation_config = {k: v for k, v in generation_config.items() if v is not None}
                 
+                # 思考预算：超出后强制闭合思考块，避免把 max_new_tokens 花在会被丢弃的思考内容上
+                budget_processor = None
+                if thinking_budget is not None and thinking_budget >= 0:
+                    from transformers import LogitsProcessorList
+                    budget_processor = ThinkingBudgetProcessor(
+                        self.processor.tokenizer, thinking_budget, model_inputs["input_ids"].shape[1]
+                    )
+                    generation_config["logits_processor"] = LogitsProcessorList([budget_processor])
+                
                 # 生成
                 generated_ids = self.model.generate(**model_inputs, **generation_config)
+                if budget_processor is not None and budget_processor.triggered:
+                    print(f"✂️  Thinking budget reached ({thinking_budget} tokens), closed the thinking block")
                 
                 # 解码（只解码新生成的 tokens）
                 input_ids_len = model_inputs["input_ids"].shape[1]
@@ -295,7 +430,7 @@ class TransformersInferenceEngine:
                 )
                 
                 return generated_text.strip()
-                
+        
         except Exception as e:
             print(f"❌ Inference failed: {e}")
             import traceback
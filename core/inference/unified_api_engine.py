@@ -3,8 +3,16 @@
 支持 Nexa SDK、Ollama、LM Studio、OpenAI 兼容的 API
 """
 
+import json
 import requests
-from typing import List, Dict, Any, Optional
+from typing import Callable, Iterator, List, Dict, Any, Optional
+
+try:
+    from ..response_cache import get_response_cache, is_deterministic, make_key
+    from ..streaming import THINK_TAGS, consume_stream
+except (ImportError, ValueError):
+    from core.response_cache import get_response_cache, is_deterministic, make_key
+    from core.streaming import THINK_TAGS, consume_stream
 
 
 class UnifiedAPIEngine:
@@ -81,7 +89,7 @@ class UnifiedAPIEngine:
                     self._available_models = [model['name'] for model in data.get('models', [])]
                 else:
                     self._available_models = []
-                
+            
             except Exception as e:
                 if not force_refresh:
                     print(f"❌ Failed to fetch models: {e}")
@@ -124,6 +132,111 @@ class UnifiedAPIEngine:
         Returns:
             API 响应
         """
+        payload = self._build_payload(model, messages, temperature, max_tokens, top_p, top_k,
+                                      repetition_penalty, stream, **kwargs)
+        
+        # 确定性请求（temperature=0 或指定 seed）直接复用之前的响应；相同请求正在进行时共享响应
+        key = None if stream else make_key('api.chat', (self.api_type, self.base_url), payload)
+        return get_response_cache().get_or_generate(
+            key,
+            lambda: self._post_chat(payload, timeout),
+            cacheable=is_deterministic(temperature, kwargs.get('seed'))
+        )
+    
+    def stream_chat_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        temperature: float = 0.7,
+        max_tokens: int = 512,
+        top_p: float = 0.9,
+        top_k: Optional[int] = None,
+        repetition_penalty: Optional[float] = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+        should_stop: Optional[Callable[[str], bool]] = None,
+        timeout: int = 300,
+        **kwargs
+    ) -> str:
+        """
+        流式调用 Chat Completion API（SSE）
+        
+        单独返回的推理内容（reasoning_content / reasoning 字段）会包在 <think> 标签中，
+        与直接在 content 中输出思考标签的模型保持相同的格式；
+        should_stop 返回 True 时关闭连接，服务端随之停止生成
+        
+        Args:
+            model: 模型 ID
+            messages: 消息列表
+            temperature: 温度参数
+            max_tokens: 最大生成 token 数
+            top_p: Top-p 采样
+            top_k: Top-k 采样
+            repetition_penalty: 重复惩罚
+            on_delta: 每个文本片段的回调
+            should_stop: 每个片段之后调用，返回 True 时提前结束
+            timeout: 请求超时时间（秒）
+            **kwargs: 其他参数
+        
+        Returns:
+            生成的完整文本
+        """
+        payload = self._build_payload(model, messages, temperature, max_tokens, top_p, top_k,
+                                      repetition_penalty, True, **kwargs)
+        try:
+            with requests.post(
+                self.chat_endpoint,
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    print(f"❌ API Error {response.status_code}:")
+                    print(f"   Response: {response.text[:500]}")
+                response.raise_for_status()
+                return consume_stream(self._iter_sse_text(response), on_delta, should_stop=should_stop)
+        except requests.exceptions.Timeout:
+            raise RuntimeError("Request timeout. The model might be too slow or the service is overloaded.")
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"API request failed: {e}")
+    
+    @staticmethod
+    def _iter_sse_text(response) -> Iterator[str]:
+        """解析 OpenAI 兼容的 SSE 流，输出文本片段（推理内容包在思考标签中）"""
+        open_tag, close_tag = THINK_TAGS[0]
+        in_reasoning = False
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            try:
+                choices = json.loads(data).get('choices') or []
+            except ValueError:
+                continue
+            if not choices:
+                continue
+            delta = choices[0].get('delta') or {}
+            reasoning = delta.get('reasoning_content') or delta.get('reasoning')
+            content = delta.get('content')
+            if reasoning:
+                if not in_reasoning:
+                    in_reasoning = True
+                    reasoning = open_tag + reasoning
+                yield reasoning
+            if content:
+                if in_reasoning:
+                    in_reasoning = False
+                    content = close_tag + content
+                yield content
+        if in_reasoning:
+            yield close_tag
+    
+    def _build_payload(self, model: str, messages: List[Dict[str, Any]], temperature: float,
+                       max_tokens: int, top_p: float, top_k: Optional[int],
+                       repetition_penalty: Optional[float], stream: bool, **kwargs) -> Dict[str, Any]:
+        """构建 Chat Completion 请求体（按 API 类型转换采样参数）"""
         payload = {
             "model": model,
             "messages": messages,
@@ -153,7 +266,38 @@ class UnifiedAPIEngine:
         
         # 添加其他参数
         payload.update(kwargs)
+        return payload
+    
+    def preload_model(self, model: str, keep_alive: str = "10m", timeout: int = 300) -> bool:
+        """
+        让服务端提前把模型载入内存（目前只有 Ollama 提供该接口）
         
+        Ollama 收到不带 prompt 的 /api/generate 请求时只加载模型，不生成内容
+        
+        Args:
+            model: 模型名称
+            keep_alive: 模型在服务端保持加载的时长
+            timeout: 请求超时时间（秒）
+        
+        Returns:
+            是否已请求服务端加载
+        """
+        if self.api_type != "ollama" or not model:
+            return False
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": model, "keep_alive": keep_alive},
+                timeout=timeout
+            )
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️  Remote preload failed for {model}: {e}")
+            return False
+    
+    def _post_chat(self, payload: Dict[str, Any], timeout: int) -> Dict[str, Any]:
+        """发送 Chat Completion 请求"""
         try:
             response = requests.post(
                 self.chat_endpoint,
@@ -2,40 +2,251 @@
 Inference Engine - 负责模型推理和生成
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import numpy as np
 
+import contextlib
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+from .load_spec import GGML_TYPES, LoadSpec
+from .model_pool import ModelPool, estimate_kv_bytes, get_model_pool, split_allocations
+from .batch_generation import DEFAULT_PARALLEL, ParallelGenerator, is_supported as parallel_supported
+from .streaming import StreamMetrics, ThinkingBudget, consume_stream
+from .prefix_cache import MIN_PREFIX_TOKENS, PrefixCache, compact_state, get_prefix_cache
+from .response_cache import ResponseCache, file_identity, get_response_cache, is_deterministic, make_key
+from .usage_history import record_usage
+
+
+# 环境变量：设为 0 时禁用加载器节点的后台预加载
+PRELOAD_ENV = "GGUF_VLM_PRELOAD"
+
+
+# 视觉模型可用的聊天处理器（llama_cpp.llama_chat_format 中的类名）
+CHAT_HANDLERS = {
+    'llava15': 'Llava15ChatHandler',
+    'qwen25vl': 'Qwen25VLChatHandler',
+}
+
+
+def _create_chat_handler(kind: str, mmproj_path: str, verbose: bool = False):
+    """
+    创建视觉聊天处理器（会加载 mmproj 的 CLIP 权重）
+    
+    Args:
+        kind: 处理器类型（CHAT_HANDLERS 的键）
+        mmproj_path: mmproj 文件路径
+        verbose: 是否输出详细日志
+    
+    Returns:
+        聊天处理器实例
+    """
+    from llama_cpp import llama_chat_format
+    
+    class_name = CHAT_HANDLERS.get(kind)
+    if class_name is None:
+        raise ValueError(f"Unknown chat handler: {kind} (available: {', '.join(CHAT_HANDLERS)})")
+    
+    handler_class = getattr(llama_chat_format, class_name, None)
+    if handler_class is None:
+        raise ImportError(f"{class_name} is not available in the installed llama-cpp-python")
+    
+    return handler_class(clip_model_path=mmproj_path, verbose=verbose)
+
 
 class InferenceEngine:
     """GGUF 模型推理引擎"""
     
-    def __init__(self):
-        """初始化推理引擎"""
-        self.loaded_models: Dict[str, Any] = {}
+    def __init__(self, model_pool: ModelPool = None, prefix_cache: PrefixCache = None,
+                 response_cache: ResponseCache = None):
+        """
+        初始化推理引擎
+        
+        Args:
+            model_pool: 模型池，为 None 时使用全局共享的模型池
+            prefix_cache: 前缀 KV 缓存，为 None 时使用全局共享的前缀缓存
+            response_cache: 确定性生成结果缓存，为 None 时使用全局共享的结果缓存
+        """
+        # 已加载的模型（带内存预算的 LRU 池，兼容 dict 接口）
+        self.loaded_models: ModelPool = model_pool if model_pool is not None else get_model_pool()
+        # 系统提示词等固定前缀的预填充状态
+        self.prefix_cache: PrefixCache = prefix_cache if prefix_cache is not None else get_prefix_cache()
+        # 确定性请求（temperature=0 或固定 seed）的生成结果
+        self.response_cache: ResponseCache = response_cache if response_cache is not None else get_response_cache()
         self.model_contexts: Dict[str, Any] = {}
+        
+        # 加载/卸载互斥（后台预加载与节点中的加载不会同时进行）
+        self._load_lock = threading.RLock()
+        # 后台预加载任务（模型路径 -> Future）
+        self._preloads: Dict[str, Future] = {}
+        self._preloads_lock = threading.Lock()
+        self._preload_executor: Optional[ThreadPoolExecutor] = None
     
-    def load_model(self, model_path: str, **kwargs) -> bool:
+    def load_model(self, model_path: str, record: bool = True, **kwargs) -> bool:
         """
         加载模型到内存
         
+        已加载的实例满足请求的加载规格（见 LoadSpec）时直接复用；
+        只有上下文相关参数变化时只重建上下文，保留已映射的权重；
+        GPU 层数变化时才重新加载整个模型。
+        该模型正在后台预加载时，先等待预加载完成
+        
         Args:
             model_path: 模型文件路径
-            **kwargs: 额外的加载参数
+            record: 是否把加载参数写入使用历史（自动调优等内部加载应为 False）
+            **kwargs: 额外的加载参数（n_ctx, n_gpu_layers, n_batch, type_k, type_v,
+                      mmproj_path, chat_handler, logits_all, verbose）
         
         Returns:
             是否加载成功
         """
+        self._await_preload(model_path)
+        with self._load_lock:
+            success = self._load_model(model_path, **kwargs)
+        if success and record:
+            record_usage(model_path, count=False, **kwargs)
+        return success
+    
+    def _record_use(self, model_path: str):
+        """
+        记录一次模型使用（每次生成调用一次，启动预热依据）
+        
+        使用已加载实例的实际加载规格，无论模型由节点直接加载、后台预加载还是复用已加载的实例
+        """
+        info = self.loaded_models.get_info(model_path)
+        spec = LoadSpec.from_info(model_path, info)
+        if spec is not None:
+            record_usage(model_path, spec=spec, chat_handler=info.get('chat_handler'))
+    
+    def preload_model(self, model_path: str, warm_up: bool = True, record: bool = True,
+                      **kwargs) -> Optional[Future]:
+        """
+        在后台线程中加载模型并预热，不阻塞调用方
+        
+        加载器节点执行时调用，使模型加载与上游节点（图像解码、缩放等）并行；
+        之后的 load_model / is_model_loaded 会等待预加载完成
+        
+        Args:
+            model_path: 模型文件路径
+            warm_up: 加载后是否执行一次预热解码（分配计算缓冲区、让权重页进入内存/显存）
+            record: 是否把加载参数写入使用历史（启动预热、工作流预取等推测性加载应为 False）
+            **kwargs: load_model 的加载参数
+        
+        Returns:
+            预加载任务（结果为是否加载成功），禁用预加载时返回 None
+        """
+        if os.environ.get(PRELOAD_ENV, "1").strip().lower() in ("0", "false", "no"):
+            return None
+        
+        with self._preloads_lock:
+            future = self._preloads.get(model_path)
+            if future is not None and not future.done():
+                return future
+            if self._preload_executor is None:
+                self._preload_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gguf-vlm-preload")
+            future = self._preload_executor.submit(self._preload, model_path, warm_up, record, kwargs)
+            self._preloads[model_path] = future
+        
+        print(f"🚀 Preloading in background: {os.path.basename(model_path)}")
+        return future
+    
+    def _preload(self, model_path: str, warm_up: bool, record: bool, kwargs: Dict) -> bool:
+        """后台预加载任务"""
+        start = time.perf_counter()
+        with self._load_lock:
+            if not self._load_model(model_path, **kwargs):
+                return False
+            llm = self.loaded_models.get(model_path)
+            # 只预热刚创建的上下文（已有 KV 缓存的实例不需要，也不能被打乱）
+            if warm_up and llm is not None and getattr(llm, 'n_tokens', 0) == 0:
+                self._warm_up(llm)
+        print(f"✅ Background load finished: {os.path.basename(model_path)} ({time.perf_counter() - start:.2f} s)")
+        if record:
+            record_usage(model_path, count=False, **kwargs)
+        return True
+    
+    @staticmethod
+    def _warm_up(llm: Any):
+        """
+        预热解码（与 llama.cpp 的 warmup 相同：解码 BOS + EOS 后清空）
+        
+        首次解码时才会分配计算缓冲区、初始化 GPU 内核并触发 mmap 权重的换入，
+        提前在后台完成可以缩短第一次生成的首 token 延迟
+        """
+        start = time.perf_counter()
+        try:
+            tokens = [token for token in (llm.token_bos(), llm.token_eos()) if token is not None and token >= 0]
+            if tokens:
+                llm.eval(tokens)
+                print(f"🔥 Warm-up decode done ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        except Exception as e:
+            print(f"⚠️  Warm-up skipped: {e}")
+        finally:
+            try:
+                llm.reset()
+            except Exception:
+                pass
+    
+    def _await_preload(self, model_path: str = None):
+        """
+        等待后台预加载完成
+        
+        Args:
+            model_path: 模型路径，None 表示等待所有预加载任务
+        """
+        with self._preloads_lock:
+            if model_path is None:
+                futures = list(self._preloads.items())
+            else:
+                futures = [(model_path, self._preloads[model_path])] if model_path in self._preloads else []
+        
+        for path, future in futures:
+            if not future.done():
+                print(f"⏳ Waiting for background load: {os.path.basename(path)}")
+                start = time.perf_counter()
+                try:
+                    future.result()
+                except CancelledError:
+                    pass
+                except Exception as e:
+                    print(f"⚠️  Background load failed: {e}")
+                print(f"   waited {time.perf_counter() - start:.2f} s")
+            with self._preloads_lock:
+                if self._preloads.get(path) is future:
+                    del self._preloads[path]
+    
+    def _load_model(self, model_path: str, **kwargs) -> bool:
+        """加载模型（调用方持有 _load_lock）"""
+        mmproj_path = kwargs.get('mmproj_path')
+        chat_handler_kind = kwargs.get('chat_handler', 'llava15')
+        verbose = kwargs.get('verbose', False)
+        
         try:
             from llama_cpp import Llama
-            from llama_cpp.llama_chat_format import Llava15ChatHandler
             
-            # 检查是否已加载
-            if model_path in self.loaded_models:
-                print(f"ℹ️ Model already loaded: {model_path}")
-                return True
+            spec = LoadSpec.from_kwargs(model_path, **kwargs)
+            
+            # 检查是否已加载（所有节点共享同一份权重）
+            llm = self.loaded_models.lookup(model_path)
+            if llm is not None:
+                current = LoadSpec.from_info(model_path, self.loaded_models.get_info(model_path))
+                if current is None or current.satisfies(spec):
+                    print(f"ℹ️ Model already loaded: {model_path}")
+                    if mmproj_path:
+                        self._ensure_chat_handler(model_path, llm, mmproj_path, chat_handler_kind, verbose)
+                    return True
+                
+                if current.same_weights(spec) and self._rebuild_context(model_path, llm, current, spec):
+                    if mmproj_path:
+                        self._ensure_chat_handler(model_path, llm, mmproj_path, chat_handler_kind, verbose)
+                    return True
+                
+                print(f"🔄 Reloading model ({current.describe_difference(spec)})")
+                self.loaded_models.remove(model_path)
             
             # 验证模型文件存在
-            import os
             if not os.path.exists(model_path):
                 print(f"❌ Model file not found: {model_path}")
                 return False
@@ -44,17 +255,17 @@ class InferenceEngine:
             file_size = os.path.getsize(model_path) / (1024**3)  # GB
             print(f"📊 Model file size: {file_size:.2f} GB")
             
-            # 加载模型
-            n_ctx = kwargs.get('n_ctx', 8192)
-            n_gpu_layers = kwargs.get('n_gpu_layers', -1)
-            verbose = kwargs.get('verbose', False)
-            
-            # 检查是否是视觉模型
-            mmproj_path = kwargs.get('mmproj_path')
-            
             print(f"🔧 Loading parameters:")
-            print(f"   - n_ctx: {n_ctx}")
-            print(f"   - n_gpu_layers: {n_gpu_layers}")
+            print(f"   - n_ctx: {spec.n_ctx}")
+            print(f"   - n_gpu_layers: {spec.n_gpu_layers}")
+            print(f"   - n_batch: {spec.n_batch}")
+            print(f"   - profile: {spec.profile}")
+            print(f"   - kv cache: {spec.type_k}/{spec.type_v} ({'GPU' if spec.offload_kqv else 'CPU'}), "
+                  f"flash_attn: {spec.flash_attn}")
+            print(f"   - logits_all: {spec.logits_all}, use_mlock: {spec.use_mlock}")
+            threads = spec.thread_kwargs()
+            print(f"   - threads: {threads['n_threads']} decode / {threads['n_threads_batch']} prefill, "
+                  f"n_ubatch: {threads['n_ubatch']}")
             print(f"   - verbose: {verbose}")
             
             if mmproj_path:
@@ -65,30 +276,44 @@ class InferenceEngine:
                 
                 mmproj_size = os.path.getsize(mmproj_path) / (1024**2)  # MB
                 print(f"   - mmproj: {mmproj_path} ({mmproj_size:.2f} MB)")
-                
+            
+            # 估算占用并在加载前腾出空间（按 LRU 卸载旧模型）
+            allocations = spec.allocations()
+            footprint = split_allocations(model_path, allocations, spec.n_gpu_layers, spec.offload_kqv)
+            print(f"   - estimated footprint: {sum(allocations.values()) / (1024**3):.2f} GB "
+                  f"(RAM {footprint['ram'] / (1024**3):.2f} GB, VRAM {footprint['vram'] / (1024**3):.2f} GB)")
+            for name, size in allocations.items():
+                if size:
+                    print(f"     · {name}: {size / (1024**2):.1f} MB")
+            self.loaded_models.make_room(footprint, exclude=(model_path,))
+            
+            if mmproj_path:
+            
                 # 视觉语言模型
-                print("🔄 Loading vision model with mmproj...")
-                chat_handler = Llava15ChatHandler(clip_model_path=mmproj_path, verbose=verbose)
+                print(f"🔄 Loading vision model with mmproj ({chat_handler_kind})...")
+                chat_handler = _create_chat_handler(chat_handler_kind, mmproj_path, verbose)
                 llm = Llama(
-                    model_path=model_path,
                     chat_handler=chat_handler,
-                    n_ctx=n_ctx,
-                    n_gpu_layers=n_gpu_layers,
                     verbose=verbose,
-                    logits_all=True
+                    **spec.llama_kwargs()
                 )
             else:
                 # 纯文本模型
                 print("🔄 Loading text model...")
                 llm = Llama(
-                    model_path=model_path,
-                    n_ctx=n_ctx,
-                    n_gpu_layers=n_gpu_layers,
-                    verbose=verbose
+                    verbose=verbose,
+                    **spec.llama_kwargs()
                 )
             
-            self.loaded_models[model_path] = llm
+            self.loaded_models.put(model_path, llm, footprint, info={
+                'n_ctx': spec.n_ctx,
+                'n_gpu_layers': spec.n_gpu_layers,
+                'mmproj_path': mmproj_path,
+                'chat_handler': chat_handler_kind if mmproj_path else None,
+                'spec': spec,
+            })
             print(f"✅ Model loaded successfully: {os.path.basename(model_path)}")
+            print(self.loaded_models.format_stats())
             return True
             
         except FileNotFoundError as e:
@@ -108,6 +333,114 @@ class InferenceEngine:
             print(f"   Traceback:\n{traceback.format_exc()}")
             return False
     
+    def _rebuild_context(self, model_path: str, llm: Any, current: LoadSpec, spec: LoadSpec) -> bool:
+        """
+        只重建 llama 上下文（KV 缓存、批处理缓冲区），保留已加载的权重
+        
+        依赖 llama-cpp-python 的内部结构（_model / _ctx / _batch / context_params），
+        结构不符或重建失败时返回 False，由调用方回退到完整重新加载
+        
+        Args:
+            model_path: 模型键
+            llm: 已加载的 Llama 实例
+            current: 当前规格
+            spec: 请求的规格
+        
+        Returns:
+            是否重建成功
+        """
+        params = getattr(llm, 'context_params', None)
+        model = getattr(llm, '_model', None)
+        stack = getattr(llm, '_stack', None)
+        if params is None or model is None or stack is None or not hasattr(llm, '_ctx'):
+            return False
+        
+        try:
+            from llama_cpp import _internals as internals
+        except ImportError:
+            return False
+        
+        print(f"🔁 Rebuilding context only ({current.describe_difference(spec)}), reusing loaded weights")
+        
+        footprint = spec.device_footprint()
+        self.loaded_models.make_room(footprint, exclude=(model_path,))
+        
+        n_batch = min(spec.n_ctx, spec.n_batch)
+        threads = spec.thread_kwargs()
+        fields = {
+            'n_ctx': spec.n_ctx,
+            'n_batch': n_batch,
+            'type_k': GGML_TYPES[spec.type_k],
+            'type_v': GGML_TYPES[spec.type_v],
+            'n_threads': threads['n_threads'],
+            'n_threads_batch': threads['n_threads_batch'],
+            'offload_kqv': spec.offload_kqv,
+        }
+        # llama-cpp-python 0.3.10+ 使用 flash_attn_type 枚举（0=关闭, 1=开启），更早的版本使用布尔字段
+        if hasattr(params, 'flash_attn_type'):
+            fields['flash_attn_type'] = 1 if spec.flash_attn else 0
+        elif hasattr(params, 'flash_attn'):
+            fields['flash_attn'] = spec.flash_attn
+        if hasattr(params, 'n_ubatch'):
+            fields['n_ubatch'] = min(threads['n_ubatch'], n_batch)
+        if hasattr(params, 'logits_all'):
+            fields['logits_all'] = spec.logits_all
+        previous = {name: getattr(params, name) for name in fields if hasattr(params, name)}
+        
+        try:
+            for name, value in fields.items():
+                if hasattr(params, name):
+                    setattr(params, name, value)
+            new_ctx = internals.LlamaContext(model=model, params=params, verbose=llm.verbose)
+            new_batch = internals.LlamaBatch(n_tokens=n_batch, embd=0, n_seq_max=spec.n_ctx, verbose=llm.verbose)
+        except Exception as e:
+            for name, value in previous.items():
+                setattr(params, name, value)
+            print(f"⚠️  Context rebuild failed, falling back to full reload: {e}")
+            return False
+        
+        old_ctx, old_batch = llm._ctx, getattr(llm, '_batch', None)
+        llm._ctx = stack.enter_context(contextlib.closing(new_ctx))
+        llm._batch = stack.enter_context(contextlib.closing(new_batch))
+        for old in (old_ctx, old_batch):
+            if old is not None:
+                old.close()
+        
+        n_vocab = llm.n_vocab()
+        llm.n_batch = n_batch
+        if hasattr(llm, '_n_ctx'):
+            llm._n_ctx = spec.n_ctx
+        if hasattr(llm, '_logits_all'):
+            llm._logits_all = spec.logits_all
+        llm.n_tokens = 0
+        if hasattr(llm, '_requires_eval'):
+            llm._requires_eval = True
+        llm.input_ids = np.ndarray((spec.n_ctx,), dtype=np.intc)
+        llm.scores = np.ndarray((spec.n_ctx if spec.logits_all else n_batch, n_vocab), dtype=np.single)
+        
+        self.loaded_models.update(model_path, footprint, info={
+            'n_ctx': spec.n_ctx,
+            'spec': spec,
+        })
+        print(f"✅ Context rebuilt: n_ctx={spec.n_ctx}, n_batch={n_batch}, kv={spec.type_k}/{spec.type_v}, "
+              f"flash_attn={spec.flash_attn}")
+        return True
+    
+    def _ensure_chat_handler(self, model_path: str, llm: Any, mmproj_path: str, kind: str, verbose: bool):
+        """
+        已加载的模型与请求的聊天处理器/mmproj 不一致时，只替换处理器（复用已加载的权重）
+        """
+        info = self.loaded_models.get_info(model_path)
+        if info is None:
+            return
+        if info.get('chat_handler') == kind and info.get('mmproj_path') == mmproj_path:
+            return
+        
+        print(f"🔁 Switching chat handler to {kind} (reusing loaded weights)")
+        llm.chat_handler = _create_chat_handler(kind, mmproj_path, verbose)
+        info['chat_handler'] = kind
+        info['mmproj_path'] = mmproj_path
+    
     def unload_model(self, model_path: str):
         """
         卸载模型
@@ -115,10 +448,239 @@ class InferenceEngine:
         Args:
             model_path: 模型文件路径
         """
-        if model_path in self.loaded_models:
-            del self.loaded_models[model_path]
-            if model_path in self.model_contexts:
-                del self.model_contexts[model_path]
+        self._await_preload(model_path)
+        with self._load_lock:
+            self.loaded_models.remove(model_path)
+            self.model_contexts.pop(model_path, None)
+            self.prefix_cache.invalidate(model_path)
+    
+    def _get_loaded(self, model_path: str) -> Any:
+        """获取已加载的模型实例（正在后台预加载时先等待）"""
+        self._await_preload(model_path)
+        if model_path not in self.loaded_models:
+            raise ValueError(f"Model not loaded: {model_path}")
+        return self.loaded_models[model_path]
+    
+    @staticmethod
+    def _count_tokens(llm: Any, text: str) -> Optional[int]:
+        """统计文本的 token 数（用于精确计算 tokens/s，失败时返回 None）"""
+        if not text:
+            return 0
+        try:
+            return len(llm.tokenize(text.encode('utf-8'), add_bos=False, special=True))
+        except Exception:
+            return None
+    
+    def stream_text(
+        self,
+        model_path: str,
+        prompt: str,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        prefix: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本
+        
+        Args:
+            model_path: 模型路径
+            prompt: 输入提示
+            max_tokens: 最大生成 token 数
+            temperature: 温度参数
+            top_p: Top-p 采样参数
+            prefix: prompt 中跨运行不变的前缀（如系统提示词），提供时复用其 KV 缓存
+            **kwargs: 其他生成参数
+        
+        Yields:
+            生成的文本片段
+        """
+        llm = self._get_loaded(model_path)
+        kwargs.pop('stream', None)
+        
+        if prefix:
+            self._prepare_prefix(model_path, llm, prompt, prefix)
+        
+        for chunk in llm(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            echo=False,
+            stream=True,
+            **kwargs
+        ):
+            yield chunk['choices'][0]['text']
+    
+    def _prepare_prefix(self, model_path: str, llm: Any, prompt: str, prefix: str):
+        """
+        让模型的 KV 缓存以 prompt 的固定前缀开头
+        
+        - 模型当前的 KV 缓存已包含该前缀：无需处理（llama-cpp 会自动复用）
+        - 前缀缓存中有保存的状态：直接恢复
+        - 否则：单独预填充前缀并保存状态，供之后的运行使用
+        
+        随后的生成只需对前缀之后的部分做预填充；任何失败都只会跳过缓存
+        
+        Args:
+            model_path: 模型路径
+            llm: 已加载的 Llama 实例
+            prompt: 完整 prompt
+            prefix: prompt 的固定前缀
+        """
+        cache = self.prefix_cache
+        if not cache.enabled or not prompt.startswith(prefix):
+            return
+        
+        try:
+            prompt_tokens = llm.tokenize(prompt.encode('utf-8'), special=True)
+            prefix_tokens = llm.tokenize(prefix.encode('utf-8'), special=True)
+            
+            # 前缀末尾的 token 可能与后续文本合并，只使用两者一致的部分
+            n_prefix = 0
+            for a, b in zip(prompt_tokens, prefix_tokens):
+                if a != b:
+                    break
+                n_prefix += 1
+            if n_prefix < MIN_PREFIX_TOKENS or n_prefix >= len(prompt_tokens):
+                return
+            tokens = list(prompt_tokens[:n_prefix])
+            
+            if llm.n_tokens >= n_prefix and llm.input_ids[:n_prefix].tolist() == tokens:
+                cache.resident_hits += 1
+                return
+            
+            spec = LoadSpec.from_info(model_path, self.loaded_models.get_info(model_path))
+            key = cache.make_key(model_path, spec, tokens)
+            state = cache.get(key)
+            if state is not None:
+                try:
+                    llm.load_state(state)
+                except Exception:
+                    # 快照与当前模型/llama.cpp 不兼容，删除后重新预填充
+                    cache.discard(key)
+                    raise
+                print(f"🧠 Restored cached prefix ({n_prefix} tokens)")
+                return
+            
+            llm.reset()
+            llm.eval(tokens)
+            state = compact_state(llm.save_state(), keep_all_logits=getattr(llm, '_logits_all', False))
+            if cache.put(key, state):
+                print(f"🧠 Cached prefix ({n_prefix} tokens)")
+        
+        except Exception as e:
+            print(f"⚠️  Prefix cache skipped: {e}")
+            try:
+                llm.reset()
+            except Exception:
+                pass
+    
+    def stream_chat(self, model_path: str, messages: List[Dict], **kwargs) -> Iterator[str]:
+        """
+        流式对话生成（支持包含图像的消息）
+        
+        Args:
+            model_path: 模型路径
+            messages: 对话消息列表
+            **kwargs: 其他生成参数
+        
+        Yields:
+            生成的文本片段
+        """
+        llm = self._get_loaded(model_path)
+        kwargs.pop('stream', None)
+        
+        for chunk in llm.create_chat_completion(messages=messages, stream=True, **kwargs):
+            yield chunk['choices'][0]['delta'].get('content') or ""
+    
+    def _response_key(self, namespace: str, model_path: str, payload: Dict) -> str:
+        """
+        计算请求键（用于结果缓存和进行中请求的合并）
+        
+        模型身份包含模型文件、mmproj 文件和聊天处理器；payload 包含提示词/消息和采样参数
+        """
+        info = self.loaded_models.get_info(model_path) or {}
+        mmproj_path = info.get('mmproj_path')
+        identity = (
+            file_identity(model_path),
+            file_identity(mmproj_path) if mmproj_path else None,
+            info.get('chat_handler'),
+        )
+        return make_key(namespace, identity, payload)
+    
+    def _cache_hit(self, on_token: Optional[Callable[[str], None]]) -> Callable[[str], None]:
+        """命中缓存或共享其他请求的结果时：把完整结果交给流式回调"""
+        def handle(text: str):
+            if on_token is not None:
+                on_token(text)
+        return handle
+    
+    def _consume(self, model_path: str, chunks: Iterator[str],
+                 on_token: Optional[Callable[[str], None]], metrics: StreamMetrics,
+                 should_stop: Optional[Callable[[str], bool]] = None) -> str:
+        """消费流式输出（生成期间禁止淘汰该模型，例如后台预加载其他模型时）"""
+        with self.loaded_models.pinned(model_path):
+            return consume_stream(chunks, on_token, metrics, should_stop)
+    
+    def _finish_metrics(self, model_path: str, metrics: StreamMetrics, text: str):
+        """结束耗时统计（按生成文本的精确 token 数）并输出日志"""
+        metrics.finish(self._count_tokens(self.loaded_models.get(model_path), text))
+        print(metrics.format())
+    
+    def _run_stream(self, model_path: str, chunks: Iterator[str],
+                    on_token: Optional[Callable[[str], None]],
+                    metrics: Optional[StreamMetrics] = None) -> str:
+        """消费流式输出，耗时统计写入调用方传入的 metrics（每次请求各自持有，互不覆盖）"""
+        metrics = metrics if metrics is not None else StreamMetrics()
+        metrics.reset()
+        text = self._consume(model_path, chunks, on_token, metrics)
+        self._finish_metrics(model_path, metrics, text)
+        return text
+    
+    def _run_with_thinking_budget(self, model_path: str, prompt: str, max_tokens: int, temperature: float,
+                                  top_p: float, thinking_budget: int,
+                                  on_token: Optional[Callable[[str], None]],
+                                  metrics: Optional[StreamMetrics] = None, **kwargs) -> str:
+        """
+        带思考预算的生成：思考标签内的 token 数超出预算时停止解码，
+        在已生成的文本后闭合思考块，用剩余的 max_tokens 继续生成回答
+        
+        续写的 prompt 以原 prompt 和已生成的文本开头，llama-cpp 会复用已有的 KV 缓存，只需预填充结束标签
+        """
+        metrics = metrics if metrics is not None else StreamMetrics()
+        metrics.reset()
+        budget = ThinkingBudget(thinking_budget)
+        text = self._consume(
+            model_path,
+            self.stream_text(model_path, prompt, max_tokens, temperature, top_p, **kwargs),
+            on_token,
+            metrics,
+            should_stop=budget.feed
+        )
+        if not budget.exceeded:
+            self._finish_metrics(model_path, metrics, text)
+            return text
+        
+        closing = budget.closing_text()
+        print(f"✂️  Thinking budget reached ({thinking_budget} tokens), closing the thinking block")
+        if on_token is not None:
+            on_token(closing)
+        remaining = max_tokens - budget.tokens
+        if remaining <= 0:
+            self._finish_metrics(model_path, metrics, text)
+            return text + closing
+        
+        kwargs.pop('prefix', None)
+        answer = self._consume(
+            model_path,
+            self.stream_text(model_path, prompt + text + closing, remaining, temperature, top_p, **kwargs),
+            on_token,
+            metrics
+        )
+        self._finish_metrics(model_path, metrics, text + answer)
+        return text + closing + answer
     
     def generate_text(
         self,
@@ -127,6 +689,9 @@ class InferenceEngine:
         max_tokens: int = 512,
         temperature: float = 0.7,
         top_p: float = 0.9,
+        on_token: Optional[Callable[[str], None]] = None,
+        metrics: Optional[StreamMetrics] = None,
+        record: bool = True,
         **kwargs
     ) -> str:
         """
@@ -138,32 +703,208 @@ class InferenceEngine:
             max_tokens: 最大生成 token 数
             temperature: 温度参数
             top_p: Top-p 采样参数
-            **kwargs: 其他生成参数
+            on_token: 流式回调，每生成一个片段调用一次（可选）
+            metrics: 耗时统计对象（可选），实际执行生成时由引擎填充
+            record: 是否记录到使用历史（批量生成已整体记录一次，逐个生成时为 False）
+            **kwargs: 其他生成参数（thinking_budget: 思考 token 预算，None 或负数表示不限制）
         
         Returns:
             生成的文本
         """
-        if model_path not in self.loaded_models:
-            raise ValueError(f"Model not loaded: {model_path}")
+        self._get_loaded(model_path)
+        if record:
+            self._record_use(model_path)
         
-        llm = self.loaded_models[model_path]
+        thinking_budget = kwargs.pop('thinking_budget', None)
+        if thinking_budget is not None and thinking_budget < 0:
+            thinking_budget = None
+        
+        # prefix 只影响预填充方式，不影响结果
+        payload = {'prompt': prompt, 'max_tokens': max_tokens, 'temperature': temperature, 'top_p': top_p,
+                   'thinking_budget': thinking_budget}
+        payload.update((k, v) for k, v in kwargs.items() if k != 'prefix')
+        key = self._response_key('llama.text', model_path, payload)
+        
+        def run() -> str:
+            if thinking_budget is not None:
+                return self._run_with_thinking_budget(model_path, prompt, max_tokens, temperature, top_p,
+                                                      thinking_budget, on_token, metrics, **kwargs)
+            return self._run_stream(
+                model_path,
+                self.stream_text(model_path, prompt, max_tokens, temperature, top_p, **kwargs),
+                on_token,
+                metrics
+            )
         
         try:
-            output = llm(
-                prompt,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                echo=False,
-                **kwargs
+            return self.response_cache.get_or_generate(
+                key,
+                run,
+                on_hit=self._cache_hit(on_token),
+                cacheable=is_deterministic(temperature, kwargs.get('seed'))
             )
-            
-            return output['choices'][0]['text']
         
         except Exception as e:
             print(f"❌ Generation failed: {e}")
             return f"Error: {str(e)}"
     
+    def generate_batch(
+        self,
+        model_path: str,
+        prompts: List[str],
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        n_parallel: int = DEFAULT_PARALLEL,
+        on_result: Optional[Callable[[int, str], None]] = None,
+        **kwargs
+    ) -> List[str]:
+        """
+        批量生成文本
+        
+        多个 prompt 在同一上下文中以独立序列并行解码（见 ParallelGenerator），
+        llama-cpp-python 不支持或只有一个 prompt 时逐个生成
+        
+        Args:
+            model_path: 模型路径
+            prompts: prompt 列表
+            max_tokens: 每个 prompt 的最大生成 token 数
+            temperature: 温度参数
+            top_p: Top-p 采样参数
+            n_parallel: 并行序列数（slot 数），1 表示逐个生成
+            on_result: 某个 prompt 完成时的回调 (序号, 文本)
+            **kwargs: 其他生成参数（top_k, min_p, repeat_penalty, stop, seed,
+                      thinking_budget: 思考 token 预算，设置时逐个生成）
+        
+        Returns:
+            与 prompts 一一对应的生成结果
+        """
+        llm = self._get_loaded(model_path)
+        self._record_use(model_path)
+        prompts = list(prompts)
+        
+        # 固定 seed 时每个 prompt 使用 seed + 序号，结果与调度顺序无关
+        seed = kwargs.pop('seed', None)
+        seeds = [seed + i for i in range(len(prompts))] if seed is not None and seed >= 0 else None
+        cacheable = is_deterministic(temperature, seed)
+        kwargs.pop('prefix', None)
+        if kwargs.get('thinking_budget') is not None and kwargs['thinking_budget'] < 0:
+            kwargs.pop('thinking_budget')
+        
+        results: List[Optional[str]] = [None] * len(prompts)
+        keys = []
+        for index, prompt in enumerate(prompts):
+            payload = {'prompt': prompt, 'max_tokens': max_tokens, 'temperature': temperature, 'top_p': top_p,
+                       'seed': seeds[index] if seeds else None}
+            payload.update(kwargs)
+            keys.append(self._response_key('llama.batch', model_path, payload))
+            cached = self.response_cache.get(keys[-1]) if cacheable else None
+            if cached is not None:
+                results[index] = cached
+                if on_result is not None:
+                    on_result(index, cached)
+        
+        pending = [index for index, result in enumerate(results) if result is None]
+        if len(pending) < len(prompts):
+            print(f"♻️  Response cache hit for {len(prompts) - len(pending)} of {len(prompts)} prompt(s)")
+        
+        def complete(index: int, text: str):
+            results[index] = text
+            if cacheable and not text.startswith("Error:"):
+                self.response_cache.put(keys[index], text)
+            if on_result is not None:
+                on_result(index, text)
+        
+        use_parallel = n_parallel > 1 and len(pending) > 1
+        if use_parallel and kwargs.get('thinking_budget') is not None:
+            print("🧠 Thinking budget set, generating prompts sequentially")
+            use_parallel = False
+        if use_parallel and not parallel_supported(llm):
+            print("⚠️  This llama-cpp-python build lacks the internals needed for parallel decoding, "
+                  "generating prompts sequentially")
+            use_parallel = False
+        
+        if use_parallel:
+            spec = LoadSpec.from_info(model_path, self.loaded_models.get_info(model_path))
+            
+            def reserve(n_ctx: int):
+                # 并行上下文的 KV 缓存独立于模型自身的上下文
+                type_k, type_v = (spec.type_k, spec.type_v) if spec is not None else ('f16', 'f16')
+                kv_bytes = estimate_kv_bytes(model_path, n_ctx, type_k, type_v)
+                if kv_bytes:
+                    n_gpu_layers, offload_kqv = (spec.n_gpu_layers, spec.offload_kqv) if spec is not None else (-1, True)
+                    self.loaded_models.make_room(
+                        split_allocations(model_path, {'kv_cache': kv_bytes}, n_gpu_layers, offload_kqv),
+                        exclude=(model_path,),
+                    )
+            
+            generator = ParallelGenerator(llm, n_parallel)
+            try:
+                with self.loaded_models.pinned(model_path):
+                    outputs = generator.generate(
+                        [prompts[index] for index in pending],
+                        max_tokens=max_tokens,
+                        temperature=temperature,
+                        top_p=top_p,
+                        top_k=kwargs.get('top_k', 40),
+                        min_p=kwargs.get('min_p', 0.05),
+                        repeat_penalty=kwargs.get('repeat_penalty', 1.1),
+                        stop=kwargs.get('stop'),
+                        seeds=[seeds[index] for index in pending] if seeds else None,
+                        on_result=lambda i, text: complete(pending[i], text),
+                        reserve=reserve
+                    )
+                for i, text in enumerate(outputs):
+                    if results[pending[i]] is None and text is not None:
+                        complete(pending[i], text)
+                print(generator.format_stats())
+            except Exception as e:
+                print(f"⚠️  Parallel decoding failed, falling back to sequential generation: {e}")
+                import traceback
+                traceback.print_exc()
+        
+        # 逐个生成（不支持并行、只有一个 prompt，或并行解码失败后剩余的 prompt）
+        for index in pending:
+            if results[index] is None:
+                generate_kwargs = dict(kwargs)
+                if seeds:
+                    generate_kwargs['seed'] = seeds[index]
+                complete(index, self.generate_text(model_path, prompts[index], max_tokens, temperature, top_p,
+                                                   record=False, **generate_kwargs))
+        
+        return results
+    
+    def chat_completion(
+        self,
+        model_path: str,
+        messages: List[Dict],
+        on_token: Optional[Callable[[str], None]] = None,
+        metrics: Optional[StreamMetrics] = None,
+        **kwargs
+    ) -> str:
+        """
+        对话生成（内部使用流式输出并记录耗时统计）
+        
+        Args:
+            model_path: 模型路径
+            messages: 对话消息列表
+            on_token: 流式回调，每生成一个片段调用一次（可选）
+            metrics: 耗时统计对象（可选），实际执行生成时由引擎填充
+            **kwargs: 其他生成参数
+        
+        Returns:
+            生成的文本
+        """
+        self._await_preload(model_path)
+        self._record_use(model_path)
+        key = self._response_key('llama.chat', model_path, dict(kwargs, messages=messages))
+        return self.response_cache.get_or_generate(
+            key,
+            lambda: self._run_stream(model_path, self.stream_chat(model_path, messages, **kwargs), on_token, metrics),
+            on_hit=self._cache_hit(on_token),
+            cacheable=is_deterministic(kwargs.get('temperature'), kwargs.get('seed'))
+        )
+    
     def generate_with_image(
         self,
         model_path: str,
@@ -171,6 +912,8 @@ class InferenceEngine:
         prompt: str,
         max_tokens: int = 512,
         temperature: float = 0.7,
+        on_token: Optional[Callable[[str], None]] = None,
+        metrics: Optional[StreamMetrics] = None,
         **kwargs
     ) -> str:
         """
@@ -182,15 +925,14 @@ class InferenceEngine:
             prompt: 文本提示
             max_tokens: 最大生成 token 数
             temperature: 温度参数
+            on_token: 流式回调，每生成一个片段调用一次（可选）
+            metrics: 耗时统计对象（可选），实际执行生成时由引擎填充
             **kwargs: 其他参数
         
         Returns:
             生成的文本
         """
-        if model_path not in self.loaded_models:
-            raise ValueError(f"Model not loaded: {model_path}")
-        
-        llm = self.loaded_models[model_path]
+        self._get_loaded(model_path)
         
         try:
             # 构建消息格式
@@ -204,42 +946,55 @@ class InferenceEngine:
                 }
             ]
             
-            output = llm.create_chat_completion(
-                messages=messages,
+            return self.chat_completion(
+                model_path,
+                messages,
+                on_token=on_token,
+                metrics=metrics,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 **kwargs
             )
-            
-            return output['choices'][0]['message']['content']
         
         except Exception as e:
             print(f"❌ Vision generation failed: {e}")
             return f"Error: {str(e)}"
     
-    def is_model_loaded(self, model_path: str) -> bool:
-        """检查模型是否已加载"""
-        return model_path in self.loaded_models
+    def is_model_loaded(self, model_path: str, **kwargs) -> bool:
+        """
+        检查模型是否已加载
+        
+        Args:
+            model_path: 模型文件路径
+            **kwargs: 加载参数，提供时还要求已加载的实例满足这些参数
+        
+        Returns:
+            是否已加载（且可直接复用）
+        """
+        self._await_preload(model_path)
+        if model_path not in self.loaded_models:
+            return False
+        if not kwargs:
+            return True
+        current = LoadSpec.from_info(model_path, self.loaded_models.get_info(model_path))
+        return current is None or current.satisfies(LoadSpec.from_kwargs(model_path, **kwargs))
     
     def get_loaded_models(self) -> List[str]:
         """获取所有已加载的模型路径"""
         return list(self.loaded_models.keys())
     
+    def get_pool_stats(self) -> Dict:
+        """获取模型池统计信息（命中/未命中/淘汰次数、占用和预算）"""
+        return self.loaded_models.stats()
+    
     def clear_all(self):
         """清除所有已加载的模型"""
-        # 显式删除模型对象以释放内存
-        for model_path in list(self.loaded_models.keys()):
-            try:
-                del self.loaded_models[model_path]
-            except:
-                pass
-        
-        self.loaded_models.clear()
-        self.model_contexts.clear()
-        
-        # 强制垃圾回收
-        import gc
-        gc.collect()
+        self._await_preload()
+        # 释放模型池中的所有模型（内部会关闭模型并执行垃圾回收）
+        with self._load_lock:
+            self.loaded_models.clear()
+            self.model_contexts.clear()
+            self.prefix_cache.invalidate()
         
         # 如果使用CUDA，清理GPU缓存
         try:
@@ -250,3 +1005,17 @@ class InferenceEngine:
                 print("✅ GPU cache cleared")
         except ImportError:
             pass
+
+
+# 全局单例（所有节点共享同一个推理引擎和模型池）
+_inference_engine = None
+_inference_engine_lock = threading.Lock()
+
+
+def get_inference_engine() -> InferenceEngine:
+    """获取全局推理引擎实例"""
+    global _inference_engine
+    with _inference_engine_lock:
+        if _inference_engine is None:
+            _inference_engine = InferenceEngine()
+        return _inference_engine
@@ -0,0 +1,393 @@
+"""
+Load Spec - 模型加载参数规格
+描述影响内存和计算的加载参数，用于判断已加载的实例能否复用、
+只需重建上下文，还是必须重新加载权重
+"""
+
+import os
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+try:
+    from ..utils.device_optimizer import recommend_threads, recommend_ubatch
+except (ImportError, ValueError):
+    from utils.device_optimizer import recommend_threads, recommend_ubatch
+
+try:
+    from ..utils.gguf_reader import UNQUANTIZED_KV_TYPES
+except (ImportError, ValueError):
+    from utils.gguf_reader import UNQUANTIZED_KV_TYPES
+
+try:
+    from .model_pool import estimate_allocations, split_allocations
+except ImportError:
+    from core.model_pool import estimate_allocations, split_allocations
+
+
+# KV 缓存类型名到 ggml_type 枚举值的映射（传给 llama_cpp.Llama 的 type_k / type_v）
+GGML_TYPES = {
+    'f32': 0,
+    'f16': 1,
+    'q4_0': 2,
+    'q4_1': 3,
+    'q5_0': 6,
+    'q5_1': 7,
+    'q8_0': 8,
+    'iq4_nl': 20,
+    'bf16': 30,
+}
+
+DEFAULT_KV_TYPE = 'f16'
+
+# 模型配置中可选的加载参数（存在时由 load_kwargs_from_config 传给 load_model）
+OPTIONAL_LOAD_FIELDS = ('n_batch', 'n_ubatch', 'n_threads', 'n_threads_batch', 'type_k', 'type_v',
+                        'flash_attn', 'profile', 'offload_kqv', 'use_mlock')
+
+# 加载器节点 KV 类型选项中表示 "按加载档位 / 调优结果" 的值
+KV_TYPE_DEFAULT_CHOICE = 'default'
+
+# 环境变量：默认加载档位
+PROFILE_ENV = "GGUF_VLM_LOAD_PROFILE"
+
+DEFAULT_PROFILE = 'balanced'
+
+
+@dataclass(frozen=True)
+class LoadProfile:
+    """
+    加载档位：按请求需要的功能确定影响内存的加载参数
+    
+    load_model 显式传入的参数优先于档位
+    """
+    
+    name: str
+    description: str
+    # 保留每个位置的 logits（n_ctx × n_vocab × 4 字节），只有需要逐 token logprobs 时才开启
+    logits_all: bool = False
+    n_batch: int = 512
+    # None 表示按 CPU 拓扑自动选择
+    n_ubatch: Optional[int] = None
+    # KV 缓存随层放在 GPU 上
+    offload_kqv: bool = True
+    # 把权重锁定在物理内存中（占用全部权重大小的不可换出内存）
+    use_mlock: bool = False
+    type_k: str = DEFAULT_KV_TYPE
+    type_v: str = DEFAULT_KV_TYPE
+
+
+LOAD_PROFILES = {
+    'lean': LoadProfile(
+        name='lean',
+        description="最小内存：小批次、q8_0 K 缓存、不保留 logits",
+        n_batch=256,
+        n_ubatch=128,
+        type_k='q8_0',
+    ),
+    'balanced': LoadProfile(
+        name='balanced',
+        description="默认：512 批次、f16 KV 缓存、不保留 logits",
+    ),
+    'logprobs': LoadProfile(
+        name='logprobs',
+        description="需要逐 token logprobs：保留全部位置的 logits",
+        logits_all=True,
+    ),
+}
+
+
+def get_load_profile(name: str = None) -> LoadProfile:
+    """
+    获取加载档位
+    
+    Args:
+        name: 档位名，None 时读取环境变量 GGUF_VLM_LOAD_PROFILE（默认 balanced）
+    
+    Returns:
+        LoadProfile
+    """
+    if not name:
+        name = (os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE).strip().lower()
+        if name not in LOAD_PROFILES:
+            print(f"⚠️  Ignoring invalid {PROFILE_ENV}={name!r}")
+            name = DEFAULT_PROFILE
+    key = str(name).strip().lower()
+    if key not in LOAD_PROFILES:
+        raise ValueError(f"Unknown load profile: {name} (available: {', '.join(LOAD_PROFILES)})")
+    return LOAD_PROFILES[key]
+
+
+def select_profile(name: str = None, logprobs: bool = False) -> LoadProfile:
+    """
+    按请求需要的功能选择加载档位
+    
+    Args:
+        name: 指定的档位名（None 表示默认档位）
+        logprobs: 是否需要逐 token logprobs（需要保留全部 logits）
+    
+    Returns:
+        LoadProfile
+    """
+    profile = get_load_profile(name)
+    if logprobs and not profile.logits_all:
+        return LOAD_PROFILES['logprobs']
+    return profile
+
+
+def kv_load_options(type_k: str = None, type_v: str = None, flash_attn: bool = False) -> Dict:
+    """
+    把加载器节点的 KV 缓存和 flash attention 选项转换为加载参数
+    
+    Args:
+        type_k: K 缓存类型（'default' 或空值表示按加载档位）
+        type_v: V 缓存类型（同上）
+        flash_attn: 是否启用 flash attention
+    
+    Returns:
+        加载参数（只包含显式选择的项）
+    """
+    options = {}
+    for name, value in (('type_k', type_k), ('type_v', type_v)):
+        if value and value != KV_TYPE_DEFAULT_CHOICE:
+            options[name] = normalize_kv_type(value)
+    if flash_attn:
+        options['flash_attn'] = True
+    return options
+
+
+def _pick(kwargs: Dict, name: str, default):
+    """显式传入的参数（非 None / 空值）优先，否则使用档位的值"""
+    value = kwargs.get(name)
+    return default if value is None or value == '' else value
+
+
+def normalize_kv_type(value) -> str:
+    """
+    规范化 KV 缓存类型（接受类型名或 ggml_type 枚举值）
+    
+    Args:
+        value: 类型名（如 'q8_0'）或枚举值（如 8），None 表示默认
+    
+    Returns:
+        小写类型名
+    """
+    if value is None or value == '':
+        return DEFAULT_KV_TYPE
+    if isinstance(value, int):
+        for name, enum_value in GGML_TYPES.items():
+            if enum_value == value:
+                return name
+        raise ValueError(f"Unknown ggml type id for KV cache: {value}")
+    
+    name = str(value).strip().lower()
+    if name not in GGML_TYPES:
+        raise ValueError(f"Unknown KV cache type: {value} (available: {', '.join(GGML_TYPES)})")
+    return name
+
+
+def _optional_int(value) -> Optional[int]:
+    """正整数或 None（0 / 空值表示自动）"""
+    if value is None or value == '':
+        return None
+    value = int(value)
+    return value if value > 0 else None
+
+
+@dataclass(frozen=True)
+class LoadSpec:
+    """模型加载规格"""
+    
+    model_path: str
+    n_ctx: int = 8192
+    n_gpu_layers: int = -1
+    n_batch: int = 512
+    mmproj_path: Optional[str] = None
+    type_k: str = DEFAULT_KV_TYPE
+    type_v: str = DEFAULT_KV_TYPE
+    logits_all: bool = False
+    # 线程数和物理批大小（None 表示按 CPU 拓扑自动选择），不影响实例能否复用
+    n_threads: Optional[int] = None
+    n_threads_batch: Optional[int] = None
+    n_ubatch: Optional[int] = None
+    offload_kqv: bool = True
+    use_mlock: bool = False
+    # 量化的 V 缓存需要 flash attention，解析时自动开启
+    flash_attn: bool = False
+    # 解析参数时使用的加载档位（只用于日志）
+    profile: str = DEFAULT_PROFILE
+    
+    @classmethod
+    def from_kwargs(cls, model_path: str, **kwargs) -> 'LoadSpec':
+        """
+        从 load_model 的参数创建规格
+        
+        未显式传入的 logits_all、批大小、KV 类型等由加载档位（profile / logprobs 参数）决定；
+        视觉模型不再默认保留全部 logits，llama-cpp-python 的聊天处理器只读取最后一个位置
+        
+        Args:
+            model_path: 模型文件路径
+            **kwargs: load_model 的加载参数
+        
+        Returns:
+            LoadSpec 实例
+        """
+        profile = select_profile(kwargs.get('profile'), bool(kwargs.get('logprobs')))
+        type_v = normalize_kv_type(_pick(kwargs, 'type_v', profile.type_v))
+        return cls(
+            model_path=model_path,
+            n_ctx=int(kwargs.get('n_ctx', 8192)),
+            n_gpu_layers=int(kwargs.get('n_gpu_layers', -1)),
+            n_batch=int(_pick(kwargs, 'n_batch', profile.n_batch)),
+            mmproj_path=kwargs.get('mmproj_path') or None,
+            type_k=normalize_kv_type(_pick(kwargs, 'type_k', profile.type_k)),
+            type_v=type_v,
+            logits_all=bool(_pick(kwargs, 'logits_all', profile.logits_all)),
+            n_threads=_optional_int(kwargs.get('n_threads')),
+            n_threads_batch=_optional_int(kwargs.get('n_threads_batch')),
+            n_ubatch=_optional_int(_pick(kwargs, 'n_ubatch', profile.n_ubatch)),
+            offload_kqv=bool(_pick(kwargs, 'offload_kqv', profile.offload_kqv)),
+            use_mlock=bool(_pick(kwargs, 'use_mlock', profile.use_mlock)),
+            flash_attn=bool(kwargs.get('flash_attn')) or type_v not in UNQUANTIZED_KV_TYPES,
+            profile=profile.name,
+        )
+    
+    @classmethod
+    def from_info(cls, model_path: str, info: Dict) -> Optional['LoadSpec']:
+        """从模型池条目信息恢复规格（没有记录时返回 None）"""
+        spec = info.get('spec') if info else None
+        return spec if isinstance(spec, cls) else None
+    
+    def same_weights(self, other: 'LoadSpec') -> bool:
+        """权重加载方式是否相同（相同时只需重建上下文）"""
+        return (
+            self.model_path == other.model_path
+            and self.n_gpu_layers == other.n_gpu_layers
+            and self.use_mlock == other.use_mlock
+        )
+    
+    def satisfies(self, requested: 'LoadSpec') -> bool:
+        """
+        当前实例能否直接满足请求的规格
+        
+        上下文和批大小不小于请求、KV 类型和位置一致、GPU 层数一致时可复用；
+        mmproj 只影响聊天处理器，不影响权重，由调用方单独切换
+        
+        Args:
+            requested: 请求的规格
+        
+        Returns:
+            是否可以直接复用
+        """
+        return (
+            self.same_weights(requested)
+            and self.n_ctx >= requested.n_ctx
+            and self.n_batch >= requested.n_batch
+            and self.type_k == requested.type_k
+            and self.type_v == requested.type_v
+            and self.offload_kqv == requested.offload_kqv
+            and self.flash_attn == requested.flash_attn
+            and (self.logits_all or not requested.logits_all)
+        )
+    
+    def describe_difference(self, requested: 'LoadSpec') -> str:
+        """描述与请求规格的差异（用于日志）"""
+        changes = []
+        for field_name in ('n_ctx', 'n_gpu_layers', 'n_batch', 'type_k', 'type_v', 'logits_all',
+                           'offload_kqv', 'use_mlock', 'flash_attn'):
+            current = getattr(self, field_name)
+            wanted = getattr(requested, field_name)
+            if current != wanted:
+                changes.append(f"{field_name} {current} -> {wanted}")
+        return ", ".join(changes) if changes else "no change"
+    
+    def llama_kwargs(self) -> Dict:
+        """
+        转换为 llama_cpp.Llama 的构造参数
+        
+        KV 类型为默认值时不传 type_k / type_v，未启用时不传 flash_attn，保持对旧版 llama-cpp-python 的兼容；
+        未指定线程数时按 CPU 拓扑选择（llama-cpp-python 的默认值按 os.cpu_count() 计算，
+        容器内会超出 CPU 配额）
+        """
+        kwargs = {
+            'model_path': self.model_path,
+            'n_ctx': self.n_ctx,
+            'n_gpu_layers': self.n_gpu_layers,
+            'n_batch': self.n_batch,
+            'logits_all': self.logits_all,
+            'offload_kqv': self.offload_kqv,
+            'use_mlock': self.use_mlock,
+        }
+        kwargs.update(self.thread_kwargs())
+        if self.type_k != DEFAULT_KV_TYPE:
+            kwargs['type_k'] = GGML_TYPES[self.type_k]
+        if self.type_v != DEFAULT_KV_TYPE:
+            kwargs['type_v'] = GGML_TYPES[self.type_v]
+        if self.flash_attn:
+            kwargs['flash_attn'] = True
+        return kwargs
+    
+    def thread_kwargs(self) -> Dict:
+        """
+        解析后的线程数和物理批大小
+        
+        Returns:
+            {'n_threads', 'n_threads_batch', 'n_ubatch'}
+        """
+        threads = recommend_threads()
+        n_threads = self.n_threads or threads['n_threads']
+        return {
+            'n_threads': n_threads,
+            'n_threads_batch': self.n_threads_batch or max(threads['n_threads_batch'], n_threads),
+            'n_ubatch': min(self.n_ubatch, self.n_batch) if self.n_ubatch else recommend_ubatch(self.n_batch),
+        }
+    
+    def allocations(self) -> Dict[str, int]:
+        """
+        按分配项估算加载后的内存占用（权重、mmproj、KV 缓存、logits、计算缓冲区）
+        
+        Returns:
+            分配项 -> 字节数
+        """
+        return estimate_allocations(
+            self.model_path, self.mmproj_path, self.n_ctx, self.type_k, self.type_v,
+            self.n_batch, self.thread_kwargs()['n_ubatch'], self.logits_all, self.flash_attn,
+        )
+    
+    def footprint(self) -> int:
+        """估算加载后的总内存占用"""
+        return sum(self.allocations().values())
+    
+    def device_footprint(self) -> Dict[str, int]:
+        """
+        按设备估算加载后的内存占用（按 n_gpu_layers 和 offload_kqv 拆分，见 split_allocations）
+        
+        Returns:
+            {'ram': 字节数, 'vram': 字节数}
+        """
+        return split_allocations(self.model_path, self.allocations(), self.n_gpu_layers, self.offload_kqv)
+    
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        return asdict(self)
+
+
+def load_kwargs_from_config(config: Dict) -> Dict:
+    """
+    从文本模型配置（加载器节点的输出）提取 load_model 的加载参数
+    
+    加载器节点的后台预加载和生成节点使用同一组参数，保证预加载的实例可以直接复用
+    
+    Args:
+        config: 模型配置字典
+    
+    Returns:
+        加载参数
+    """
+    kwargs = {
+        'n_ctx': config.get('n_ctx', 8192),
+        'n_gpu_layers': config.get('n_gpu_layers', -1),
+    }
+    # 批大小、加载档位、自动调优结果（见 core.autotune）等可选参数，未指定时由加载档位决定
+    for name in OPTIONAL_LOAD_FIELDS:
+        if config.get(name) is not None:
+            kwargs[name] = config[name]
+    return kwargs
@@ -0,0 +1,211 @@
+"""
+Model Catalog - 模型下拉列表构建
+节点 INPUT_TYPES 与 /gguf-vlm/refresh-local-* 路由共用，结果由 CacheManager 缓存，
+只有模型目录或注册表文件发生变化时才重新计算；
+模型类别优先来自 GGUF 元数据，读取失败时才使用文件名规则
+"""
+
+from pathlib import Path
+from typing import List, Optional
+
+from .cache_manager import get_cache_manager
+
+try:
+    from ..utils.gguf_reader import get_gguf_metadata
+except (ImportError, ValueError):
+    from utils.gguf_reader import get_gguf_metadata
+
+
+# 视觉类业务类型
+VISION_BUSINESS_TYPES = ('image_analysis', 'video_analysis')
+
+# 视觉模型关键词列表（用于排除）
+VISION_KEYWORDS = [
+    'llava', 'vision', 'multimodal', 'mm',
+    'clip', 'minicpm-v', 'phi-3-vision',
+    'internvl', 'cogvlm', 'mmproj'
+]
+
+# 特定的视觉模型模式（更精确的匹配）
+VISION_PATTERNS = [
+    'qwen-vl', 'qwen2-vl', 'qwen2.5-vl', 'qwen3-vl',  # Qwen VL系列
+    '-vl-', '_vl_', '.vl.',  # 通用VL模式
+]
+
+
+def is_vision_filename(model_file: str) -> bool:
+    """
+    根据文件名判断是否为视觉模型（registry 中没有信息时使用）
+    
+    Args:
+        model_file: 模型文件名
+    
+    Returns:
+        是否为视觉模型
+    """
+    model_lower = model_file.lower()
+    if any(pattern in model_lower for pattern in VISION_PATTERNS):
+        return True
+    return any(keyword in model_lower for keyword in VISION_KEYWORDS)
+
+
+def get_model_kind(loader, model_file: str) -> Optional[str]:
+    """
+    读取模型文件的 GGUF 元数据，判断模型类别
+    
+    Args:
+        loader: ModelLoader 实例
+        model_file: 模型文件名
+    
+    Returns:
+        'text' / 'vision' / 'mmproj'，无法读取元数据时返回 None
+    """
+    metadata = get_gguf_metadata(loader.model_index.find(model_file))
+    return metadata.model_kind if metadata else None
+
+
+def _cache_key(name: str, loader, registry) -> str:
+    """生成缓存键（区分不同的模型目录和注册表文件）"""
+    return f"{name}:{registry.config_path}:{'|'.join(loader.model_index.roots)}"
+
+
+def _watch(loader, registry):
+    """确保模型目录和注册表文件处于监听状态"""
+    get_cache_manager().watch(loader.model_index.roots, [Path(registry.config_path)])
+
+
+def get_local_vision_models(loader, registry) -> List[str]:
+    """
+    获取本地视觉模型列表（已知视觉类型或未知类型的模型）
+    
+    Args:
+        loader: ModelLoader 实例
+        registry: RegistryManager 实例
+    
+    Returns:
+        模型文件名列表
+    """
+    _watch(loader, registry)
+    
+    def build():
+        local_models = []
+        for model_file in loader.list_models():
+            model_info = registry.find_model_by_filename(model_file)
+            if model_info is not None:
+                if model_info.get('business_type') in VISION_BUSINESS_TYPES:
+                    local_models.append(model_file)
+                continue
+            
+            # 未知模型：保留（LLaVA 等模型的语言部分与普通文本模型无法区分），只排除 mmproj 文件
+            if get_model_kind(loader, model_file) != 'mmproj':
+                local_models.append(model_file)
+        return local_models
+    
+    cache = get_cache_manager()
+    return list(cache.get_or_compute(_cache_key("local_vision", loader, registry), build))
+
+
+def get_vision_model_catalog(loader, registry) -> List[str]:
+    """
+    获取带分组标题的视觉模型列表（可下载的图像/视频模型 + 本地模型）
+    
+    Args:
+        loader: ModelLoader 实例
+        registry: RegistryManager 实例
+    
+    Returns:
+        分组后的模型名称列表
+    """
+    _watch(loader, registry)
+    
+    def build():
+        local_models = get_local_vision_models(loader, registry)
+        
+        # 获取不同类型的可下载模型（传递 loader 以检查下载状态）
+        image_models = registry.get_downloadable_models(business_type='image_analysis', model_loader=loader)
+        video_models = registry.get_downloadable_models(business_type='video_analysis', model_loader=loader)
+        
+        categorized_models = []
+        
+        if image_models:
+            categorized_models.append("--- 🖼️ 图像分析模型 ---")
+            categorized_models.extend([name for name, _ in image_models])
+        
+        if video_models:
+            categorized_models.append("--- 🎥 视频分析模型 ---")
+            categorized_models.extend([name for name, _ in video_models])
+        
+        if local_models:
+            categorized_models.append("--- 💾 本地模型 ---")
+            categorized_models.extend(local_models)
+        
+        return categorized_models
+    
+    cache = get_cache_manager()
+    return list(cache.get_or_compute(_cache_key("vision_catalog", loader, registry), build))
+
+
+def get_local_text_models(loader, registry) -> List[str]:
+    """
+    获取本地文本模型列表（优先使用 registry 信息，其次按文件名排除视觉模型）
+    
+    Args:
+        loader: ModelLoader 实例
+        registry: RegistryManager 实例
+    
+    Returns:
+        模型文件名列表
+    """
+    _watch(loader, registry)
+    
+    def build():
+        local_models = []
+        for model_file in loader.list_models():
+            # 首先检查registry信息（最准确）
+            model_info = registry.find_model_by_filename(model_file)
+            if model_info:
+                business_type = model_info.get('business_type')
+                if business_type == 'text_generation':
+                    local_models.append(model_file)
+                    continue
+                elif business_type in VISION_BUSINESS_TYPES:
+                    continue  # 跳过视觉模型
+            
+            # 如果registry中没有信息，使用 GGUF 元数据判断
+            kind = get_model_kind(loader, model_file)
+            if kind is not None:
+                if kind == 'text':
+                    local_models.append(model_file)
+                continue
+            
+            # 元数据不可用时，使用关键词过滤
+            if not is_vision_filename(model_file):
+                local_models.append(model_file)
+        return local_models
+    
+    cache = get_cache_manager()
+    return list(cache.get_or_compute(_cache_key("local_text", loader, registry), build))
+
+
+def get_text_model_catalog(loader, registry) -> List[str]:
+    """
+    获取文本模型列表（本地文本模型 + 可下载的文本模型）
+    
+    Args:
+        loader: ModelLoader 实例
+        registry: RegistryManager 实例
+    
+    Returns:
+        模型名称列表
+    """
+    _watch(loader, registry)
+    
+    def build():
+        local_models = get_local_text_models(loader, registry)
+        
+        # 获取可下载的文本模型（传递 loader 以检查下载状态）
+        downloadable = registry.get_downloadable_models(business_type='text_generation', model_loader=loader)
+        return local_models + [name for name, _ in downloadable]
+    
+    cache = get_cache_manager()
+    return list(cache.get_or_compute(_cache_key("text_catalog", loader, registry), build))
@@ -0,0 +1,340 @@
+"""
+Model Index - 持久化 GGUF 模型索引
+使用 SQLite 记录 (root, 相对路径, size, mtime)，按目录 mtime 增量刷新，避免每次查询都 os.walk
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .cache_manager import CacheManager, get_cache_manager
+
+try:
+    from ..config.paths import PathConfig
+except (ImportError, ValueError):
+    try:
+        from config.paths import PathConfig
+    except ImportError:
+        PathConfig = None
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    root TEXT NOT NULL,
+    rel_dir TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (root, rel_dir)
+);
+CREATE TABLE IF NOT EXISTS files (
+    root TEXT NOT NULL,
+    rel_path TEXT NOT NULL,
+    rel_dir TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    PRIMARY KEY (root, rel_path)
+);
+"""
+
+
+class ModelIndex:
+    """GGUF 模型文件索引（SQLite 持久化 + 内存快照）"""
+    
+    def __init__(self, roots: List[str], db_path: str = None, refresh_interval: float = 2.0,
+                 cache_manager: CacheManager = None):
+        """
+        初始化模型索引
+        
+        Args:
+            roots: 模型根目录列表（嵌套的重复目录会被自动跳过）
+            db_path: SQLite 文件路径，为 None 时使用 ComfyUI user 目录
+            refresh_interval: 两次增量刷新之间的最小间隔（秒），未设置 cache_manager 时生效
+            cache_manager: 缓存管理器；设置后只有目录确实变化时才刷新
+        """
+        self.roots = self.normalize_roots(roots)
+        self.refresh_interval = refresh_interval
+        self.generation = 0
+        
+        self.cache_manager = cache_manager
+        self._gate_generation = None
+        if cache_manager is not None:
+            cache_manager.watch(self.roots)
+        
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
+        self._models: Dict[str, str] = {}
+        self._all_paths: Dict[str, List[str]] = {}
+        self._sorted_names: List[str] = []
+        self._conn = self._open_db(db_path or self._default_db_path())
+        self._rebuild_snapshot()
+    
+    @staticmethod
+    def normalize_roots(roots: List[str]) -> List[str]:
+        """
+        规范化根目录：解析真实路径、去重，并跳过已被其他根目录包含的子目录
+        （例如 clip 与 clip/gguf 同时存在时只保留 clip）
+        
+        Args:
+            roots: 原始根目录列表
+        
+        Returns:
+            规范化后的根目录列表（保持原有顺序）
+        """
+        resolved = []
+        for root in roots:
+            real = os.path.normcase(os.path.realpath(root))
+            if real not in resolved:
+                resolved.append(real)
+        
+        unique_roots = []
+        for root in resolved:
+            nested = any(
+                other != root and root.startswith(other.rstrip(os.sep) + os.sep)
+                for other in resolved
+            )
+            if not nested:
+                unique_roots.append(root)
+        
+        return unique_roots
+    
+    def _default_db_path(self) -> str:
+        """获取默认的索引数据库路径"""
+        if PathConfig is None:
+            return ":memory:"
+        try:
+            return os.path.join(PathConfig.get_cache_dir(), "model_index.sqlite3")
+        except Exception as e:
+            print(f"⚠️  Model index cache dir unavailable, using in-memory index: {e}")
+            return ":memory:"
+    
+    def _open_db(self, db_path: str) -> sqlite3.Connection:
+        """打开（或创建）索引数据库，失败时退回内存数据库"""
+        try:
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            return conn
+        except sqlite3.Error as e:
+            print(f"⚠️  Failed to open model index at {db_path}: {e}")
+            conn = sqlite3.connect(":memory:", check_same_thread=False)
+            conn.executescript(_SCHEMA)
+            return conn
+    
+    def refresh(self, force: bool = False) -> bool:
+        """
+        增量刷新索引：只对 mtime 发生变化的目录重新列举文件
+        
+        Args:
+            force: 是否忽略 refresh_interval 立即刷新
+        
+        Returns:
+            索引内容是否发生变化
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_refresh < self.refresh_interval:
+                return False
+            
+            changed = False
+            try:
+                with self._conn:
+                    for root in self.roots:
+                        if self._refresh_root(root):
+                            changed = True
+            except sqlite3.Error as e:
+                print(f"⚠️  Model index refresh failed: {e}")
+            
+            self._last_refresh = time.monotonic()
+            if changed:
+                self._rebuild_snapshot()
+            return changed
+    
+    def _ensure_fresh(self, force: bool = False):
+        """读取前确保索引最新：优先由缓存管理器判断目录是否变化"""
+        if self.cache_manager is None:
+            self.refresh(force=force)
+            return
+        
+        generation = self.cache_manager.check()
+        if force or generation != self._gate_generation:
+            self.refresh(force=True)
+            self._gate_generation = generation
+    
+    def _refresh_root(self, root: str) -> bool:
+        """刷新单个根目录"""
+        known_dirs = dict(self._conn.execute(
+            "SELECT rel_dir, mtime_ns FROM dirs WHERE root = ?", (root,)
+        ).fetchall())
+        
+        children: Dict[str, List[str]] = {}
+        for rel_dir in known_dirs:
+            if rel_dir:
+                children.setdefault(os.path.dirname(rel_dir), []).append(rel_dir)
+        
+        changed = False
+        visited = set()
+        # 已扫描目录的真实路径：指向祖先目录的符号链接（环）或重复链接只扫描一次
+        seen_real = set()
+        stack = [""]
+        
+        while stack:
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(root, rel_dir) if rel_dir else root
+            real_dir = os.path.normcase(os.path.realpath(abs_dir))
+            if real_dir in seen_real:
+                continue
+            seen_real.add(real_dir)
+            visited.add(rel_dir)
+            
+            try:
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+            
+            if known_dirs.get(rel_dir) == mtime_ns:
+                # 目录未变化：无需列举文件，只需继续检查已知子目录
+                stack.extend(children.get(rel_dir, []))
+                continue
+            
+            subdirs = self._rescan_dir(root, rel_dir, abs_dir)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dirs (root, rel_dir, mtime_ns) VALUES (?, ?, ?)",
+                (root, rel_dir, mtime_ns)
+            )
+            stack.extend(subdirs)
+            changed = True
+        
+        # 清理已删除的目录
+        for rel_dir in set(known_dirs) - visited:
+            self._conn.execute("DELETE FROM dirs WHERE root = ? AND rel_dir = ?", (root, rel_dir))
+            self._conn.execute("DELETE FROM files WHERE root = ? AND rel_dir = ?", (root, rel_dir))
+            changed = True
+        
+        return changed
+    
+    def _rescan_dir(self, root: str, rel_dir: str, abs_dir: str) -> List[str]:
+        """
+        重新列举单个目录中的 GGUF 文件
+        
+        Returns:
+            子目录的相对路径列表
+        """
+        subdirs = []
+        entries = []
+        
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            subdirs.append(os.path.join(rel_dir, entry.name) if rel_dir else entry.name)
+                        elif entry.name.lower().endswith(".gguf"):
+                            stat_result = entry.stat()
+                            rel_path = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                            entries.append((root, rel_path, rel_dir, entry.name,
+                                            stat_result.st_size, stat_result.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"⚠️  Cannot scan directory {abs_dir}: {e}")
+        
+        self._conn.execute("DELETE FROM files WHERE root = ? AND rel_dir = ?", (root, rel_dir))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files (root, rel_path, rel_dir, filename, size, mtime_ns) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            entries
+        )
+        
+        return sorted(subdirs, reverse=True)
+    
+    def _placeholders(self) -> str:
+        """生成 SQL IN 子句的占位符（同一数据库可能被多个索引实例共享）"""
+        return ",".join("?" for _ in self.roots) or "NULL"
+    
+    def _rebuild_snapshot(self):
+        """从数据库重建内存快照，保证后续查询为 O(1)"""
+        root_order = {root: i for i, root in enumerate(self.roots)}
+        rows = self._conn.execute(
+            f"SELECT root, rel_path, filename FROM files WHERE root IN ({self._placeholders()})",
+            self.roots
+        ).fetchall()
+        rows.sort(key=lambda row: (root_order[row[0]], row[1]))
+        
+        models: Dict[str, str] = {}
+        all_paths: Dict[str, List[str]] = {}
+        for root, rel_path, filename in rows:
+            full_path = os.path.join(root, rel_path)
+            # 如果文件名已存在，保留第一个找到的
+            models.setdefault(filename, full_path)
+            all_paths.setdefault(filename, []).append(full_path)
+        
+        self._models = models
+        self._all_paths = all_paths
+        self._sorted_names = sorted(models)
+        self.generation += 1
+    
+    def get_models(self, force_refresh: bool = False) -> Dict[str, str]:
+        """
+        获取 {filename: full_path} 映射（只读，不要修改返回值）
+        
+        Args:
+            force_refresh: 是否强制刷新
+        
+        Returns:
+            文件名到完整路径的字典
+        """
+        self._ensure_fresh(force=force_refresh)
+        return self._models
+    
+    def get_sorted_names(self) -> List[str]:
+        """获取排序后的文件名列表（只读）"""
+        self._ensure_fresh()
+        return self._sorted_names
+    
+    def find(self, filename: str) -> Optional[str]:
+        """按文件名查找第一个匹配路径"""
+        return self.get_models().get(filename)
+    
+    def find_all(self, filename: str) -> List[str]:
+        """按文件名查找所有匹配路径（同名文件可能位于多个目录）"""
+        self._ensure_fresh()
+        return list(self._all_paths.get(filename, []))
+    
+    def get_file_entries(self) -> List[Tuple[str, str, int, int]]:
+        """
+        获取所有索引条目
+        
+        Returns:
+            [(root, rel_path, size, mtime_ns), ...] 列表
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT root, rel_path, size, mtime_ns FROM files WHERE root IN ({self._placeholders()}) "
+                "ORDER BY root, rel_path",
+                self.roots
+            ).fetchall()
+
+
+# 全局索引实例缓存（按规范化后的根目录区分）
+_index_cache: Dict[Tuple[str, ...], ModelIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_model_index(roots: List[str]) -> ModelIndex:
+    """
+    获取或创建模型索引实例（带缓存）
+    
+    Args:
+        roots: 模型根目录列表
+    
+    Returns:
+        ModelIndex 实例
+    """
+    key = tuple(ModelIndex.normalize_roots(roots))
+    
+    with _index_lock:
+        if key not in _index_cache:
+            _index_cache[key] = ModelIndex(list(key), cache_manager=get_cache_manager())
+        return _index_cache[key]
@@ -11,15 +11,22 @@ import folder_paths
 
 # 导入 mmproj 查找器 - 使用相对导入
 try:
-    from ..utils.mmproj_finder import MMProjFinder
+    from ..utils.mmproj_finder import MMProjFinder, get_mmproj_index
 except (ImportError, ValueError):
     # 备用方案
     try:
-        from utils.mmproj_finder import MMProjFinder
+        from utils.mmproj_finder import MMProjFinder, get_mmproj_index
     except ImportError:
         MMProjFinder = None
+        get_mmproj_index = None
         print("⚠️  MMProjFinder not available, using basic mmproj search")
 
+# 导入持久化模型索引
+try:
+    from .model_index import get_model_index
+except (ImportError, ValueError):
+    from core.model_index import get_model_index
+
 
 class ModelLoader:
     """GGUF 模型加载器"""
@@ -36,11 +43,16 @@ class ModelLoader:
         else:
             self.model_dirs = model_dirs
         
-        # 初始化 mmproj 查找器
+        # 持久化模型索引（嵌套的重复目录只扫描一次）
+        self.model_index = get_model_index(self.model_dirs)
+        
+        # 初始化 mmproj 查找器和配对索引
         if MMProjFinder:
             self.mmproj_finder = MMProjFinder(self.model_dirs)
+            self.mmproj_index = get_mmproj_index(self.model_index)
         else:
             self.mmproj_finder = None
+            self.mmproj_index = None
     
     def _get_default_model_dirs(self) -> List[str]:
         """获取默认模型目录"""
@@ -98,30 +110,19 @@ class ModelLoader:
     
     def scan_models(self, log_paths: bool = False) -> Dict[str, str]:
         """
-        扫描所有模型目录，查找 GGUF 文件
+        从持久化索引获取所有 GGUF 文件（按目录 mtime 增量刷新，不再每次 os.walk）
         
         Args:
             log_paths: 是否打印扫描路径
         
         Returns:
-            {filename: full_path} 字典
+            {filename: full_path} 字典（只读）
         """
-        models = {}
+        if log_paths:
+            for root in self.model_index.roots:
+                print(f"📁 Model index root: {root}")
         
-        for base_dir in self.model_dirs:
-            if not os.path.exists(base_dir):
-                continue
-            
-            for root, _, files in os.walk(base_dir):
-                for file in files:
-                    if file.lower().endswith(".gguf"):
-                        full_path = os.path.join(root, file)
-                        
-                        # 如果文件名已存在，保留第一个找到的
-                        if file not in models:
-                            models[file] = full_path
-        
-        return models
+        return self.model_index.get_models()
     
     def find_model(self, filename: str) -> Optional[str]:
         """
@@ -149,24 +150,19 @@ class ModelLoader:
         """
         # 如果指定了 mmproj 文件名，直接查找
         if mmproj_name:
-            # 首先在模型所在目录查找
+            candidates = self.model_index.find_all(mmproj_name)
+            if not candidates:
+                return None
+            
+            # 优先使用模型所在目录中的文件
             model_path = self.find_model(model_filename)
             if model_path:
                 model_dir = os.path.dirname(model_path)
-                mmproj_path = os.path.join(model_dir, mmproj_name)
-                if os.path.exists(mmproj_path):
-                    return mmproj_path
-            
-            # 在所有模型目录中查找
-            for base_dir in self.model_dirs:
-                if not os.path.exists(base_dir):
-                    continue
-                
-                for root, _, files in os.walk(base_dir):
-                    if mmproj_name in files:
-                        return os.path.join(root, mmproj_name)
+                for mmproj_path in candidates:
+                    if os.path.dirname(mmproj_path) == model_dir:
+                        return mmproj_path
             
-            return None
+            return candidates[0]
         
         # 自动查找 mmproj 文件
         model_path = self.find_model(model_filename)
@@ -175,15 +171,20 @@ class ModelLoader:
         
         model_dir = os.path.dirname(model_path)
         
-        # 使用智能查找器（如果可用）
-        if self.mmproj_finder:
-            mmproj_path = self.mmproj_finder.find_mmproj(model_filename, model_dir)
+        # 使用 mmproj 配对索引（如果可用）
+        if self.mmproj_index:
+            mmproj_path = self.mmproj_index.find(model_filename, model_path)
             
+            if mmproj_path:
+                return mmproj_path
+            
+            # 索引中没有同一基础模型的文件时，按文件名模式查找
+            mmproj_path = self.mmproj_finder.find_mmproj(model_filename, model_dir)
             if mmproj_path:
                 return mmproj_path
             
             # 如果没找到，列出可用的 mmproj 文件供参考
-            available_mmproj = self.mmproj_finder.list_all_mmproj_files(model_dir)
+            available_mmproj = self.mmproj_index.list_in_dir(model_dir)
             if available_mmproj:
                 print(f"📁 Available mmproj files in {model_dir}:")
                 for mmproj in available_mmproj:
@@ -231,11 +232,10 @@ class ModelLoader:
         Returns:
             模型文件名列表
         """
-        models = self.scan_models()
-        filenames = list(models.keys())
+        filenames = self.model_index.get_sorted_names()
         
         if pattern:
             pattern_lower = pattern.lower()
             filenames = [f for f in filenames if pattern_lower in f.lower()]
         
-        return sorted(filenames)
+        return list(filenames)
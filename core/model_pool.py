@@ -0,0 +1,676 @@
+"""
+Model Pool - 带内存预算的 LRU 模型池
+按 "文件大小 + mmproj 大小 + KV 缓存 + logits / 计算缓冲区" 估算每个模型的占用，并按 GPU 卸载的层数
+拆分到系统内存和显存两个预算中；加载新模型会超出某个预算时，按最近最少使用顺序卸载占用该设备的旧模型
+"""
+
+import functools
+import gc
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    from ..utils.gguf_reader import UNQUANTIZED_KV_TYPES, get_gguf_metadata
+    from ..utils.offload_planner import ModelLayout, estimate_compute_buffer, probe_device_memory
+except (ImportError, ValueError):
+    from utils.gguf_reader import UNQUANTIZED_KV_TYPES, get_gguf_metadata
+    from utils.offload_planner import ModelLayout, estimate_compute_buffer, probe_device_memory
+
+
+# 环境变量：模型池系统内存预算（GB），0 表示不限制
+BUDGET_ENV = "GGUF_VLM_MODEL_POOL_GB"
+# 环境变量：模型池显存预算（GB），0 表示不限制
+VRAM_BUDGET_ENV = "GGUF_VLM_MODEL_POOL_VRAM_GB"
+# 环境变量：最多同时驻留的模型数量，0 表示不限制
+MAX_MODELS_ENV = "GGUF_VLM_MAX_MODELS"
+
+# 未配置预算时，使用可用设备内存的比例
+DEFAULT_BUDGET_FRACTION = 0.85
+
+# 模型池分别统计的设备（系统内存 / 显存）
+DEVICES = ('ram', 'vram')
+
+# KV 缓存估算器比较的 (type_k, type_v) 组合
+KV_CACHE_CHOICES = (
+    ('f16', 'f16'),
+    ('q8_0', 'f16'),
+    ('q8_0', 'q8_0'),
+    ('q4_0', 'q4_0'),
+)
+
+
+def _env_float(name: str) -> Optional[float]:
+    """读取数值型环境变量"""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        print(f"⚠️  Ignoring invalid {name}={value!r}")
+        return None
+
+
+def detect_memory_budget() -> int:
+    """
+    自动检测模型池的系统内存预算（字节）
+    
+    使用系统内存总量，按 DEFAULT_BUDGET_FRACTION 折算
+    
+    Returns:
+        预算字节数，检测失败时返回 0（不限制）
+    """
+    try:
+        import psutil
+        return int(psutil.virtual_memory().total * DEFAULT_BUDGET_FRACTION)
+    except Exception:
+        pass
+    
+    try:
+        total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        return int(total * DEFAULT_BUDGET_FRACTION)
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+def detect_vram_budget() -> int:
+    """
+    自动检测模型池的显存预算（字节）
+    
+    使用 GPU 显存总量，按 DEFAULT_BUDGET_FRACTION 折算
+    
+    Returns:
+        预算字节数，没有 GPU 时返回 0（不限制，此时模型只占用系统内存）
+    """
+    memory = probe_device_memory()
+    if memory is None:
+        return 0
+    return int(memory[1] * DEFAULT_BUDGET_FRACTION)
+
+
+@functools.lru_cache(maxsize=1)
+def gpu_offload_available() -> bool:
+    """llama-cpp-python 是否支持 GPU 卸载（不支持时 n_gpu_layers 不起作用，全部占用系统内存）"""
+    try:
+        import llama_cpp
+        return bool(llama_cpp.llama_supports_gpu_offload())
+    except Exception:
+        return False
+
+
+def as_device_bytes(footprint) -> Dict[str, int]:
+    """
+    规范化占用：{'ram', 'vram'} 字典，或整数（视为全部在系统内存中）
+    
+    Args:
+        footprint: 字节数或按设备的字节数
+    
+    Returns:
+        {'ram': 字节数, 'vram': 字节数}
+    """
+    if isinstance(footprint, dict):
+        return {device: int(footprint.get(device) or 0) for device in DEVICES}
+    return {'ram': int(footprint or 0), 'vram': 0}
+
+
+def split_allocations(model_path: str, allocations: Dict[str, int], n_gpu_layers: int,
+                      offload_kqv: bool = True) -> Dict[str, int]:
+    """
+    把分配项拆分到系统内存和显存
+    
+    与卸载规划器的布局一致：卸载的重复层（从最后一层开始）和 n_gpu_layers 超过层数时的输出层在显存中，
+    offload_kqv 时这些层的 KV 缓存也在显存中；有层卸载时 mmproj 和计算缓冲区在显存中；
+    其余权重和 llama-cpp-python 的 logits 数组在系统内存中
+    
+    Args:
+        model_path: 模型文件路径
+        allocations: estimate_allocations 的结果（可以只包含部分分配项）
+        n_gpu_layers: 卸载到 GPU 的层数（-1 表示全部）
+        offload_kqv: KV 缓存是否随层放在 GPU 上
+    
+    Returns:
+        {'ram': 字节数, 'vram': 字节数}
+    """
+    total = sum(allocations.values())
+    if n_gpu_layers == 0 or not gpu_offload_available():
+        return {'ram': total, 'vram': 0}
+    
+    weights = allocations.get('weights', 0)
+    layout = ModelLayout.from_gguf(model_path, 0) if weights else None
+    if layout is not None:
+        n_layers = layout.n_layers
+        offloaded = n_layers if n_gpu_layers < 0 else min(n_gpu_layers, n_layers)
+        weights_vram = sum(layout.layer_bytes[n_layers - offloaded:])
+        if n_gpu_layers < 0 or n_gpu_layers > n_layers:
+            weights_vram += layout.output_bytes
+        fraction = offloaded / n_layers
+    else:
+        metadata = get_gguf_metadata(model_path)
+        n_layers = metadata.block_count if metadata is not None else None
+        fraction = 1.0 if n_gpu_layers < 0 or not n_layers else min(n_gpu_layers / n_layers, 1.0)
+        weights_vram = weights * fraction
+    
+    vram = min(int(weights_vram), weights)
+    if offload_kqv:
+        vram += int(allocations.get('kv_cache', 0) * fraction)
+    if fraction > 0:
+        vram += allocations.get('mmproj', 0) + allocations.get('compute', 0)
+    return {'ram': total - vram, 'vram': vram}
+
+
+def estimate_kv_bytes(model_path: str, n_ctx: int, type_k: str = 'f16', type_v: str = 'f16') -> int:
+    """
+    估算 KV 缓存占用（根据 GGUF 元数据，无法读取时返回 0）
+    
+    Args:
+        model_path: 模型文件路径
+        n_ctx: 上下文长度
+        type_k: K 缓存数据类型
+        type_v: V 缓存数据类型
+    
+    Returns:
+        估算字节数
+    """
+    metadata = get_gguf_metadata(model_path)
+    if metadata is None:
+        return 0
+    return metadata.kv_cache_bytes(n_ctx, type_k, type_v) or 0
+
+
+def estimate_kv_options(model_path: str, n_ctx: int, choices=KV_CACHE_CHOICES) -> List[Dict]:
+    """
+    估算各 KV 缓存类型组合在指定上下文长度下的占用（按 GGUF 的层数、KV 头数和头维度）
+    
+    Args:
+        model_path: 模型文件路径
+        n_ctx: 上下文长度
+        choices: (type_k, type_v) 组合
+    
+    Returns:
+        [{'type_k', 'type_v', 'bytes', 'ratio', 'flash_attn'}, ...]，
+        ratio 为相同内存下相对 f16/f16 可容纳的上下文（或并行槽位）倍数；元数据不完整时返回空列表
+    """
+    metadata = get_gguf_metadata(model_path)
+    if metadata is None:
+        return []
+    baseline = metadata.kv_cache_bytes(n_ctx, 'f16', 'f16')
+    if not baseline:
+        return []
+    
+    options = []
+    for type_k, type_v in choices:
+        kv_bytes = metadata.kv_cache_bytes(n_ctx, type_k, type_v)
+        options.append({
+            'type_k': type_k,
+            'type_v': type_v,
+            'bytes': kv_bytes,
+            'ratio': baseline / kv_bytes,
+            'flash_attn': type_v not in UNQUANTIZED_KV_TYPES,
+        })
+    return options
+
+
+def format_kv_options(model_path: str, n_ctx: int, current: tuple = None) -> str:
+    """
+    格式化 KV 缓存估算结果（用于加载器节点的日志）
+    
+    Args:
+        model_path: 模型文件路径
+        n_ctx: 上下文长度
+        current: 当前选择的 (type_k, type_v)，会加入比较并标记
+    
+    Returns:
+        多行文本，无法估算时返回空字符串
+    """
+    choices = list(KV_CACHE_CHOICES)
+    if current and tuple(current) not in choices:
+        choices.append(tuple(current))
+    options = estimate_kv_options(model_path, n_ctx, choices)
+    if not options:
+        return ""
+    
+    lines = [f"📐 KV cache at n_ctx={n_ctx}:"]
+    for option in options:
+        marker = "👉" if current and (option['type_k'], option['type_v']) == tuple(current) else "  "
+        note = ", needs flash_attn" if option['flash_attn'] else ""
+        lines.append(f"  {marker} {option['type_k']}/{option['type_v']}: {_format_gb(option['bytes'])} "
+                     f"({option['ratio']:.1f}x context or slots{note})")
+    return "\n".join(lines)
+
+
+def estimate_allocations(model_path: str, mmproj_path: str = None, n_ctx: int = 8192,
+                         type_k: str = 'f16', type_v: str = 'f16', n_batch: int = 512,
+                         n_ubatch: int = 512, logits_all: bool = False,
+                         flash_attn: bool = False) -> Dict[str, int]:
+    """
+    按分配项估算模型加载后的内存占用
+    
+    Args:
+        model_path: 模型文件路径
+        mmproj_path: mmproj 文件路径（可选）
+        n_ctx: 上下文长度
+        type_k: K 缓存数据类型
+        type_v: V 缓存数据类型
+        n_batch: 逻辑批大小
+        n_ubatch: 物理批大小（影响计算缓冲区）
+        logits_all: 是否保留全部位置的 logits
+        flash_attn: 是否启用 flash attention（不需要完整的注意力分数矩阵）
+    
+    Returns:
+        {'weights', 'mmproj', 'kv_cache', 'logits', 'compute'} 字节数
+    """
+    allocations = {'weights': 0, 'mmproj': 0, 'kv_cache': 0, 'logits': 0, 'compute': 0}
+    for name, path in (('weights', model_path), ('mmproj', mmproj_path)):
+        if path:
+            try:
+                allocations[name] = os.path.getsize(path)
+            except OSError:
+                pass
+    
+    metadata = get_gguf_metadata(model_path)
+    if metadata is None:
+        return allocations
+    allocations['kv_cache'] = metadata.kv_cache_bytes(n_ctx, type_k, type_v) or 0
+    
+    # llama-cpp-python 的 scores 数组：logits_all 时每个位置一行，否则每个批次位置一行（float32）
+    n_vocab = metadata.vocab_size or 0
+    allocations['logits'] = (n_ctx if logits_all else min(n_batch, n_ctx)) * n_vocab * 4
+    
+    layout = ModelLayout(
+        n_layers=metadata.block_count or 0,
+        layer_bytes=[],
+        output_bytes=0,
+        cpu_bytes=0,
+        n_vocab=n_vocab,
+        n_embd=metadata.embedding_length or 0,
+        n_head=metadata.head_count or 0,
+    )
+    allocations['compute'] = estimate_compute_buffer(layout, n_ctx, min(n_ubatch, n_batch), flash_attn)
+    return allocations
+
+
+def estimate_footprint(model_path: str, mmproj_path: str = None, n_ctx: int = 8192,
+                       type_k: str = 'f16', type_v: str = 'f16', n_batch: int = 512,
+                       n_ubatch: int = 512, logits_all: bool = False, flash_attn: bool = False) -> int:
+    """
+    估算模型加载后的内存占用（各分配项之和，见 estimate_allocations）
+    
+    Args:
+        model_path: 模型文件路径
+        mmproj_path: mmproj 文件路径（可选）
+        n_ctx: 上下文长度
+        type_k: K 缓存数据类型
+        type_v: V 缓存数据类型
+        n_batch: 逻辑批大小
+        n_ubatch: 物理批大小
+        logits_all: 是否保留全部位置的 logits
+        flash_attn: 是否启用 flash attention
+    
+    Returns:
+        估算字节数
+    """
+    return sum(estimate_allocations(model_path, mmproj_path, n_ctx, type_k, type_v,
+                                    n_batch, n_ubatch, logits_all, flash_attn).values())
+
+
+def _format_gb(num_bytes: int) -> str:
+    return f"{num_bytes / (1024 ** 3):.2f} GB"
+
+
+class _PoolEntry:
+    """模型池条目"""
+    
+    __slots__ = ('model', 'footprint', 'info', 'pins')
+    
+    def __init__(self, model: Any, footprint: Dict[str, int], info: Dict):
+        self.model = model
+        # 按设备的估算占用 {'ram', 'vram'}
+        self.footprint = footprint
+        self.info = info
+        self.pins = 0
+    
+    @property
+    def total(self) -> int:
+        return sum(self.footprint.values())
+
+
+class ModelPool:
+    """LRU 模型池（兼容 dict 的读写接口）"""
+    
+    def __init__(self, budget_bytes: int = None, max_models: int = None, vram_budget_bytes: int = None):
+        """
+        初始化模型池
+        
+        Args:
+            budget_bytes: 系统内存预算（字节），None 时读取环境变量或自动检测，0 表示不限制
+            max_models: 最多驻留的模型数量，None 时读取环境变量，0 表示不限制
+            vram_budget_bytes: 显存预算（字节），None 时读取环境变量或自动检测，0 表示不限制
+        """
+        if budget_bytes is None:
+            budget_gb = _env_float(BUDGET_ENV)
+            budget_bytes = int(budget_gb * 1024 ** 3) if budget_gb is not None else detect_memory_budget()
+        if vram_budget_bytes is None:
+            budget_gb = _env_float(VRAM_BUDGET_ENV)
+            vram_budget_bytes = int(budget_gb * 1024 ** 3) if budget_gb is not None else detect_vram_budget()
+        if max_models is None:
+            max_models = int(_env_float(MAX_MODELS_ENV) or 0)
+        
+        self.budget_bytes = max(0, budget_bytes)
+        self.vram_budget_bytes = max(0, vram_budget_bytes)
+        self.max_models = max(0, max_models)
+        
+        self._entries: "OrderedDict[str, _PoolEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    
+    @property
+    def budgets(self) -> Dict[str, int]:
+        """各设备的预算（0 表示不限制）"""
+        return {'ram': self.budget_bytes, 'vram': self.vram_budget_bytes}
+    
+    @property
+    def used_bytes(self) -> int:
+        """当前已占用的估算字节数（系统内存 + 显存）"""
+        return sum(self.used_by_device().values())
+    
+    def used_by_device(self) -> Dict[str, int]:
+        """当前各设备已占用的估算字节数"""
+        with self._lock:
+            return {
+                device: sum(entry.footprint[device] for entry in self._entries.values())
+                for device in DEVICES
+            }
+    
+    def _over_budget(self, footprint: Dict[str, int], reserved: Dict[str, int] = None) -> List[str]:
+        """加入 footprint（和 reserved）后超出预算的设备"""
+        used = self.used_by_device()
+        reserved = reserved or {}
+        return [
+            device for device, budget in self.budgets.items()
+            if budget and used[device] + reserved.get(device, 0) + footprint[device] > budget
+        ]
+    
+    def fits(self, footprint, reserved: Dict[str, int] = None) -> bool:
+        """
+        不淘汰其他模型能否放下 footprint
+        
+        Args:
+            footprint: 估算占用（整数或 {'ram', 'vram'}）
+            reserved: 已计划占用但尚未放入模型池的字节数（按设备）
+        
+        Returns:
+            是否在所有设备的预算内
+        """
+        return not self._over_budget(as_device_bytes(footprint), reserved)
+    
+    def lookup(self, key: str) -> Optional[Any]:
+        """
+        查找模型（计入命中/未命中统计，并标记为最近使用）
+        
+        Args:
+            key: 模型键
+        
+        Returns:
+            模型实例，不存在时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.model
+    
+    def get_info(self, key: str) -> Optional[Dict]:
+        """获取模型的加载信息"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.info if entry is not None else None
+    
+    def stats(self) -> Dict:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                'models': len(self._entries),
+                'used_bytes': self.used_bytes,
+                'used_by_device': self.used_by_device(),
+                'budget_bytes': self.budget_bytes,
+                'vram_budget_bytes': self.vram_budget_bytes,
+                'max_models': self.max_models,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+    
+    def format_stats(self) -> str:
+        """格式化统计信息（用于日志和节点状态输出）"""
+        stats = self.stats()
+        used = stats['used_by_device']
+        ram_budget = _format_gb(stats['budget_bytes']) if stats['budget_bytes'] else "unlimited"
+        vram_budget = _format_gb(stats['vram_budget_bytes']) if stats['vram_budget_bytes'] else "unlimited"
+        return (f"📊 Model pool: {stats['models']} model(s), RAM {_format_gb(used['ram'])} / {ram_budget}, "
+                f"VRAM {_format_gb(used['vram'])} / {vram_budget}, "
+                f"hits={stats['hits']} misses={stats['misses']} evictions={stats['evictions']}")
+    
+    # ------------------------------------------------------------------
+    # 写入与淘汰
+    # ------------------------------------------------------------------
+    
+    def make_room(self, footprint, exclude: tuple = ()) -> List[str]:
+        """
+        在加载新模型之前卸载最近最少使用的模型，直到能放下 footprint
+        
+        只淘汰在超出预算的设备上有占用的模型（显存不足时不会卸载只在 CPU 上运行的模型，反之亦然）
+        
+        Args:
+            footprint: 即将加载的模型估算占用（整数视为全部在系统内存中，或 {'ram', 'vram'}）
+            exclude: 不允许淘汰的模型键
+        
+        Returns:
+            被淘汰的模型键列表
+        """
+        footprint = as_device_bytes(footprint)
+        evicted = []
+        with self._lock:
+            while self._entries:
+                over_budget = self._over_budget(footprint)
+                over_count = self.max_models and len(self._entries) + 1 > self.max_models
+                if not over_budget and not over_count:
+                    break
+                
+                victim = next(
+                    (key for key, entry in self._entries.items()
+                     if entry.pins == 0 and key not in exclude
+                     and (over_count or any(entry.footprint[device] for device in over_budget))),
+                    None
+                )
+                if victim is None:
+                    break
+                
+                self._evict(victim)
+                evicted.append(victim)
+        
+        for device, budget in self.budgets.items():
+            if budget and footprint[device] > budget:
+                print(f"⚠️  Model {device.upper()} footprint {_format_gb(footprint[device])} exceeds "
+                      f"pool budget {_format_gb(budget)}")
+        
+        return evicted
+    
+    def put(self, key: str, model: Any, footprint: int = None, info: Dict = None) -> List[str]:
+        """
+        放入模型（必要时先淘汰旧模型）
+        
+        Args:
+            key: 模型键
+            model: 模型实例
+            footprint: 估算占用（整数视为全部在系统内存中，或 {'ram', 'vram'}），None 时按键对应的文件估算
+            info: 加载信息（参数等）
+        
+        Returns:
+            被淘汰的模型键列表
+        """
+        if footprint is None:
+            footprint = estimate_footprint(key) if os.path.exists(key) else 0
+        footprint = as_device_bytes(footprint)
+        
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None and old.model is not model:
+                self._close(old.model)
+            
+            evicted = self.make_room(footprint, exclude=(key,))
+            self._entries[key] = _PoolEntry(model, footprint, info or {})
+            return evicted
+    
+    def update(self, key: str, footprint: int = None, info: Dict = None) -> bool:
+        """
+        更新已驻留模型的估算占用和加载信息（例如只重建了上下文）
+        
+        Args:
+            key: 模型键
+            footprint: 新的估算占用（整数或 {'ram', 'vram'}），None 表示不变
+            info: 合并到加载信息中的字段
+        
+        Returns:
+            是否存在该模型
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if footprint is not None:
+                entry.footprint = as_device_bytes(footprint)
+            if info:
+                entry.info.update(info)
+            self._entries.move_to_end(key)
+            return True
+    
+    def remove(self, key: str) -> bool:
+        """
+        移除并释放模型
+        
+        Returns:
+            是否存在该模型
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._close(entry.model)
+        return True
+    
+    def clear(self):
+        """移除并释放所有模型"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry.model)
+        gc.collect()
+    
+    def _evict(self, key: str):
+        """淘汰单个模型"""
+        entry = self._entries.pop(key)
+        self.evictions += 1
+        print(f"♻️  Evicting model from pool: {os.path.basename(key)} "
+              f"(RAM {_format_gb(entry.footprint['ram'])}, VRAM {_format_gb(entry.footprint['vram'])})")
+        self._close(entry.model)
+    
+    @staticmethod
+    def _close(model: Any):
+        """释放模型占用的原生资源（llama-cpp-python 0.2.x 以后提供 close）"""
+        close = getattr(model, 'close', None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"⚠️  Error while closing model: {e}")
+    
+    @contextmanager
+    def pinned(self, key: str):
+        """
+        使用期间禁止淘汰该模型
+        
+        Args:
+            key: 模型键
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.pins += 1
+        try:
+            yield entry.model if entry is not None else None
+        finally:
+            if entry is not None:
+                with self._lock:
+                    entry.pins -= 1
+    
+    # ------------------------------------------------------------------
+    # dict 兼容接口
+    # ------------------------------------------------------------------
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+    
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            return entry.model
+    
+    def __setitem__(self, key: str, model: Any):
+        self.put(key, model)
+    
+    def __delitem__(self, key: str):
+        if not self.remove(key):
+            raise KeyError(key)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries.keys()))
+    
+    def get(self, key: str, default=None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.model if entry is not None else default
+    
+    def keys(self) -> List[str]:
+        return list(self._entries.keys())
+    
+    def values(self) -> List[Any]:
+        return [entry.model for entry in list(self._entries.values())]
+    
+    def items(self) -> List[tuple]:
+        return [(key, entry.model) for key, entry in list(self._entries.items())]
+
+
+# 全局单例
+_model_pool = None
+_model_pool_lock = threading.Lock()
+
+
+def get_model_pool() -> ModelPool:
+    """获取全局模型池实例"""
+    global _model_pool
+    with _model_pool_lock:
+        if _model_pool is None:
+            _model_pool = ModelPool()
+            budgets = _model_pool.budgets
+            print("🗄️  Model pool budget: " + ", ".join(
+                f"{device.upper()} {_format_gb(budget) if budget else 'unlimited'}" for device, budget in budgets.items()
+            ))
+        return _model_pool
@@ -0,0 +1,675 @@
+"""
+Prefetch Planner - 根据工作流图提前准备模型
+ComfyUI 在执行前就拿到了完整的 prompt 图。提交时找出图中本插件的模型节点，
+在前面的节点（扩散采样、图像解码等）执行期间提前准备模型：
+- 本地 GGUF 文本模型：模型池预算内放得下时直接后台加载（不会淘汰其他模型）
+- 其他本地模型文件（GGUF 视觉模型 + mmproj、Transformers 权重）：读入系统页缓存
+- 远程 Ollama 模型：请求服务端提前载入
+每个预取任务绑定到提交它的 prompt（prompt_id），该 prompt 被中断或从队列中删除时取消尚未完成的预取
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from .inference_engine import get_inference_engine
+    from .load_spec import LoadSpec, kv_load_options, load_kwargs_from_config
+    from .autotune import apply_tuned_params
+    from .token_counter import initial_context
+except ImportError:
+    from core.inference_engine import get_inference_engine
+    from core.load_spec import LoadSpec, kv_load_options, load_kwargs_from_config
+    from core.autotune import apply_tuned_params
+    from core.token_counter import initial_context
+
+try:
+    from ..config.paths import PathConfig
+    from ..models.text_models import fit_context_to_metadata
+    from ..utils.gguf_reader import get_gguf_metadata
+except (ImportError, ValueError):
+    from config.paths import PathConfig
+    from models.text_models import fit_context_to_metadata
+    from utils.gguf_reader import get_gguf_metadata
+
+
+# 环境变量：预取模式
+#   auto  - 预算允许时直接加载，否则只读入页缓存（默认）
+#   cache - 只读入页缓存
+#   off   - 禁用
+PREFETCH_ENV = "GGUF_VLM_PREFETCH"
+PREFETCH_MODES = ("auto", "cache", "off")
+
+# 读入页缓存时每次读取的块大小
+READ_CHUNK = 16 * 1024 * 1024
+
+# 读入页缓存的文件总大小不超过可用内存的比例（避免挤掉其他进程的缓存）
+PAGE_CACHE_FRACTION = 0.5
+
+# 检查中断和队列状态的间隔（秒）
+INTERRUPT_POLL_INTERVAL = 0.25
+
+# 提交钩子在 prompt 入队之前执行：超过该时间（秒）仍未出现在队列中（例如校验失败）时取消预取
+QUEUE_GRACE_SECONDS = 30.0
+
+# Transformers 权重文件扩展名
+WEIGHT_EXTENSIONS = ('.safetensors', '.bin')
+
+
+def _available_memory() -> Optional[int]:
+    """可用系统内存（字节），无法获取时返回 None"""
+    try:
+        import psutil
+        return int(psutil.virtual_memory().available)
+    except Exception:
+        pass
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _processing_interrupted() -> bool:
+    """ComfyUI 当前是否收到了中断请求"""
+    try:
+        import comfy.model_management
+        return bool(comfy.model_management.processing_interrupted())
+    except Exception:
+        return False
+
+
+def _queue_snapshot() -> Optional[Tuple[list, list]]:
+    """
+    ComfyUI 队列中 (正在执行, 等待中) 的条目 (number, prompt_id, prompt, ...)
+    
+    不深拷贝 prompt（保留对象标识，用于匹配不支持客户端 prompt_id 的旧版本），
+    不在 ComfyUI 中运行时返回 None
+    """
+    try:
+        from server import PromptServer
+        queue = PromptServer.instance.prompt_queue
+    except Exception:
+        return None
+    try:
+        if hasattr(queue, 'get_current_queue_volatile'):
+            running, pending = queue.get_current_queue_volatile()
+        else:
+            with queue.mutex:
+                running = list(queue.currently_running.values())
+                pending = list(queue.queue)
+        return list(running), list(pending)
+    except Exception:
+        return None
+
+
+def _gpu_layers_for(device: str) -> int:
+    """把加载器节点的 device 选项转换为 n_gpu_layers（与加载器节点一致）"""
+    if device == "CPU":
+        return 0
+    if device == "GPU":
+        return -1
+    try:
+        import torch
+        return -1 if torch.cuda.is_available() else 0
+    except Exception:
+        return -1
+
+
+def _literal(inputs: Dict, name: str, default=None):
+    """读取节点的常量输入（连线输入返回 None）"""
+    value = inputs.get(name, default)
+    if isinstance(value, list):
+        return None
+    return value
+
+
+@dataclass
+class PrefetchTarget:
+    """一个需要预取的模型"""
+    
+    node_id: str
+    class_type: str
+    kind: str                                   # 'gguf' / 'files' / 'remote'
+    paths: List[str] = field(default_factory=list)
+    load_kwargs: Optional[Dict] = None          # 提供时可以直接后台加载
+    base_url: str = ""
+    api_type: str = ""
+    model_name: str = ""
+    priority: int = 0                           # 越小越早被用到
+    
+    def describe(self) -> str:
+        """描述（用于日志）"""
+        if self.kind == 'remote':
+            return f"{self.api_type}:{self.model_name}"
+        return ", ".join(os.path.basename(path) for path in self.paths)
+
+
+class PrefetchJob:
+    """一次 prompt 提交对应的预取任务"""
+    
+    def __init__(self, prompt_id: str = None, prompt: Dict = None):
+        """
+        初始化预取任务
+        
+        Args:
+            prompt_id: 提交的 prompt ID
+            prompt: 提交的 prompt 图（ComfyUI 入队的是同一个对象）
+        """
+        self.prompt_id = prompt_id or str(uuid.uuid4())
+        self.prompt = prompt
+        self.submitted_at = time.monotonic()
+        # prompt 是否已经出现在 ComfyUI 队列中
+        self.queued = False
+        self.targets: List[PrefetchTarget] = []
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        # 交给推理引擎的后台加载任务
+        self.futures: List[Future] = []
+    
+    @property
+    def done(self) -> bool:
+        return self.finished.is_set() and all(future.done() for future in self.futures)
+    
+    def matches(self, item) -> bool:
+        """队列条目是否对应本任务的 prompt（按 prompt_id，旧版本按 prompt 对象）"""
+        try:
+            return str(item[1]) == self.prompt_id or (self.prompt is not None and item[2] is self.prompt)
+        except (IndexError, TypeError):
+            return False
+    
+    def cancel(self, reason: str = "interrupted"):
+        """取消尚未完成的预取（已开始的模型加载无法中途停止）"""
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        cancelled = sum(1 for future in self.futures if future.cancel())
+        print(f"🛑 Prefetch cancelled ({reason}), {cancelled} pending task(s) dropped")
+
+
+class PrefetchPlanner:
+    """工作流图预取规划器"""
+    
+    def __init__(self, mode: str = None):
+        """
+        初始化预取规划器
+        
+        Args:
+            mode: 预取模式（PREFETCH_MODES），None 时读取环境变量
+        """
+        if mode is None:
+            mode = os.environ.get(PREFETCH_ENV, "auto").strip().lower()
+        if mode not in PREFETCH_MODES:
+            print(f"⚠️  Ignoring invalid {PREFETCH_ENV}={mode!r}")
+            mode = "auto"
+        self.mode = mode
+        
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # prompt_id -> 预取任务
+        self._jobs: Dict[str, PrefetchJob] = {}
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._model_loader = None
+        
+        # 节点类型 -> 预取目标提取函数
+        self.extractors: Dict[str, Callable[[str, Dict], Optional[PrefetchTarget]]] = {
+            'LocalTextModelLoader': self._extract_local_text_loader,
+            'TextModelLoader': self._extract_text_loader,
+            'VisionModelLoader': self._extract_vision_loader,
+            'VisionModelLoaderTransformers': self._extract_transformers_loader,
+            'RemoteAPIConfig': self._extract_remote,
+            'RemoteTextModelSelector': self._extract_remote,
+            'RemoteVisionModelConfig': self._extract_remote,
+        }
+        
+        self.loads = 0
+        self.prefetched_bytes = 0
+        self.remote_loads = 0
+        self.cancelled = 0
+    
+    # ------------------------------------------------------------------
+    # 规划
+    # ------------------------------------------------------------------
+    
+    def _get_model_loader(self):
+        if self._model_loader is None:
+            try:
+                from .model_loader import ModelLoader
+            except ImportError:
+                from core.model_loader import ModelLoader
+            self._model_loader = ModelLoader()
+        return self._model_loader
+    
+    def plan(self, prompt: Dict) -> List[PrefetchTarget]:
+        """
+        从 prompt 图中找出需要预取的模型
+        
+        Args:
+            prompt: ComfyUI prompt（节点 ID -> {"class_type", "inputs"}）
+        
+        Returns:
+            按使用先后排序的预取目标
+        """
+        targets = []
+        for node_id, node in prompt.items():
+            if not isinstance(node, dict):
+                continue
+            extractor = self.extractors.get(node.get('class_type'))
+            if extractor is None:
+                continue
+            try:
+                target = extractor(node_id, node.get('inputs') or {})
+            except Exception as e:
+                print(f"⚠️  Prefetch planning skipped node {node_id}: {e}")
+                continue
+            if target is not None:
+                target.priority = self._priority(prompt, node_id)
+                targets.append(target)
+        
+        targets.sort(key=lambda target: target.priority)
+        return targets
+    
+    @staticmethod
+    def _priority(prompt: Dict, node_id: str) -> int:
+        """
+        估算节点的模型多早被用到：使用该模型的节点中，上游节点数最少的那个的上游节点数
+        """
+        def upstream(start: str) -> int:
+            seen = set()
+            stack = [start]
+            while stack:
+                node = prompt.get(stack.pop()) or {}
+                for value in (node.get('inputs') or {}).values():
+                    if isinstance(value, list) and len(value) == 2 and str(value[0]) not in seen:
+                        seen.add(str(value[0]))
+                        stack.append(str(value[0]))
+            return len(seen)
+        
+        consumers = [
+            other_id for other_id, other in prompt.items()
+            if isinstance(other, dict) and any(
+                isinstance(value, list) and len(value) == 2 and str(value[0]) == str(node_id)
+                for value in (other.get('inputs') or {}).values()
+            )
+        ]
+        if not consumers:
+            return upstream(node_id)
+        return min(upstream(consumer) for consumer in consumers)
+    
+    def _extract_local_text_loader(self, node_id: str, inputs: Dict) -> Optional[PrefetchTarget]:
+        """LocalTextModelLoader（加载参数可以提前确定，预算允许时直接后台加载）"""
+        target = self._extract_text_loader(node_id, inputs)
+        n_ctx = _literal(inputs, 'n_ctx', 8192)
+        device = _literal(inputs, 'device', "Auto")
+        if target is not None and n_ctx is not None and device is not None:
+            target.class_type = 'LocalTextModelLoader'
+            n_ctx = fit_context_to_metadata(int(n_ctx), get_gguf_metadata(target.paths[0]))
+            # 调优结果按加载器节点上的 n_ctx（自动模式为上限）匹配，与加载器节点一致
+            config = apply_tuned_params({
+                'n_ctx': n_ctx,
+                'n_gpu_layers': _gpu_layers_for(device),
+                'profile': _literal(inputs, 'load_profile'),
+            }, target.paths[0], device)
+            if _literal(inputs, 'n_ctx_mode') == "auto":
+                config['n_ctx'] = initial_context(n_ctx)
+            kv_options = kv_load_options(
+                _literal(inputs, 'type_k'), _literal(inputs, 'type_v'), _literal(inputs, 'flash_attn', False)
+            )
+            target.load_kwargs = load_kwargs_from_config({**config, **kv_options})
+        return target
+    
+    def _extract_text_loader(self, node_id: str, inputs: Dict) -> Optional[PrefetchTarget]:
+        """TextModelLoader（会按预设改写 n_ctx，只读入页缓存）"""
+        model = _literal(inputs, 'model')
+        if not model or model.startswith("✗"):
+            return None
+        if model.startswith("✓"):
+            model = model.lstrip("✓").strip()
+        
+        model_path = self._get_model_loader().find_model(model)
+        if not model_path:
+            return None
+        
+        return PrefetchTarget(node_id, 'TextModelLoader', 'gguf', paths=[model_path])
+    
+    def _extract_vision_loader(self, node_id: str, inputs: Dict) -> Optional[PrefetchTarget]:
+        """本地 GGUF 视觉模型加载器（模型 + mmproj 读入页缓存）"""
+        model = _literal(inputs, 'model')
+        if not model or model.startswith("✗"):
+            return None
+        if model.startswith("✓"):
+            model = model.lstrip("✓").strip()
+        
+        loader = self._get_model_loader()
+        model_path = loader.find_model(model)
+        if not model_path:
+            return None
+        paths = [model_path]
+        mmproj_path = loader.find_mmproj(model, _literal(inputs, 'mmproj_file') or None)
+        if mmproj_path:
+            paths.append(mmproj_path)
+        return PrefetchTarget(node_id, 'VisionModelLoader', 'files', paths=paths)
+    
+    def _extract_transformers_loader(self, node_id: str, inputs: Dict) -> Optional[PrefetchTarget]:
+        """Transformers 视觉模型加载器（权重文件读入页缓存）"""
+        model = _literal(inputs, 'model')
+        if not model:
+            return None
+        model_dir = PathConfig.get_model_path("llm", model)
+        if not os.path.isdir(model_dir):
+            return None
+        paths = sorted(
+            os.path.join(model_dir, name) for name in os.listdir(model_dir)
+            if name.endswith(WEIGHT_EXTENSIONS)
+        )
+        if not paths:
+            return None
+        return PrefetchTarget(node_id, 'VisionModelLoaderTransformers', 'files', paths=paths)
+    
+    def _extract_remote(self, node_id: str, inputs: Dict) -> Optional[PrefetchTarget]:
+        """远程 API 模型（目前只有 Ollama 支持提前载入）"""
+        base_url = _literal(inputs, 'base_url')
+        api_type = _literal(inputs, 'api_type')
+        model = _literal(inputs, 'model')
+        if not base_url or not api_type or not model or api_type.lower() != "ollama":
+            return None
+        if model.startswith(("(", "❌", "⚠️")):
+            return None
+        return PrefetchTarget(node_id, 'remote', 'remote', base_url=base_url, api_type="ollama",
+                              model_name=model.strip())
+    
+    # ------------------------------------------------------------------
+    # 执行
+    # ------------------------------------------------------------------
+    
+    def submit(self, prompt: Dict, prompt_id: str = None) -> Optional[PrefetchJob]:
+        """
+        在后台规划并开始预取（不阻塞 prompt 提交）
+        
+        Args:
+            prompt: ComfyUI prompt
+            prompt_id: prompt ID（该 prompt 被中断或从队列删除时取消预取）
+        
+        Returns:
+            预取任务，预取已禁用时返回 None
+        """
+        if self.mode == "off":
+            return None
+        
+        job = PrefetchJob(prompt_id, prompt)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gguf-vlm-prefetch")
+            self._jobs[job.prompt_id] = job
+            self._ensure_watcher()
+            self._executor.submit(self._run, job, prompt)
+        return job
+    
+    def _run(self, job: PrefetchJob, prompt: Dict):
+        """规划并按使用先后依次预取"""
+        try:
+            if job.cancelled.is_set():
+                return
+            job.targets = self.plan(prompt)
+            if not job.targets:
+                return
+            print(f"🔮 Prefetch plan: {len(job.targets)} model(s) — " + "; ".join(t.describe() for t in job.targets))
+            
+            for target in job.targets:
+                if job.cancelled.is_set():
+                    return
+                self._prefetch(job, target)
+        except Exception as e:
+            print(f"⚠️  Prefetch failed: {e}")
+        finally:
+            job.finished.set()
+    
+    def _prefetch(self, job: PrefetchJob, target: PrefetchTarget):
+        """预取单个目标"""
+        if target.kind == 'remote':
+            self._preload_remote(job, target)
+            return
+        
+        if target.kind == 'gguf' and target.load_kwargs is not None and self.mode == "auto":
+            engine = get_inference_engine()
+            model_path = target.paths[0]
+            if model_path in engine.loaded_models:
+                return
+            if self._fits_pool(engine, model_path, target.load_kwargs):
+                # 预取是推测性的加载，不记入使用历史
+                future = engine.preload_model(model_path, record=False, **target.load_kwargs)
+                if future is not None:
+                    self.loads += 1
+                    with self._lock:
+                        job.futures.append(future)
+                    return
+        
+        self._read_files(job, target)
+    
+    @staticmethod
+    def _fits_pool(engine, model_path: str, load_kwargs: Dict) -> bool:
+        """模型能否在不淘汰其他模型的情况下放入模型池"""
+        pool = engine.loaded_models
+        if pool.max_models and len(pool) + 1 > pool.max_models:
+            return False
+        return pool.fits(LoadSpec.from_kwargs(model_path, **load_kwargs).device_footprint())
+    
+    def _read_files(self, job: PrefetchJob, target: PrefetchTarget):
+        """把模型文件读入系统页缓存（可被中断）"""
+        sizes = {}
+        for path in target.paths:
+            try:
+                sizes[path] = os.path.getsize(path)
+            except OSError:
+                pass
+        total = sum(sizes.values())
+        
+        available = _available_memory()
+        if available is not None and total > available * PAGE_CACHE_FRACTION:
+            print(f"⏭️  Prefetch skipped for {target.describe()}: {total / 1024**3:.2f} GB exceeds page-cache allowance")
+            return
+        
+        start = time.perf_counter()
+        read = 0
+        buffer = bytearray(READ_CHUNK)
+        for path in sizes:
+            if job.cancelled.is_set():
+                return
+            try:
+                with open(path, 'rb', buffering=0) as f:
+                    if hasattr(os, 'posix_fadvise'):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    while not job.cancelled.is_set():
+                        n = f.readinto(buffer)
+                        if not n:
+                            break
+                        read += n
+            except OSError as e:
+                print(f"⚠️  Prefetch read failed for {os.path.basename(path)}: {e}")
+        
+        self.prefetched_bytes += read
+        if not job.cancelled.is_set():
+            print(f"📥 Prefetched {target.describe()} into page cache "
+                  f"({read / 1024**3:.2f} GB in {time.perf_counter() - start:.1f} s)")
+    
+    def _preload_remote(self, job: PrefetchJob, target: PrefetchTarget):
+        """请求远程服务提前载入模型"""
+        if job.cancelled.is_set():
+            return
+        try:
+            from .inference.unified_api_engine import get_unified_api_engine
+        except ImportError:
+            from core.inference.unified_api_engine import get_unified_api_engine
+        
+        engine = get_unified_api_engine(target.base_url, target.api_type)
+        if engine.preload_model(target.model_name):
+            self.remote_loads += 1
+            print(f"📡 Remote model loaded ahead of use: {target.describe()}")
+    
+    # ------------------------------------------------------------------
+    # 取消
+    # ------------------------------------------------------------------
+    
+    def _ensure_watcher(self):
+        """启动中断监视线程（调用方持有 _lock）"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._watcher = threading.Thread(target=self._watch, name="gguf-vlm-prefetch-watch", daemon=True)
+        self._watcher.start()
+    
+    @staticmethod
+    def _cancel_reason(job: PrefetchJob, queue: Optional[Tuple[list, list]], interrupted: bool) -> Optional[str]:
+        """
+        判断预取任务是否应取消
+        
+        Args:
+            job: 预取任务
+            queue: ComfyUI 队列快照 (正在执行, 等待中)，不可用时为 None
+            interrupted: ComfyUI 的中断标记（只作用于正在执行的 prompt）
+        
+        Returns:
+            取消原因，无需取消时返回 None
+        """
+        if queue is None:
+            return "interrupted" if interrupted else None
+        
+        running, pending = queue
+        if any(job.matches(item) for item in running):
+            job.queued = True
+            return "prompt interrupted" if interrupted else None
+        if any(job.matches(item) for item in pending):
+            job.queued = True
+            return None
+        # 不在队列中：已结束（中断的 prompt 也会离开队列，即使错过了中断标记）或被删除
+        if job.queued:
+            return "prompt finished or removed from queue"
+        if time.monotonic() - job.submitted_at > QUEUE_GRACE_SECONDS:
+            return "prompt was not queued"
+        return None
+    
+    def _watch(self):
+        """预取进行期间检查各任务对应的 prompt 是否被中断或从队列中删除"""
+        while True:
+            time.sleep(INTERRUPT_POLL_INTERVAL)
+            with self._lock:
+                self._jobs = {
+                    prompt_id: job for prompt_id, job in self._jobs.items()
+                    if not job.done and not job.cancelled.is_set()
+                }
+                if not self._jobs:
+                    self._watcher = None
+                    return
+                jobs = list(self._jobs.values())
+            
+            queue = _queue_snapshot()
+            interrupted = _processing_interrupted()
+            for job in jobs:
+                reason = self._cancel_reason(job, queue, interrupted)
+                if reason is not None:
+                    self.cancel(job.prompt_id, reason)
+    
+    def cancel(self, prompt_id: str, reason: str = "cancelled") -> bool:
+        """
+        取消指定 prompt 的预取
+        
+        Args:
+            prompt_id: prompt ID
+            reason: 取消原因（用于日志）
+        
+        Returns:
+            是否找到并取消了预取任务
+        """
+        with self._lock:
+            job = self._jobs.pop(str(prompt_id), None)
+        if job is None:
+            return False
+        job.cancel(reason)
+        self.cancelled += 1
+        return True
+    
+    def cancel_all(self, reason: str = "cancelled"):
+        """取消所有进行中的预取"""
+        with self._lock:
+            jobs, self._jobs = list(self._jobs.values()), {}
+        for job in jobs:
+            job.cancel(reason)
+            self.cancelled += 1
+    
+    def stats(self) -> Dict:
+        """获取统计信息"""
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if not job.done)
+        return {
+            'mode': self.mode,
+            'active_jobs': active,
+            'loads': self.loads,
+            'prefetched_bytes': self.prefetched_bytes,
+            'remote_loads': self.remote_loads,
+            'cancelled': self.cancelled,
+        }
+    
+    def format_stats(self) -> str:
+        """格式化统计信息（用于日志和节点状态输出）"""
+        stats = self.stats()
+        return (f"🔮 Prefetch ({stats['mode']}): {stats['active_jobs']} active, loads={stats['loads']}, "
+                f"page-cache={stats['prefetched_bytes'] / 1024**3:.2f} GB, remote={stats['remote_loads']}, "
+                f"cancelled={stats['cancelled']}")
+
+
+# 全局单例
+_prefetch_planner = None
+_prefetch_planner_lock = threading.Lock()
+
+
+def get_prefetch_planner() -> PrefetchPlanner:
+    """获取全局预取规划器实例"""
+    global _prefetch_planner
+    with _prefetch_planner_lock:
+        if _prefetch_planner is None:
+            _prefetch_planner = PrefetchPlanner()
+        return _prefetch_planner
+
+
+def _on_prompt(json_data: Dict) -> Dict:
+    """
+    PromptServer 的 prompt 提交钩子（不修改 prompt）
+    
+    钩子在 ComfyUI 分配 prompt_id 之前执行；请求中没有 prompt_id 时在这里生成一个，
+    ComfyUI 会使用请求中的 prompt_id，预取任务因此能与队列中的 prompt 对应
+    """
+    try:
+        prompt = json_data.get('prompt') if isinstance(json_data, dict) else None
+        if isinstance(prompt, dict):
+            if get_prefetch_planner().mode != "off" and not json_data.get('prompt_id'):
+                json_data['prompt_id'] = str(uuid.uuid4())
+            get_prefetch_planner().submit(prompt, json_data.get('prompt_id'))
+    except Exception as e:
+        print(f"⚠️  Prefetch planning failed: {e}")
+    return json_data
+
+
+def install_prompt_hook() -> bool:
+    """
+    在 ComfyUI 的 PromptServer 上注册 prompt 提交钩子
+    
+    Returns:
+        是否注册成功（不在 ComfyUI 中运行时返回 False）
+    """
+    try:
+        from server import PromptServer
+    except ImportError:
+        return False
+    
+    server = getattr(PromptServer, 'instance', None)
+    if server is None or not hasattr(server, 'add_on_prompt_handler'):
+        return False
+    
+    server.add_on_prompt_handler(_on_prompt)
+    return True
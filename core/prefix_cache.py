@@ -0,0 +1,470 @@
+"""
+Prefix Cache - 系统提示词前缀 KV 缓存
+保存 "System: ...\n\nUser: " 等固定前缀预填充后的 llama 状态（save_state），
+重复运行时恢复状态（load_state），只需对新的用户输入做预填充
+
+可选的磁盘层把状态快照保存到模型目录下，ComfyUI 重启后首次运行也无需预填充
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from ..config.paths import PathConfig
+except (ImportError, ValueError):
+    try:
+        from config.paths import PathConfig
+    except ImportError:
+        PathConfig = None
+
+try:
+    from ..utils.file_store import file_fingerprint
+except (ImportError, ValueError):
+    from utils.file_store import file_fingerprint
+
+
+# 环境变量：前缀缓存容量（MB），0 表示禁用
+CAPACITY_ENV = "GGUF_VLM_PREFIX_CACHE_MB"
+DEFAULT_CAPACITY_MB = 1024
+
+# 环境变量：磁盘层容量（GB），0 或未设置表示不启用磁盘层
+DISK_CAPACITY_ENV = "GGUF_VLM_PREFIX_CACHE_DISK_GB"
+
+# 磁盘快照文件格式版本（格式变化时递增）
+_DISK_FORMAT_VERSION = 2
+_DISK_SUFFIX = ".kvstate"
+
+# 快照文件格式：魔数 + 头部长度（uint32）+ JSON 头部 + input_ids（.npy）+ scores（.npy）+ llama 状态原始字节；
+# 不使用 pickle，快照目录中的文件可能来自下载或共享存储
+_DISK_MAGIC = b"GGUFVLMKV"
+_HEADER_SIZE = struct.Struct('<I')
+
+# 前缀太短时重新预填充比保存/恢复状态更划算
+MIN_PREFIX_TOKENS = 32
+
+
+def _format_mb(num_bytes: int) -> str:
+    return f"{num_bytes / (1024 ** 2):.1f} MB"
+
+
+def hash_tokens(tokens: Sequence[int]) -> str:
+    """计算 token 序列的摘要"""
+    return hashlib.sha1(np.asarray(tokens, dtype=np.int32).tobytes()).hexdigest()
+
+
+def state_nbytes(state: Any) -> int:
+    """估算 LlamaState 占用的字节数"""
+    size = int(getattr(state, 'llama_state_size', 0) or 0)
+    for name in ('scores', 'input_ids'):
+        array = getattr(state, name, None)
+        if array is not None:
+            size += int(getattr(array, 'nbytes', 0))
+    return size
+
+
+def compact_state(state: Any, keep_all_logits: bool) -> Any:
+    """
+    压缩 LlamaState：未启用 logits_all 时只保留最后一行 logits
+    
+    load_state 会把 scores 广播回前 n_tokens 行；前缀之后总会继续预填充用户输入，
+    之前各行的 logits 不会被使用，没必要为每个前缀保存 n_tokens × n_vocab 的数组
+    """
+    scores = getattr(state, 'scores', None)
+    if not keep_all_logits and scores is not None and len(scores) > 1:
+        state.scores = scores[-1:].copy()
+    return state
+
+
+def _env_number(name: str, default: float) -> float:
+    """读取数值型环境变量"""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"⚠️  Ignoring invalid {name}={value!r}")
+        return default
+
+
+def write_state(f, state: Any):
+    """
+    把 LlamaState 写入文件对象（纯数据格式）
+    
+    Args:
+        f: 以二进制写模式打开的文件
+        state: llama_cpp.LlamaState
+    """
+    llama_state = bytes(state.llama_state)
+    header = json.dumps({
+        'n_tokens': int(state.n_tokens),
+        'llama_state_size': int(state.llama_state_size),
+        'llama_state_bytes': len(llama_state),
+        'seed': int(getattr(state, 'seed', 0) or 0),
+    }).encode('utf-8')
+    f.write(_DISK_MAGIC)
+    f.write(_HEADER_SIZE.pack(len(header)))
+    f.write(header)
+    np.save(f, np.ascontiguousarray(state.input_ids, dtype=np.intc), allow_pickle=False)
+    np.save(f, np.ascontiguousarray(state.scores, dtype=np.single), allow_pickle=False)
+    f.write(llama_state)
+
+
+def read_state(f) -> Any:
+    """
+    从文件对象读取 write_state 写入的 LlamaState（不执行任何反序列化代码）
+    
+    Args:
+        f: 以二进制读模式打开的文件
+    
+    Returns:
+        llama_cpp.LlamaState
+    
+    Raises:
+        ValueError: 文件格式不正确
+    """
+    from llama_cpp import LlamaState
+    
+    if f.read(len(_DISK_MAGIC)) != _DISK_MAGIC:
+        raise ValueError("not a KV snapshot file")
+    (header_size,) = _HEADER_SIZE.unpack(f.read(_HEADER_SIZE.size))
+    header = json.loads(f.read(header_size).decode('utf-8'))
+    input_ids = np.load(f, allow_pickle=False)
+    scores = np.load(f, allow_pickle=False)
+    llama_state = f.read(int(header['llama_state_bytes']))
+    if len(llama_state) != header['llama_state_bytes']:
+        raise ValueError("truncated KV snapshot")
+    return LlamaState(
+        input_ids=input_ids.astype(np.intc, copy=False),
+        scores=scores.astype(np.single, copy=False),
+        n_tokens=int(header['n_tokens']),
+        llama_state=llama_state,
+        llama_state_size=int(header['llama_state_size']),
+        seed=int(header['seed']),
+    )
+
+
+def _llama_cpp_version() -> str:
+    """状态快照格式依赖 llama.cpp 版本"""
+    try:
+        import llama_cpp
+        return getattr(llama_cpp, '__version__', 'unknown')
+    except ImportError:
+        return 'unknown'
+
+
+class DiskStateStore:
+    """
+    磁盘上的 KV 状态快照（按总字节数限制容量，按最近访问时间淘汰）
+    
+    每个快照一个文件，文件修改时间作为最近访问时间；写入在后台线程中进行
+    """
+    
+    def __init__(self, directory: str, capacity_bytes: int):
+        """
+        初始化磁盘层
+        
+        Args:
+            directory: 快照目录
+            capacity_bytes: 容量（字节）
+        """
+        self.directory = directory
+        self.capacity_bytes = capacity_bytes
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gguf-vlm-kv-writer")
+        os.makedirs(directory, exist_ok=True)
+        
+        self.hits = 0
+        self.writes = 0
+        self.evictions = 0
+    
+    def path_for(self, key: Tuple) -> Optional[str]:
+        """
+        计算缓存键对应的快照文件路径
+        
+        磁盘键使用模型指纹而不是路径，模型移动或重命名后仍然有效
+        """
+        fingerprint = file_fingerprint(key[0])
+        if fingerprint is None:
+            return None
+        raw = repr((_DISK_FORMAT_VERSION, _llama_cpp_version(), fingerprint) + tuple(key[1:]))
+        name = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + _DISK_SUFFIX)
+    
+    def load(self, key: Tuple) -> Optional[Any]:
+        """读取快照（不存在或损坏时返回 None）"""
+        path = self.path_for(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                state = read_state(f)
+            os.utime(path)
+        except Exception as e:
+            print(f"⚠️  Discarding unreadable KV snapshot {os.path.basename(path)}: {e}")
+            self._remove(path)
+            return None
+        self.hits += 1
+        return state
+    
+    def save_async(self, key: Tuple, state: Any):
+        """在后台线程中写入快照（超过总容量的快照不写入）"""
+        if state_nbytes(state) > self.capacity_bytes:
+            return
+        path = self.path_for(key)
+        if path is not None:
+            self._writer.submit(self._save, path, state)
+    
+    def _save(self, path: str, state: Any):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                write_state(f, state)
+            os.replace(tmp_path, path)
+            self.writes += 1
+        except Exception as e:
+            print(f"⚠️  Failed to write KV snapshot: {e}")
+            self._remove(tmp_path)
+            return
+        self._enforce_capacity()
+    
+    def discard(self, key: Tuple):
+        """删除快照"""
+        path = self.path_for(key)
+        if path is not None:
+            self._remove(path)
+    
+    def clear(self):
+        """删除所有快照"""
+        for path, _, _ in self._list():
+            self._remove(path)
+    
+    def _list(self):
+        """列出快照：(路径, 大小, 修改时间)"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(_DISK_SUFFIX):
+                        stat = entry.stat()
+                        entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            pass
+        return entries
+    
+    def _enforce_capacity(self):
+        """超出容量时删除最久未访问的快照"""
+        with self._lock:
+            entries = sorted(self._list(), key=lambda entry: entry[2])
+            used = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if used <= self.capacity_bytes:
+                    break
+                self._remove(path)
+                used -= size
+                self.evictions += 1
+    
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def stats(self) -> Dict:
+        """获取统计信息"""
+        entries = self._list()
+        return {
+            'entries': len(entries),
+            'used_bytes': sum(size for _, size, _ in entries),
+            'capacity_bytes': self.capacity_bytes,
+            'hits': self.hits,
+            'writes': self.writes,
+            'evictions': self.evictions,
+        }
+
+
+class PrefixCache:
+    """按字节数限制容量的 LRU 前缀状态缓存"""
+    
+    def __init__(self, capacity_bytes: int = None, disk: DiskStateStore = None):
+        """
+        初始化前缀缓存
+        
+        Args:
+            capacity_bytes: 内存容量（字节），None 时读取环境变量，0 表示禁用
+            disk: 磁盘层，None 时不启用（全局实例按环境变量配置）
+        """
+        if capacity_bytes is None:
+            capacity_bytes = int(_env_number(CAPACITY_ENV, DEFAULT_CAPACITY_MB) * 1024 ** 2)
+        
+        self.capacity_bytes = max(0, capacity_bytes)
+        self.disk = disk
+        self._entries: "OrderedDict[Tuple, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._used_bytes = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.resident_hits = 0
+        self.evictions = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.capacity_bytes > 0 or self.disk is not None
+    
+    @property
+    def used_bytes(self) -> int:
+        return self._used_bytes
+    
+    @staticmethod
+    def make_key(model_path: str, spec: Any, tokens: Sequence[int]) -> Tuple:
+        """
+        生成缓存键：模型 + 影响状态格式的上下文参数 + 前缀 token 摘要
+        
+        Args:
+            model_path: 模型路径
+            spec: 模型的 LoadSpec（可为 None）
+            tokens: 前缀 token 序列
+        
+        Returns:
+            缓存键
+        """
+        context = (spec.n_ctx, spec.type_k, spec.type_v) if spec is not None else ()
+        return (model_path, context, len(tokens), hash_tokens(tokens))
+    
+    def get(self, key: Tuple) -> Optional[Any]:
+        """查找前缀状态（命中时标记为最近使用；内存未命中时查找磁盘层）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[0]
+        
+        state = self.disk.load(key) if self.disk is not None else None
+        if state is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        with self._lock:
+            self.hits += 1
+        self._put_memory(key, state)
+        return state
+    
+    def put(self, key: Tuple, state: Any) -> bool:
+        """
+        保存前缀状态（超出容量时按 LRU 淘汰；启用磁盘层时同时在后台写入磁盘）
+        
+        Returns:
+            是否已保存（单个状态超过总容量时不保存）
+        """
+        saved = self._put_memory(key, state)
+        if self.disk is not None:
+            self.disk.save_async(key, state)
+            saved = True
+        return saved
+    
+    def discard(self, key: Tuple):
+        """删除单个前缀状态（例如恢复失败的快照）"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._used_bytes -= entry[1]
+        if self.disk is not None:
+            self.disk.discard(key)
+    
+    def _put_memory(self, key: Tuple, state: Any) -> bool:
+        size = state_nbytes(state)
+        if size > self.capacity_bytes:
+            return False
+        
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._used_bytes -= old[1]
+            
+            while self._entries and self._used_bytes + size > self.capacity_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._used_bytes -= evicted_size
+                self.evictions += 1
+            
+            self._entries[key] = (state, size)
+            self._used_bytes += size
+            return True
+    
+    def invalidate(self, model_path: str = None):
+        """
+        删除内存中的缓存（磁盘快照保留，供重启或重新加载后使用）
+        
+        Args:
+            model_path: 只删除该模型的前缀状态，None 时清空全部
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if model_path is None or key[0] == model_path:
+                    _, size = self._entries.pop(key)
+                    self._used_bytes -= size
+    
+    def stats(self) -> Dict:
+        """获取统计信息"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'used_bytes': self._used_bytes,
+                'capacity_bytes': self.capacity_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'resident_hits': self.resident_hits,
+                'evictions': self.evictions,
+            }
+    
+    def format_stats(self) -> str:
+        """格式化统计信息（用于日志和节点状态输出）"""
+        stats = self.stats()
+        text = (f"🧠 Prefix cache: {stats['entries']} prefix(es), {_format_mb(stats['used_bytes'])} / "
+                f"{_format_mb(stats['capacity_bytes'])}, hits={stats['hits']} "
+                f"(resident={stats['resident_hits']}) misses={stats['misses']} evictions={stats['evictions']}")
+        if self.disk is not None:
+            disk = self.disk.stats()
+            text += (f"\n💾 KV snapshots: {disk['entries']} file(s), {_format_mb(disk['used_bytes'])} / "
+                     f"{_format_mb(disk['capacity_bytes'])}, hits={disk['hits']} writes={disk['writes']} "
+                     f"evictions={disk['evictions']}")
+        return text
+
+
+def _create_disk_store() -> Optional[DiskStateStore]:
+    """按环境变量创建磁盘层（未配置或目录不可用时返回 None）"""
+    capacity_gb = _env_number(DISK_CAPACITY_ENV, 0)
+    if capacity_gb <= 0 or PathConfig is None:
+        return None
+    try:
+        directory = PathConfig.get_kv_cache_dir()
+    except Exception as e:
+        print(f"⚠️  KV snapshot directory unavailable: {e}")
+        return None
+    print(f"💾 KV snapshots enabled: {directory} ({capacity_gb:g} GB)")
+    return DiskStateStore(directory, int(capacity_gb * 1024 ** 3))
+
+
+# 全局单例
+_prefix_cache = None
+_prefix_cache_lock = threading.Lock()
+
+
+def get_prefix_cache() -> PrefixCache:
+    """获取全局前缀缓存实例"""
+    global _prefix_cache
+    with _prefix_cache_lock:
+        if _prefix_cache is None:
+            _prefix_cache = PrefixCache(disk=_create_disk_store())
+        return _prefix_cache
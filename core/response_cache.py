@@ -0,0 +1,372 @@
+"""
+Response Cache - 确定性生成结果缓存
+模型、消息、图像内容和采样参数完全相同且生成是确定性的（temperature 为 0 或固定 seed）时，
+直接返回之前的生成结果，不再占用 GPU；完全相同的请求正在生成时，后来的请求等待并共享其结果
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from .single_flight import SingleFlight
+except ImportError:
+    from core.single_flight import SingleFlight
+
+try:
+    from ..config.paths import PathConfig
+except (ImportError, ValueError):
+    try:
+        from config.paths import PathConfig
+    except ImportError:
+        PathConfig = None
+
+
+# 环境变量：内存中最多缓存的结果数，0 表示禁用
+SIZE_ENV = "GGUF_VLM_RESPONSE_CACHE_SIZE"
+DEFAULT_SIZE = 256
+
+# 环境变量：设为 1 时同时把结果保存到磁盘（重启后仍可命中）
+DISK_ENV = "GGUF_VLM_RESPONSE_CACHE_DISK"
+
+# 磁盘上最多保留的结果文件数
+DISK_MAX_FILES = 4096
+
+# 键格式版本（哈希规则变化时递增）
+_KEY_VERSION = 1
+
+
+def is_deterministic(temperature: Optional[float], seed: Any = None, random_seeds: tuple = (None, -1)) -> bool:
+    """
+    判断一次生成是否是确定性的
+    
+    Args:
+        temperature: 温度参数
+        seed: 随机种子
+        random_seeds: 表示"随机种子"的取值（不同引擎约定不同）
+    
+    Returns:
+        temperature 为 0，或者指定了固定 seed 时返回 True
+    """
+    if temperature is not None and temperature <= 0:
+        return True
+    return seed not in random_seeds
+
+
+def file_identity(path: str) -> tuple:
+    """文件身份（路径、大小、修改时间），用于模型身份"""
+    try:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return (path,)
+
+
+class _ContentHasher:
+    """
+    对嵌套的消息结构做内容哈希
+    
+    - dict 按键排序，list/tuple 按顺序
+    - file:// URL 和 image 字段中的本地路径按文件内容哈希（节点每次生成的临时文件名不同）
+    - PIL 图像、numpy 数组、torch 张量按像素数据哈希
+    """
+    
+    def __init__(self):
+        self._digest = hashlib.sha256()
+    
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+    
+    def _write(self, tag: str, data: bytes = b""):
+        self._digest.update(tag.encode('utf-8'))
+        self._digest.update(len(data).to_bytes(8, 'little'))
+        self._digest.update(data)
+    
+    def _write_file(self, path: str) -> bool:
+        try:
+            with open(path, 'rb') as f:
+                file_digest = hashlib.sha256()
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    file_digest.update(chunk)
+        except OSError:
+            return False
+        self._write("file", file_digest.digest())
+        return True
+    
+    def update(self, value: Any, field: str = None):
+        if value is None or isinstance(value, (bool, int, float)):
+            self._write("scalar", repr(value).encode('utf-8'))
+        elif isinstance(value, str):
+            if value.startswith("file://"):
+                path = value[len("file://"):]
+                if path.startswith("/") and len(path) > 2 and path[2] == ":":
+                    path = path[1:]  # Windows: file:///C:/...
+                if self._write_file(path):
+                    return
+            elif field == 'image' and os.path.isfile(value) and self._write_file(value):
+                return
+            self._write("str", value.encode('utf-8'))
+        elif isinstance(value, bytes):
+            self._write("bytes", value)
+        elif isinstance(value, dict):
+            self._write("dict", str(len(value)).encode())
+            for key in sorted(value, key=str):
+                self._write("key", str(key).encode('utf-8'))
+                self.update(value[key], field=str(key))
+        elif isinstance(value, (list, tuple)):
+            self._write("list", str(len(value)).encode())
+            for item in value:
+                self.update(item, field=field)
+        elif hasattr(value, 'tobytes') and hasattr(value, 'mode') and hasattr(value, 'size'):
+            # PIL.Image
+            self._write("image", f"{value.mode}{value.size}".encode() + value.tobytes())
+        elif hasattr(value, 'detach') and hasattr(value, 'cpu'):
+            # torch.Tensor
+            array = value.detach().cpu().contiguous().numpy()
+            self._write("tensor", f"{array.dtype}{array.shape}".encode() + array.tobytes())
+        elif hasattr(value, 'tobytes') and hasattr(value, 'shape'):
+            # numpy.ndarray
+            self._write("array", f"{value.dtype}{value.shape}".encode() + value.tobytes())
+        else:
+            self._write("repr", repr(value).encode('utf-8'))
+
+
+def make_key(namespace: str, model_identity: Any, payload: Any) -> str:
+    """
+    生成缓存键
+    
+    Args:
+        namespace: 引擎类型（如 'llama.text'）
+        model_identity: 模型身份（路径+大小+修改时间、模型 ID+配置、服务地址+模型名等）
+        payload: 消息/提示词和采样参数
+    
+    Returns:
+        十六进制键
+    """
+    hasher = _ContentHasher()
+    hasher.update((_KEY_VERSION, namespace, model_identity, payload))
+    return hasher.hexdigest()
+
+
+class ResponseCache:
+    """确定性生成结果的 LRU 缓存（可选磁盘存储）"""
+    
+    def __init__(self, max_entries: int = None, disk_dir: str = None):
+        """
+        初始化结果缓存
+        
+        Args:
+            max_entries: 内存中最多缓存的结果数，None 时读取环境变量，0 表示禁用
+            disk_dir: 磁盘存储目录，None 时不使用磁盘
+        """
+        if max_entries is None:
+            try:
+                max_entries = int(os.environ.get(SIZE_ENV, DEFAULT_SIZE))
+            except ValueError:
+                print(f"⚠️  Ignoring invalid {SIZE_ENV}={os.environ.get(SIZE_ENV)!r}")
+                max_entries = DEFAULT_SIZE
+        
+        self.max_entries = max(0, max_entries)
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+        
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 进行中的相同请求合并（缓存禁用时也生效）
+        self.flights = SingleFlight()
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        """查找结果（内存未命中时查找磁盘）"""
+        if not self.enabled:
+            return None
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        
+        value = self._load_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+    
+    def put(self, key: str, value: Any):
+        """保存结果"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remember(key, value)
+        self._save_disk(key, value)
+    
+    def get_or_generate(self, key: Optional[str], generate: Callable[[], Any],
+                        on_hit: Callable[[Any], None] = None, cacheable: bool = True) -> Any:
+        """
+        命中时返回缓存结果；相同请求正在生成时等待并共享其结果；否则调用 generate 生成
+        
+        Args:
+            key: 请求键，None 表示既不缓存也不合并
+            generate: 生成函数
+            on_hit: 命中缓存或共享结果时的回调（例如把结果推送给流式回调）
+            cacheable: 结果能否缓存（非确定性生成只合并进行中的请求，不缓存）
+        
+        Returns:
+            生成结果
+        """
+        if key is None:
+            return generate()
+        
+        if cacheable and self.enabled:
+            cached = self.get(key)
+            if cached is not None:
+                print(f"♻️  Response cache hit ({key[:12]})")
+                if on_hit is not None:
+                    on_hit(cached)
+                return cached
+        
+        def run():
+            # 可能刚好有相同请求在本次查找之后完成
+            if cacheable and self.enabled:
+                with self._lock:
+                    if key in self._entries:
+                        return self._entries[key]
+            value = generate()
+            if cacheable and value is not None:
+                self.put(key, value)
+            return value
+        
+        value, shared = self.flights.do(key, run)
+        if shared:
+            print(f"🔗 Joined in-flight generation ({key[:12]})")
+            if on_hit is not None:
+                on_hit(value)
+        return value
+    
+    def clear(self):
+        """清空缓存（包括磁盘）"""
+        with self._lock:
+            self._entries.clear()
+        for path in self._disk_files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def _remember(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    # ------------------------------------------------------------------
+    # 磁盘存储（JSON 文件，文件修改时间作为最近访问时间）
+    # ------------------------------------------------------------------
+    
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+    
+    def _disk_files(self):
+        if not self.disk_dir:
+            return []
+        try:
+            return [entry.path for entry in os.scandir(self.disk_dir) if entry.name.endswith(".json")]
+        except OSError:
+            return []
+    
+    def _load_disk(self, key: str) -> Optional[Any]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)['value']
+            os.utime(path)
+            return value
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _save_disk(self, key: str, value: Any):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'value': value}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️  Failed to persist cached response: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        
+        files = self._disk_files()
+        if len(files) > DISK_MAX_FILES:
+            files.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+            for old in files[:len(files) - DISK_MAX_FILES]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    
+    def stats(self) -> Dict:
+        """获取统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'disk': bool(self.disk_dir),
+                'coalesced': self.flights.shared,
+            }
+    
+    def format_stats(self) -> str:
+        """格式化统计信息（用于日志和节点状态输出）"""
+        stats = self.stats()
+        disk = f", disk_hits={stats['disk_hits']}" if stats['disk'] else ""
+        return (f"♻️  Response cache: {stats['entries']} / {stats['max_entries']} result(s), "
+                f"hits={stats['hits']}{disk} misses={stats['misses']} (hit rate {stats['hit_rate']:.0%}), "
+                f"coalesced={stats['coalesced']}")
+
+
+# 全局单例
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """获取全局结果缓存实例"""
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            disk_dir = None
+            if os.environ.get(DISK_ENV, "").strip().lower() in ("1", "true", "yes") and PathConfig is not None:
+                try:
+                    disk_dir = os.path.join(PathConfig.get_cache_dir(), "responses")
+                except Exception as e:
+                    print(f"⚠️  Response cache directory unavailable: {e}")
+            _response_cache = ResponseCache(disk_dir=disk_dir)
+        return _response_cache
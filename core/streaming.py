@@ -0,0 +1,377 @@
+"""
+Streaming - 流式生成辅助工具
+提供增量的思考标签拆分、思考 token 预算、生成耗时统计（TTFT、tokens/s）以及
+ComfyUI 进度条 / websocket 的进度推送
+"""
+
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# 支持的思考标签（开始标签, 结束标签），匹配时忽略大小写
+THINK_TAGS: List[Tuple[str, str]] = [
+    ('<think>', '</think>'),
+    ('<thinking>', '</thinking>'),
+    ('[THINKING]', '[/THINKING]'),
+]
+
+# websocket 事件名（前端可通过 api.addEventListener 订阅）
+STREAM_EVENT = "gguf-vlm.stream"
+
+
+class ThinkTagSplitter:
+    """
+    增量拆分思考内容和最终回答
+    
+    每次喂入一段流式文本，返回这段文本中属于回答和属于思考的部分；
+    可能是标签前缀的尾部会暂存到下一次，保证标签被拆成多个 token 时也能识别
+    """
+    
+    def __init__(self, tags: List[Tuple[str, str]] = None):
+        """
+        初始化拆分器
+        
+        Args:
+            tags: (开始标签, 结束标签) 列表，默认使用 THINK_TAGS
+        """
+        self.tags = tags or THINK_TAGS
+        self._open_tags = [open_tag.lower() for open_tag, _ in self.tags]
+        self._pending = ""
+        self._close_tag: Optional[str] = None
+        self._close_index: Optional[int] = None
+        self.answer = ""
+        self.thinking = ""
+    
+    @property
+    def in_thinking(self) -> bool:
+        """当前是否处于思考内容中"""
+        return self._close_tag is not None
+    
+    @property
+    def close_tag(self) -> Optional[str]:
+        """当前打开的思考块对应的结束标签（不在思考内容中时为 None）"""
+        return self.tags[self._close_index][1] if self._close_index is not None else None
+    
+    def feed(self, text: str) -> Tuple[str, str]:
+        """
+        喂入一段文本
+        
+        Args:
+            text: 新生成的文本片段
+        
+        Returns:
+            (回答增量, 思考增量)
+        """
+        buffer = self._pending + text
+        self._pending = ""
+        answer_parts = []
+        thinking_parts = []
+        
+        while buffer:
+            lowered = buffer.lower()
+            if self._close_tag is None:
+                # 查找最早出现的开始标签
+                found = min(
+                    ((lowered.find(tag), index) for index, tag in enumerate(self._open_tags) if tag in lowered),
+                    default=None
+                )
+                if found is not None:
+                    position, index = found
+                    answer_parts.append(buffer[:position])
+                    buffer = buffer[position + len(self._open_tags[index]):]
+                    self._close_tag = self.tags[index][1].lower()
+                    self._close_index = index
+                    continue
+                keep = self._partial_suffix(lowered, self._open_tags)
+                answer_parts.append(buffer[:len(buffer) - keep])
+                self._pending = buffer[len(buffer) - keep:]
+                break
+            
+            position = lowered.find(self._close_tag)
+            if position >= 0:
+                thinking_parts.append(buffer[:position])
+                buffer = buffer[position + len(self._close_tag):]
+                self._close_tag = None
+                self._close_index = None
+                continue
+            keep = self._partial_suffix(lowered, [self._close_tag])
+            thinking_parts.append(buffer[:len(buffer) - keep])
+            self._pending = buffer[len(buffer) - keep:]
+            break
+        
+        answer_delta = "".join(answer_parts)
+        thinking_delta = "".join(thinking_parts)
+        self.answer += answer_delta
+        self.thinking += thinking_delta
+        return answer_delta, thinking_delta
+    
+    def flush(self) -> Tuple[str, str]:
+        """
+        结束流式输入，输出暂存的尾部
+        
+        Returns:
+            (回答增量, 思考增量)
+        """
+        rest, self._pending = self._pending, ""
+        if self._close_tag is None:
+            self.answer += rest
+            return rest, ""
+        self.thinking += rest
+        return "", rest
+    
+    @staticmethod
+    def _partial_suffix(lowered: str, tags: List[str]) -> int:
+        """返回文本末尾可能是某个标签前缀的最大长度"""
+        longest = 0
+        for tag in tags:
+            for size in range(min(len(tag) - 1, len(lowered)), longest, -1):
+                if lowered.endswith(tag[:size]):
+                    longest = size
+                    break
+        return longest
+
+
+class ThinkingBudget:
+    """
+    思考 token 预算（流式标签状态机）
+    
+    逐个喂入流式片段（每个片段约为一个 token），统计思考标签内的片段数；
+    超出预算后 feed 返回 True，调用方停止生成，然后强制闭合思考块继续生成回答或直接结束
+    """
+    
+    def __init__(self, budget: int, tags: List[Tuple[str, str]] = None):
+        """
+        初始化思考预算
+        
+        Args:
+            budget: 允许的思考 token 数（0 表示一开始思考就闭合）
+            tags: (开始标签, 结束标签) 列表，默认使用 THINK_TAGS
+        """
+        self.budget = max(0, int(budget))
+        self.splitter = ThinkTagSplitter(tags)
+        self.tokens = 0
+        self.thinking_tokens = 0
+        self.exceeded = False
+    
+    def feed(self, text: str) -> bool:
+        """
+        喂入一个流式片段
+        
+        Args:
+            text: 新生成的文本片段
+        
+        Returns:
+            是否超出预算（应停止生成）
+        """
+        self.tokens += 1
+        _, thinking_delta = self.splitter.feed(text)
+        if self.splitter.in_thinking or thinking_delta:
+            self.thinking_tokens += 1
+        if self.splitter.in_thinking and self.thinking_tokens > self.budget:
+            self.exceeded = True
+        return self.exceeded
+    
+    def closing_text(self) -> str:
+        """强制闭合思考块时追加的文本"""
+        close_tag = self.splitter.close_tag or THINK_TAGS[0][1]
+        return f"{close_tag}\n\n"
+
+
+class StreamMetrics:
+    """
+    单次生成的耗时统计
+    
+    由调用方创建并传给引擎的生成方法，引擎在生成时填充；
+    结果来自缓存或共享其他请求的生成时不会填充（finished 为 False）
+    """
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """重新开始计时（引擎在开始流式生成时调用）"""
+        self.start_time = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.chunks = 0
+        self.completion_tokens: Optional[int] = None
+    
+    def on_chunk(self):
+        """收到一个流式片段"""
+        if self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+        self.chunks += 1
+    
+    def finish(self, completion_tokens: int = None):
+        """
+        结束统计
+        
+        Args:
+            completion_tokens: 精确的生成 token 数（None 时按流式片段数计）
+        """
+        self.end_time = time.perf_counter()
+        if completion_tokens is not None:
+            self.completion_tokens = completion_tokens
+    
+    @property
+    def finished(self) -> bool:
+        """是否已完成统计（本次请求确实执行了生成）"""
+        return self.end_time is not None
+    
+    @property
+    def tokens(self) -> int:
+        return self.completion_tokens if self.completion_tokens is not None else self.chunks
+    
+    @property
+    def ttft(self) -> Optional[float]:
+        """首 token 延迟（秒）"""
+        if self.first_token_time is None:
+            return None
+        return self.first_token_time - self.start_time
+    
+    @property
+    def total_latency(self) -> float:
+        """总耗时（秒）"""
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        return end - self.start_time
+    
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """解码速度（首 token 之后的 tokens/s）"""
+        if self.first_token_time is None or self.tokens <= 1:
+            return None
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        decode_time = end - self.first_token_time
+        if decode_time <= 0:
+            return None
+        return (self.tokens - 1) / decode_time
+    
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        return {
+            'ttft': self.ttft,
+            'tokens': self.tokens,
+            'tokens_per_second': self.tokens_per_second,
+            'total_latency': self.total_latency,
+        }
+    
+    def format(self) -> str:
+        """格式化输出（用于日志）"""
+        ttft = f"{self.ttft * 1000:.0f} ms" if self.ttft is not None else "n/a"
+        speed = f"{self.tokens_per_second:.1f} tok/s" if self.tokens_per_second is not None else "n/a"
+        return f"⏱️  TTFT {ttft}, {self.tokens} tokens, {speed}, total {self.total_latency:.2f} s"
+
+
+class StreamProgress:
+    """
+    把流式生成进度推送到 ComfyUI
+    
+    - 进度条：comfy.utils.ProgressBar（按 token 数 / max_tokens）
+    - 部分文本：通过 PromptServer 发送 STREAM_EVENT websocket 事件
+    
+    不在 ComfyUI 中运行时自动退化为空操作
+    """
+    
+    def __init__(self, max_tokens: int, node_id: str = None, min_interval: float = 0.1):
+        """
+        初始化进度推送
+        
+        Args:
+            max_tokens: 最大生成 token 数（进度条总量）
+            node_id: 节点 ID（ComfyUI hidden 输入 UNIQUE_ID），用于前端定位节点
+            min_interval: 两次推送部分文本的最小间隔（秒）
+        """
+        self.max_tokens = max(1, int(max_tokens))
+        self.node_id = node_id
+        self.min_interval = min_interval
+        self.splitter = ThinkTagSplitter()
+        # 本次生成的耗时统计（传给引擎的 metrics 参数，由引擎填充）
+        self.metrics = StreamMetrics()
+        self._tokens = 0
+        self._last_sent = 0.0
+        
+        try:
+            import comfy.utils
+            self._pbar = comfy.utils.ProgressBar(self.max_tokens)
+        except Exception:
+            self._pbar = None
+        
+        try:
+            from server import PromptServer
+            self._server = PromptServer.instance
+        except Exception:
+            self._server = None
+    
+    def __call__(self, text: str):
+        """处理一个流式片段（可直接作为 on_token 回调）"""
+        self._tokens += 1
+        self.splitter.feed(text)
+        
+        if self._pbar is not None:
+            self._pbar.update_absolute(min(self._tokens, self.max_tokens), self.max_tokens)
+        
+        now = time.perf_counter()
+        if now - self._last_sent >= self.min_interval:
+            self._last_sent = now
+            self._send(done=False)
+    
+    def finish(self, metrics: StreamMetrics = None):
+        """
+        结束推送（发送完整文本和统计信息）
+        
+        Args:
+            metrics: 本次生成的统计信息，默认为 self.metrics（未完成统计时不发送）
+        """
+        if metrics is None:
+            metrics = self.metrics
+        self.splitter.flush()
+        if self._pbar is not None:
+            self._pbar.update_absolute(self.max_tokens, self.max_tokens)
+        self._send(done=True, metrics=metrics)
+    
+    def _send(self, done: bool, metrics: StreamMetrics = None):
+        if self._server is None or self.node_id is None:
+            return
+        payload = {
+            'node': self.node_id,
+            'text': self.splitter.answer,
+            'thinking': self.splitter.thinking,
+            'done': done,
+        }
+        if metrics is not None and metrics.finished:
+            payload['metrics'] = metrics.to_dict()
+        try:
+            self._server.send_sync(STREAM_EVENT, payload)
+        except Exception:
+            pass
+
+
+def consume_stream(chunks, on_token: Callable[[str], None] = None,
+                   metrics: StreamMetrics = None,
+                   should_stop: Callable[[str], bool] = None) -> str:
+    """
+    消费文本片段迭代器并拼接完整输出
+    
+    Args:
+        chunks: 文本片段迭代器
+        on_token: 每个片段的回调
+        metrics: 统计对象（记录首 token 时间和片段数）
+        should_stop: 每个片段之后调用，返回 True 时提前结束（关闭迭代器，停止生成）
+    
+    Returns:
+        完整文本
+    """
+    parts = []
+    for text in chunks:
+        if not text:
+            continue
+        if metrics is not None:
+            metrics.on_chunk()
+        parts.append(text)
+        if on_token is not None:
+            on_token(text)
+        if should_stop is not None and should_stop(text):
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            break
+    return "".join(parts)
@@ -0,0 +1,231 @@
+"""
+Token Counter - prompt token 计数与自动上下文长度
+用只加载词表的 GGUF 分词器（vocab_only）统计系统提示词、用户提示词、图像 token 和 max_tokens，
+为加载器节点的 "auto" 上下文模式选择能容纳本次工作负载的最小上下文档位
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+# 自动模式可选的上下文长度档位
+CTX_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+# 自动模式在知道 prompt 之前（加载器节点预加载时）使用的上下文长度
+AUTO_CTX_INITIAL = 4096
+
+# 每条消息的聊天模板开销（角色标记、换行等）
+TEMPLATE_OVERHEAD_TOKENS = 16
+
+# 无法加载分词器时按 UTF-8 字节数估算（每 token 约 3 字节，对英文偏保守，对中文接近实际）
+BYTES_PER_TOKEN = 3
+
+# 每种聊天处理器的图像 token 数（llava15 为固定的 24×24 patch）
+FIXED_IMAGE_TOKENS = {
+    'llava15': 576,
+}
+
+# Qwen2.5-VL：每 28×28 像素一个 token（14 像素 patch，2×2 合并），上限对应默认的 max_pixels
+QWEN_PATCH_PIXELS = 28
+QWEN_MAX_IMAGE_TOKENS = 16384
+
+# 最多缓存的分词器数量
+MAX_TOKENIZERS = 4
+
+
+def estimate_image_tokens(chat_handler: str, width: int, height: int) -> int:
+    """
+    估算一张图像（或一个视频帧）占用的 token 数
+    
+    Args:
+        chat_handler: 聊天处理器类型（'llava15' / 'qwen25vl'）
+        width: 图像宽度
+        height: 图像高度
+    
+    Returns:
+        token 数
+    """
+    if chat_handler in FIXED_IMAGE_TOKENS:
+        return FIXED_IMAGE_TOKENS[chat_handler]
+    patches = math.ceil(height / QWEN_PATCH_PIXELS) * math.ceil(width / QWEN_PATCH_PIXELS)
+    # 加上 vision_start / vision_end 标记
+    return min(max(patches, 4), QWEN_MAX_IMAGE_TOKENS) + 2
+
+
+def fit_context_bucket(needed: int, max_ctx: int, buckets: Tuple[int, ...] = CTX_BUCKETS) -> int:
+    """
+    选择能容纳所需 token 数的最小上下文档位
+    
+    Args:
+        needed: 所需 token 数（prompt + 生成）
+        max_ctx: 上下文长度上限（加载器节点的 n_ctx，已按模型训练长度限制）
+        buckets: 上下文档位
+    
+    Returns:
+        上下文长度（不超过 max_ctx）
+    """
+    for bucket in buckets:
+        if bucket >= needed:
+            return min(bucket, max_ctx)
+    return max_ctx
+
+
+def initial_context(max_ctx: int) -> int:
+    """自动模式在知道 prompt 之前使用的上下文长度"""
+    return min(AUTO_CTX_INITIAL, max_ctx)
+
+
+class TokenCounter:
+    """
+    按模型缓存分词器的 token 计数器
+    
+    始终使用自己的 vocab_only 分词器，不借用模型池中的实例：后台预加载重新加载或模型池淘汰时会
+    close() 池中的实例，与计数并发时会访问已释放的模型
+    """
+    
+    def __init__(self, max_tokenizers: int = MAX_TOKENIZERS):
+        """
+        初始化 token 计数器
+        
+        Args:
+            max_tokenizers: 最多缓存的 vocab_only 分词器数量
+        """
+        self.max_tokenizers = max_tokenizers
+        self._tokenizers: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _load_tokenizer(self, model_path: str) -> Optional[Any]:
+        """加载只包含词表的 Llama 实例（不读取权重，调用方持有 _lock）"""
+        try:
+            from llama_cpp import Llama
+            return Llama(model_path=model_path, vocab_only=True, verbose=False)
+        except Exception as e:
+            print(f"⚠️  Cannot load tokenizer for {os.path.basename(model_path)}, estimating from bytes: {e}")
+            return None
+    
+    def _tokenizer(self, model_path: str) -> Optional[Any]:
+        """获取分词器（调用方持有 _lock）"""
+        if model_path in self._tokenizers:
+            self._tokenizers.move_to_end(model_path)
+            return self._tokenizers[model_path]
+        
+        tokenizer = self._load_tokenizer(model_path)
+        self._tokenizers[model_path] = tokenizer
+        while len(self._tokenizers) > self.max_tokenizers:
+            _, old = self._tokenizers.popitem(last=False)
+            if old is not None and hasattr(old, 'close'):
+                old.close()
+        return tokenizer
+    
+    def count(self, model_path: str, text: str) -> int:
+        """
+        统计文本的 token 数
+        
+        Args:
+            model_path: GGUF 模型文件路径
+            text: 文本
+        
+        Returns:
+            token 数（分词器不可用时按字节数估算）
+        """
+        if not text:
+            return 0
+        data = text.encode('utf-8')
+        with self._lock:
+            tokenizer = self._tokenizer(model_path)
+            if tokenizer is not None:
+                try:
+                    return len(tokenizer.tokenize(data, add_bos=False, special=True))
+                except Exception as e:
+                    print(f"⚠️  Tokenization failed, estimating from bytes: {e}")
+        return math.ceil(len(data) / BYTES_PER_TOKEN)
+    
+    def count_workload(self, model_path: str, texts: Iterable[str], max_tokens: int,
+                       images: Iterable[Tuple[int, int]] = (), chat_handler: str = None) -> int:
+        """
+        统计一次生成需要的上下文长度
+        
+        Args:
+            model_path: GGUF 模型文件路径
+            texts: 各条消息的文本（系统提示词、用户提示词）
+            max_tokens: 最大生成 token 数
+            images: 各图像/视频帧的 (宽, 高)
+            chat_handler: 视觉模型的聊天处理器类型
+        
+        Returns:
+            所需 token 数
+        """
+        texts = [text for text in texts if text]
+        needed = sum(self.count(model_path, text) for text in texts)
+        needed += TEMPLATE_OVERHEAD_TOKENS * (len(texts) + 1)
+        needed += sum(estimate_image_tokens(chat_handler, width, height) for width, height in images)
+        return needed + max_tokens
+    
+    def clear(self):
+        """释放缓存的分词器"""
+        with self._lock:
+            for tokenizer in self._tokenizers.values():
+                if tokenizer is not None and hasattr(tokenizer, 'close'):
+                    tokenizer.close()
+            self._tokenizers.clear()
+
+
+def resolve_auto_context(config: Dict, texts: Iterable[str], max_tokens: int,
+                         images: Iterable[Tuple[int, int]] = (), chat_handler: str = None) -> Dict:
+    """
+    自动上下文模式：按本次工作负载确定模型配置的 n_ctx
+    
+    已加载的实例上下文更大时引擎会直接复用，更小时只重建上下文（不重新加载权重）
+    
+    Args:
+        config: 加载器节点输出的模型配置（n_ctx_auto 为 True 时生效）
+        texts: 各条消息的文本
+        max_tokens: 最大生成 token 数
+        images: 各图像/视频帧的 (宽, 高)
+        chat_handler: 视觉模型的聊天处理器类型
+    
+    Returns:
+        模型配置（自动模式时为设置了 n_ctx 的新字典）
+    """
+    if not config.get('n_ctx_auto'):
+        return config
+    
+    model_path = config['model_path']
+    max_ctx = config.get('n_ctx_max') or config.get('n_ctx', 8192)
+    needed = get_token_counter().count_workload(model_path, texts, max_tokens, images, chat_handler)
+    n_ctx = fit_context_bucket(needed, max_ctx)
+    if needed > max_ctx:
+        print(f"⚠️  Auto n_ctx: workload needs ~{needed} tokens, capped at {max_ctx}")
+    else:
+        print(f"📏 Auto n_ctx: ~{needed} tokens needed, using {n_ctx}")
+    return {**config, 'n_ctx': n_ctx}
+
+
+def auto_context_config(max_ctx: int) -> Dict:
+    """
+    加载器节点的自动上下文模式配置
+    
+    Args:
+        max_ctx: 上下文长度上限（节点上的 n_ctx，已按模型训练长度限制）
+    
+    Returns:
+        {'n_ctx', 'n_ctx_max', 'n_ctx_auto'}
+    """
+    return {'n_ctx': initial_context(max_ctx), 'n_ctx_max': max_ctx, 'n_ctx_auto': True}
+
+
+# 全局单例
+_token_counter = None
+_token_counter_lock = threading.Lock()
+
+
+def get_token_counter() -> TokenCounter:
+    """获取全局 token 计数器"""
+    global _token_counter
+    with _token_counter_lock:
+        if _token_counter is None:
+            _token_counter = TokenCounter()
+        return _token_counter
@@ -0,0 +1,312 @@
+"""
+Usage History - 模型使用记录与启动预热
+记录每个 GGUF 模型的使用次数（每次生成计一次）、最近使用时间和加载参数（持久化到磁盘）；
+ComfyUI 启动时可以在后台把最常用、且能放入模型池预算的几个模型提前加载
+
+记录只更新内存，文件在最后一次记录 SAVE_DELAY 秒后（以及进程退出时）写入，不在生成线程上写盘
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+try:
+    from .load_spec import LoadSpec
+except ImportError:
+    from core.load_spec import LoadSpec
+
+try:
+    from ..config.paths import PathConfig
+except (ImportError, ValueError):
+    try:
+        from config.paths import PathConfig
+    except ImportError:
+        PathConfig = None
+
+try:
+    from ..utils.file_store import load_json, save_json
+except (ImportError, ValueError):
+    from utils.file_store import load_json, save_json
+
+
+# 环境变量：启动时后台预热的模型数（默认 0，即不预热）
+WARM_POOL_ENV = "GGUF_VLM_WARM_POOL"
+
+# 环境变量：设为 0 时不记录使用历史
+HISTORY_ENV = "GGUF_VLM_USAGE_HISTORY"
+
+HISTORY_FILE = "usage_history.json"
+
+# 最多保留的记录数
+MAX_ENTRIES = 64
+
+# 记录后延迟写盘的秒数（期间的多次记录合并为一次写入）
+SAVE_DELAY = 5.0
+
+# 使用次数的半衰期（天），很久没用的模型逐渐让位给最近常用的模型
+HALF_LIFE_DAYS = 14.0
+
+# 记录的加载参数（load_model 的关键字参数）
+_LOAD_FIELDS = ('n_ctx', 'n_gpu_layers', 'n_batch', 'type_k', 'type_v', 'logits_all', 'mmproj_path',
+                'n_threads', 'n_threads_batch', 'n_ubatch', 'offload_kqv', 'use_mlock', 'flash_attn', 'profile')
+
+
+def _env_disabled(name: str) -> bool:
+    return os.environ.get(name, "1").strip().lower() in ("0", "false", "no", "off")
+
+
+class UsageHistory:
+    """模型使用历史（模型路径 -> 次数、最近使用时间、加载参数）"""
+    
+    def __init__(self, path: str = None):
+        """
+        初始化使用历史
+        
+        Args:
+            path: 历史文件路径，None 时只保存在内存中
+        """
+        self.path = path
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+        self._load()
+        if path:
+            atexit.register(self.flush)
+    
+    def _load(self):
+        self._entries = load_json(self.path, 'models', "usage history")
+    
+    def _save(self):
+        """保存到磁盘（调用方持有 _lock）"""
+        save_json(self.path, 'models', self._entries, "usage history")
+    
+    def _schedule_save(self):
+        """标记有未保存的修改，SAVE_DELAY 秒后在后台线程写盘（调用方持有 _lock）"""
+        self._dirty = True
+        if not self.path or self._timer is not None:
+            return
+        self._timer = threading.Timer(SAVE_DELAY, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+    
+    def flush(self):
+        """立即写入未保存的修改"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty:
+                self._save()
+                self._dirty = False
+    
+    def record(self, model_path: str, count: bool = True, spec: Optional[LoadSpec] = None, **kwargs):
+        """
+        记录一次模型使用
+        
+        Args:
+            model_path: 模型文件路径
+            count: 是否计为一次使用（生成时为 True；加载时为 False，只更新已有记录的加载参数）
+            spec: 已加载实例的加载规格，None 时按 kwargs 构建
+            **kwargs: load_model 的加载参数（保存最近一次的参数，预热时按相同规格加载）
+        """
+        if spec is None:
+            spec = LoadSpec.from_kwargs(model_path, **kwargs)
+        load_kwargs = {name: getattr(spec, name) for name in _LOAD_FIELDS}
+        if spec.mmproj_path:
+            load_kwargs['chat_handler'] = kwargs.get('chat_handler') or 'llava15'
+        
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(model_path)
+            if entry is None:
+                if not count:
+                    return
+                entry = {'count': 0.0}
+            if count:
+                entry['count'] = self._decayed_count(entry, now) + 1
+                entry['last_used'] = now
+            entry['load_kwargs'] = load_kwargs
+            self._entries[model_path] = entry
+            
+            if len(self._entries) > MAX_ENTRIES:
+                ranked = sorted(self._entries, key=lambda path: self._score(self._entries[path], now))
+                for path in ranked[:len(self._entries) - MAX_ENTRIES]:
+                    del self._entries[path]
+            self._schedule_save()
+    
+    @staticmethod
+    def _decayed_count(entry: Dict, now: float) -> float:
+        age_days = max(0.0, now - entry.get('last_used', now)) / 86400
+        return float(entry.get('count', 0)) * 0.5 ** (age_days / HALF_LIFE_DAYS)
+    
+    def _score(self, entry: Dict, now: float) -> tuple:
+        return (self._decayed_count(entry, now), entry.get('last_used', 0))
+    
+    def top(self, limit: int) -> List[Dict]:
+        """
+        按使用频率（随时间衰减）排序的模型
+        
+        Args:
+            limit: 最多返回的条目数
+        
+        Returns:
+            [{'model_path', 'count', 'last_used', 'load_kwargs'}, ...]（只包含文件仍存在的模型）
+        """
+        now = time.time()
+        with self._lock:
+            ranked = sorted(self._entries.items(), key=lambda item: self._score(item[1], now), reverse=True)
+        
+        result = []
+        for model_path, entry in ranked:
+            if len(result) >= limit:
+                break
+            if not os.path.exists(model_path):
+                continue
+            mmproj_path = (entry.get('load_kwargs') or {}).get('mmproj_path')
+            if mmproj_path and not os.path.exists(mmproj_path):
+                continue
+            result.append({'model_path': model_path, **entry})
+        return result
+    
+    def clear(self):
+        """清空使用历史"""
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.flush()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def plan_warm_pool(history: UsageHistory, pool, limit: int) -> List[Dict]:
+    """
+    选出启动时预热的模型：按使用频率依次选取，跳过放不进模型池剩余预算的模型
+    
+    Args:
+        history: 使用历史
+        pool: 模型池（ModelPool）
+        limit: 最多预热的模型数
+    
+    Returns:
+        使用历史条目列表
+    """
+    if pool.max_models:
+        limit = min(limit, pool.max_models - len(pool))
+    
+    selected = []
+    reserved = {'ram': 0, 'vram': 0}
+    for entry in history.top(MAX_ENTRIES):
+        if len(selected) >= limit:
+            break
+        if entry['model_path'] in pool:
+            continue
+        load_kwargs = entry.get('load_kwargs') or {}
+        try:
+            footprint = LoadSpec.from_kwargs(entry['model_path'], **load_kwargs).device_footprint()
+        except ValueError:
+            continue
+        if not pool.fits(footprint, reserved):
+            continue
+        for device in reserved:
+            reserved[device] += footprint[device]
+        selected.append(entry)
+    return selected
+
+
+def _warm_pool_size() -> int:
+    value = os.environ.get(WARM_POOL_ENV, "0").strip()
+    try:
+        return max(0, int(value))
+    except ValueError:
+        print(f"⚠️  Ignoring invalid {WARM_POOL_ENV}={value!r}")
+        return 0
+
+
+def restore_warm_pool(limit: int = None) -> List[str]:
+    """
+    按使用历史预加载常用模型（在后台线程中调用）
+    
+    Args:
+        limit: 最多预热的模型数，None 时读取环境变量
+    
+    Returns:
+        已提交预加载的模型路径
+    """
+    if limit is None:
+        limit = _warm_pool_size()
+    if limit <= 0:
+        return []
+    
+    try:
+        from .inference_engine import get_inference_engine
+    except ImportError:
+        from core.inference_engine import get_inference_engine
+    
+    engine = get_inference_engine()
+    entries = plan_warm_pool(get_usage_history(), engine.loaded_models, limit)
+    if not entries:
+        print("ℹ️ Warm pool: no recorded model fits the pool budget")
+        return []
+    
+    print(f"🔥 Warm pool: preloading {len(entries)} frequently used model(s)")
+    submitted = []
+    for entry in entries:
+        # 预热不是真正的使用，不记录
+        future = engine.preload_model(entry['model_path'], record=False, **(entry.get('load_kwargs') or {}))
+        if future is not None:
+            submitted.append(entry['model_path'])
+    return submitted
+
+
+def start_warm_pool() -> bool:
+    """
+    启动时在后台线程中恢复预热池（不阻塞 ComfyUI 的节点导入）
+    
+    Returns:
+        是否启动了预热线程
+    """
+    if _warm_pool_size() <= 0:
+        return False
+    
+    def run():
+        try:
+            restore_warm_pool()
+        except Exception as e:
+            print(f"⚠️  Warm pool restore failed: {e}")
+    
+    threading.Thread(target=run, name="gguf-vlm-warm-pool", daemon=True).start()
+    return True
+
+
+# 全局单例
+_usage_history = None
+_usage_history_lock = threading.Lock()
+
+
+def get_usage_history() -> UsageHistory:
+    """获取全局使用历史实例"""
+    global _usage_history
+    with _usage_history_lock:
+        if _usage_history is None:
+            path = None
+            if PathConfig is not None and not _env_disabled(HISTORY_ENV):
+                try:
+                    path = os.path.join(PathConfig.get_cache_dir(), HISTORY_FILE)
+                except Exception as e:
+                    print(f"⚠️  Usage history directory unavailable: {e}")
+            _usage_history = UsageHistory(path)
+        return _usage_history
+
+
+def record_usage(model_path: str, count: bool = True, spec: Optional[LoadSpec] = None, **kwargs):
+    """记录一次模型使用（设置 GGUF_VLM_USAGE_HISTORY=0 时不记录），参数见 UsageHistory.record"""
+    if _env_disabled(HISTORY_ENV):
+        return
+    try:
+        get_usage_history().record(model_path, count=count, spec=spec, **kwargs)
+    except Exception as e:
+        print(f"⚠️  Failed to record model usage: {e}")
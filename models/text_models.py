@@ -6,6 +6,23 @@ from typing import Dict, List, Optional
 from dataclasses import dataclass
 
 
+def fit_context_to_metadata(n_ctx: int, metadata=None) -> int:
+    """
+    将上下文长度限制在模型的训练上下文长度以内
+    
+    Args:
+        n_ctx: 请求的上下文长度
+        metadata: GGUFMetadata 实例（可选）
+    
+    Returns:
+        调整后的上下文长度
+    """
+    context_length = metadata.context_length if metadata is not None else None
+    if context_length and n_ctx > context_length:
+        return context_length
+    return n_ctx
+
+
 @dataclass
 class TextModelConfig:
     """文本生成模型配置"""
@@ -14,6 +31,7 @@ class TextModelConfig:
     model_path: str
     n_ctx: int = 8192
     n_gpu_layers: int = -1
+    n_batch: int = 512
     verbose: bool = False
     
     # 推理参数
@@ -36,6 +54,7 @@ class TextModelConfig:
             'model_path': self.model_path,
             'n_ctx': self.n_ctx,
             'n_gpu_layers': self.n_gpu_layers,
+            'n_batch': self.n_batch,
             'verbose': self.verbose,
             'max_tokens': self.max_tokens,
             'temperature': self.temperature,
@@ -76,6 +95,16 @@ class TextModelConfig:
 class TextModelPresets:
     """预设的文本模型配置"""
     
+    # GGUF general.architecture 到预设的映射（文件名无法匹配时使用）
+    ARCHITECTURE_PRESETS = {
+        'qwen2': 'qwen2.5',
+        'qwen2moe': 'qwen2.5',
+        'llama': 'llama-3.1',
+        'gemma2': 'gemma-2',
+        'deepseek2': 'deepseek-v2',
+        'phi3': 'phi-3',
+    }
+    
     @staticmethod
     def get_qwen25_7b() -> Dict:
         """Qwen2.5-7B 预设"""
@@ -144,12 +173,13 @@ class TextModelPresets:
         }
     
     @staticmethod
-    def get_preset(model_name: str) -> Optional[Dict]:
+    def get_preset(model_name: str, metadata=None) -> Optional[Dict]:
         """
-        根据模型名称获取预设
+        根据模型名称获取预设，名称无法匹配时按 GGUF 架构匹配
         
         Args:
             model_name: 模型名称
+            metadata: GGUFMetadata 实例（可选），用于架构匹配和限制 n_ctx
         
         Returns:
             预设配置字典
@@ -166,15 +196,26 @@ class TextModelPresets:
         }
         
         model_name_lower = model_name.lower()
-        for key, preset in presets.items():
+        preset = None
+        for key, candidate in presets.items():
             if key in model_name_lower:
-                return preset
+                preset = candidate
+                break
         
-        # 默认配置
-        return {
-            'n_ctx': 8192,
-            'n_gpu_layers': -1,
-            'max_tokens': 2048,
-            'temperature': 0.7,
-            'business_type': 'text_generation'
-        }
+        if preset is None and metadata is not None:
+            key = TextModelPresets.ARCHITECTURE_PRESETS.get(metadata.architecture)
+            if key:
+                preset = presets[key]
+        
+        if preset is None:
+            # 默认配置
+            preset = {
+                'n_ctx': 8192,
+                'n_gpu_layers': -1,
+                'max_tokens': 2048,
+                'temperature': 0.7,
+                'business_type': 'text_generation'
+            }
+        
+        preset['n_ctx'] = fit_context_to_metadata(preset['n_ctx'], metadata)
+        return preset
@@ -5,6 +5,8 @@ Vision Model Configuration - 视觉语言模型配置
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 
+from .text_models import fit_context_to_metadata
+
 
 @dataclass
 class VisionModelConfig:
@@ -15,6 +17,7 @@ class VisionModelConfig:
     mmproj_path: Optional[str] = None
     n_ctx: int = 8192
     n_gpu_layers: int = -1
+    n_batch: int = 512
     verbose: bool = False
     
     # 推理参数
@@ -35,6 +38,7 @@ class VisionModelConfig:
             'mmproj_path': self.mmproj_path,
             'n_ctx': self.n_ctx,
             'n_gpu_layers': self.n_gpu_layers,
+            'n_batch': self.n_batch,
             'verbose': self.verbose,
             'max_tokens': self.max_tokens,
             'temperature': self.temperature,
@@ -74,6 +78,13 @@ class VisionModelConfig:
 class VisionModelPresets:
     """预设的视觉模型配置"""
     
+    # GGUF general.architecture 到预设的映射（文件名无法匹配时使用）
+    ARCHITECTURE_PRESETS = {
+        'qwen2vl': 'qwen2.5-vl-7b',
+        'qwen25vl': 'qwen2.5-vl-7b',
+        'qwen3vl': 'qwen3-vl-8b',
+    }
+    
     @staticmethod
     def get_qwen25_vl_3b() -> Dict:
         """Qwen2.5-VL-3B 预设"""
@@ -108,12 +119,13 @@ class VisionModelPresets:
         }
     
     @staticmethod
-    def get_preset(model_name: str) -> Optional[Dict]:
+    def get_preset(model_name: str, metadata=None) -> Optional[Dict]:
         """
-        根据模型名称获取预设
+        根据模型名称获取预设，名称无法匹配时按 GGUF 架构匹配
         
         Args:
             model_name: 模型名称
+            metadata: GGUFMetadata 实例（可选），用于架构匹配和限制 n_ctx
         
         Returns:
             预设配置字典
@@ -125,8 +137,17 @@ class VisionModelPresets:
         }
         
         model_name_lower = model_name.lower()
-        for key, preset in presets.items():
+        preset = None
+        for key, candidate in presets.items():
             if key in model_name_lower:
-                return preset
+                preset = candidate
+                break
+        
+        if preset is None and metadata is not None:
+            key = VisionModelPresets.ARCHITECTURE_PRESETS.get(metadata.architecture)
+            if key:
+                preset = presets[key]
         
-        return None
+        if preset is not None:
+            preset['n_ctx'] = fit_context_to_metadata(preset['n_ctx'], metadata)
+        return preset
@@ -4,6 +4,7 @@ ComfyUI node definitions
 
 from .vision_node import VisionLanguageNode, VisionModelLoader
 from .memory_manager_node import MemoryManagerNode
+from .autotune_node import LlamaAutotuneNode
 from .remote_vision_node import RemoteVisionModelConfig, RemoteVisionAnalysis
 
 # 旧的文本节点已废弃，使用新的 text_generation_nodes
@@ -14,6 +15,7 @@ NODE_CLASS_MAPPINGS = {
     "VisionLanguageNode": VisionLanguageNode,
     "VisionModelLoader": VisionModelLoader,
     "MemoryManagerNode": MemoryManagerNode,
+    "LlamaAutotuneNode": LlamaAutotuneNode,
     "RemoteVisionModelConfig": RemoteVisionModelConfig,
     "RemoteVisionAnalysis": RemoteVisionAnalysis,
 }
@@ -22,12 +24,13 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "VisionLanguageNode": "🖼️ Vision Language Model (GGUF)",
     "VisionModelLoader": "🖼️ Vision Model Loader (GGUF)",
     "MemoryManagerNode": "🧹 Memory Manager (GGUF)",
+    "LlamaAutotuneNode": "🎛️ llama.cpp Autotune (GGUF)",
     "RemoteVisionModelConfig": "🌐 Remote Vision Model Config (LM Studio/Ollama)",
     "RemoteVisionAnalysis": "🖼️ Remote Vision Analysis",
 }
 
 __all__ = [
-    'VisionLanguageNode', 'VisionModelLoader', 'MemoryManagerNode',
+    'VisionLanguageNode', 'VisionModelLoader', 'MemoryManagerNode', 'LlamaAutotuneNode',
     'RemoteVisionModelConfig', 'RemoteVisionAnalysis',
     'NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS'
 ]
@@ -0,0 +1,133 @@
+"""
+Autotune Node - llama.cpp 加载参数自动调优节点
+对选中的 GGUF 模型运行预填充/生成基准测试，保存本机最快的加载参数
+"""
+
+import sys
+from pathlib import Path
+
+# 添加父目录到路径
+module_path = Path(__file__).parent.parent
+if str(module_path) not in sys.path:
+    sys.path.insert(0, str(module_path))
+
+# 优先使用相对导入，保证与其他节点共享同一个推理引擎
+try:
+    from ..core.model_loader import ModelLoader
+    from ..core.autotune import GRIDS, InterruptProcessingException, get_autotuner
+    from ..core.load_spec import LOAD_PROFILES, get_load_profile
+except ImportError:
+    from core.model_loader import ModelLoader
+    from core.autotune import GRIDS, InterruptProcessingException, get_autotuner
+    from core.load_spec import LOAD_PROFILES, get_load_profile
+
+
+class LlamaAutotuneNode:
+    """llama.cpp 加载参数自动调优节点"""
+    
+    _model_loader = None
+    
+    @classmethod
+    def _get_loader(cls):
+        if cls._model_loader is None:
+            cls._model_loader = ModelLoader()
+        return cls._model_loader
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        models = sorted(cls._get_loader().scan_models())
+        return {
+            "required": {
+                "model": (models if models else ["No models found"], {
+                    "tooltip": "要调优的 GGUF 模型（视觉模型选择主模型文件）"
+                }),
+                "mode": (list(GRIDS), {
+                    "default": "quick",
+                    "tooltip": "quick=常用取值（约 1 分钟）；full=完整网格，包括部分 GPU 卸载和 q8_0 K 缓存"
+                }),
+                "n_ctx": ("INT", {
+                    "default": 8192,
+                    "min": 512,
+                    "max": 128000,
+                    "step": 512,
+                    "tooltip": "与加载器节点相同的上下文长度（决定可卸载的层数；结果只用于以相同 n_ctx 加载的模型）"
+                }),
+                "load_profile": (list(LOAD_PROFILES), {
+                    "default": get_load_profile().name,
+                    "tooltip": "与加载器节点相同的加载档位（结果只用于以相同档位加载的模型）"
+                }),
+                "pp_tokens": ("INT", {
+                    "default": 512,
+                    "min": 64,
+                    "max": 4096,
+                    "step": 64,
+                    "tooltip": "预填充测试的 token 数（接近实际 prompt 长度，图像 token 也计入）"
+                }),
+                "tg_tokens": ("INT", {
+                    "default": 64,
+                    "min": 16,
+                    "max": 1024,
+                    "step": 16,
+                    "tooltip": "生成测试的 token 数（接近实际输出长度）"
+                }),
+                "save": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "保存结果，加载器节点之后在本机加载该模型时自动使用"
+                }),
+            },
+        }
+    
+    RETURN_TYPES = ("STRING",)
+    RETURN_NAMES = ("report",)
+    FUNCTION = "autotune"
+    CATEGORY = "🤖 GGUF-VLM/⚙️ Utils"
+    OUTPUT_NODE = True
+    
+    def autotune(self, model, mode="quick", pp_tokens=512, tg_tokens=64, save=True, n_ctx=8192,
+                 load_profile=None):
+        """运行自动调优"""
+        try:
+            model_path = self._get_loader().find_model(model)
+            if not model_path:
+                error_msg = f"❌ Model not found: {model}"
+                print(error_msg)
+                return (error_msg,)
+            
+            progress_bar = None
+            try:
+                import comfy.utils
+                progress_bar = comfy.utils.ProgressBar(1)
+            except Exception:
+                pass
+            
+            def on_progress(done, total):
+                if progress_bar is not None:
+                    progress_bar.update_absolute(done, total)
+            
+            tuner = get_autotuner()
+            result = tuner.tune(model_path, mode=mode, pp_tokens=pp_tokens, tg_tokens=tg_tokens,
+                                n_ctx=n_ctx, profile=load_profile, save=save, on_progress=on_progress)
+            report = tuner.format_result(model_path, result)
+            if save:
+                report += "\n💾 Saved for this machine; model loaders will use these settings"
+            print(report)
+            return (report,)
+        
+        except InterruptProcessingException:
+            # 交给 ComfyUI 处理中断
+            raise
+        except Exception as e:
+            import traceback
+            error_msg = f"❌ Autotune failed: {str(e)}\n{traceback.format_exc()}"
+            print(error_msg)
+            return (error_msg,)
+
+
+# 节点注册
+NODE_CLASS_MAPPINGS = {
+    "LlamaAutotuneNode": LlamaAutotuneNode,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "LlamaAutotuneNode": "🎛️ llama.cpp Autotune (GGUF)",
+}
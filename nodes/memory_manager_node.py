@@ -12,11 +12,13 @@ module_path = Path(__file__).parent.parent
 if str(module_path) not in sys.path:
     sys.path.insert(0, str(module_path))
 
+# 优先使用相对导入，保证与其他节点共享同一个推理引擎
 try:
-    from core.inference_engine import InferenceEngine
-except ImportError as e:
-    print(f"[ComfyUI-GGUF-VLM] Import error in memory_manager_node: {e}")
-    from ..core.inference_engine import InferenceEngine
+    from ..core.inference_engine import get_inference_engine
+    from ..core.prefetch import get_prefetch_planner
+except ImportError:
+    from core.inference_engine import get_inference_engine
+    from core.prefetch import get_prefetch_planner
 
 
 class MemoryManagerNode:
@@ -29,7 +31,7 @@ class MemoryManagerNode:
     def _get_engine(cls):
         """获取推理引擎"""
         if cls._inference_engine is None:
-            cls._inference_engine = InferenceEngine()
+            cls._inference_engine = get_inference_engine()
         return cls._inference_engine
     
     @classmethod
@@ -108,6 +110,12 @@ class MemoryManagerNode:
                 except Exception as e:
                     status_messages.append(f"⚠️ Error clearing GPU cache: {e}")
             
+            # 模型池统计（命中/未命中/淘汰次数）
+            status_messages.append(self._get_engine().loaded_models.format_stats())
+            status_messages.append(self._get_engine().prefix_cache.format_stats())
+            status_messages.append(self._get_engine().response_cache.format_stats())
+            status_messages.append(get_prefetch_planner().format_stats())
+            
             # 组合所有状态消息
             status = "\n".join(status_messages)
             print(f"\n{'='*60}")
@@ -12,22 +12,30 @@ module_path = Path(__file__).parent.parent
 if str(module_path) not in sys.path:
     sys.path.insert(0, str(module_path))
 
+# 优先使用相对导入，保证与其他节点共享同一份模块（以及其中的全局实例）
 try:
-    from core.model_loader import ModelLoader
-    from core.inference_engine import InferenceEngine
-    from core.cache_manager import CacheManager
-    from utils.registry import RegistryManager
-    from utils.downloader import FileDownloader
-    from models.text_models import TextModelConfig, TextModelPresets
-except ImportError as e:
-    print(f"[ComfyUI-GGUF-VLM] Import error in text_node: {e}")
-    # 尝试相对导入
     from ..core.model_loader import ModelLoader
-    from ..core.inference_engine import InferenceEngine
-    from ..core.cache_manager import CacheManager
-    from ..utils.registry import RegistryManager
+    from ..core.inference_engine import get_inference_engine
+    from ..core.streaming import StreamProgress
+    from ..core.load_spec import load_kwargs_from_config
+    from ..core.cache_manager import get_cache_manager
+    from ..core.model_catalog import get_text_model_catalog
+    from ..utils.registry import get_registry_manager
     from ..utils.downloader import FileDownloader
-    from ..models.text_models import TextModelConfig, TextModelPresets
+    from ..models.text_models import TextModelConfig, TextModelPresets, fit_context_to_metadata
+    from ..utils.gguf_reader import get_gguf_metadata
+except ImportError:
+    # 备用方案：作为顶层模块导入
+    from core.model_loader import ModelLoader
+    from core.inference_engine import get_inference_engine
+    from core.streaming import StreamProgress
+    from core.load_spec import load_kwargs_from_config
+    from core.cache_manager import get_cache_manager
+    from core.model_catalog import get_text_model_catalog
+    from utils.registry import get_registry_manager
+    from utils.downloader import FileDownloader
+    from models.text_models import TextModelConfig, TextModelPresets, fit_context_to_metadata
+    from utils.gguf_reader import get_gguf_metadata
 
 
 class TextModelLoader:
@@ -44,69 +52,17 @@ class TextModelLoader:
         if cls._model_loader is None:
             cls._model_loader = ModelLoader()
         if cls._cache_manager is None:
-            cls._cache_manager = CacheManager()
-        if cls._registry is None:
-            cls._registry = RegistryManager()
+            cls._cache_manager = get_cache_manager()
+        # 共享注册表实例；配置文件修改后自动重新加载
+        cls._registry = get_registry_manager()
         return cls._model_loader, cls._cache_manager, cls._registry
     
     @classmethod
     def INPUT_TYPES(cls):
         loader, cache, registry = cls._get_instances()
         
-        # 获取本地模型
-        all_local_models = loader.list_models()
-        
-        # 过滤本地模型：只显示文本生成类型的模型
-        local_models = []
-        
-        # 视觉模型关键词列表（用于排除）- 使用更精确的匹配
-        vision_keywords = [
-            'llava', 'vision', 'multimodal', 'mm', 
-            'clip', 'minicpm-v', 'phi-3-vision', 
-            'internvl', 'cogvlm', 'mmproj'
-        ]
-        
-        # 特定的视觉模型模式（更精确的匹配）
-        vision_patterns = [
-            'qwen-vl', 'qwen2-vl', 'qwen2.5-vl', 'qwen3-vl',  # Qwen VL系列
-            '-vl-', '_vl_', '.vl.',  # 通用VL模式
-        ]
-        
-        for model_file in all_local_models:
-            model_lower = model_file.lower()
-            
-            # 首先检查registry信息（最准确）
-            model_info = registry.find_model_by_filename(model_file)
-            if model_info:
-                business_type = model_info.get('business_type')
-                if business_type == 'text_generation':
-                    local_models.append(model_file)
-                    continue
-                elif business_type in ['image_analysis', 'video_analysis']:
-                    continue  # 跳过视觉模型
-            
-            # 如果registry中没有信息，使用关键词过滤
-            # 检查是否匹配视觉模型模式
-            is_vision_model = False
-            for pattern in vision_patterns:
-                if pattern in model_lower:
-                    is_vision_model = True
-                    break
-            
-            if not is_vision_model:
-                # 检查通用视觉关键词
-                is_vision_model = any(keyword in model_lower for keyword in vision_keywords)
-            
-            if not is_vision_model:
-                # 不是视觉模型，添加到列表
-                local_models.append(model_file)
-        
-        # 获取可下载的文本模型（传递 loader 以检查下载状态）
-        downloadable = registry.get_downloadable_models(business_type='text_generation', model_loader=loader)
-        downloadable_names = [name for name, _ in downloadable]
-        
-        # 合并列表
-        all_models = local_models + downloadable_names
+        # 本地文本模型 + 可下载的文本模型（目录未变化时直接命中缓存）
+        all_models = get_text_model_catalog(loader, registry)
         
         if not all_models:
             all_models = ["No models found"]
@@ -195,13 +151,20 @@ class TextModelLoader:
         if not model_path:
             raise FileNotFoundError(f"Model not found: {model}")
         
-        # 应用预设配置
-        preset = TextModelPresets.get_preset(model)
+        # 应用预设配置（结合 GGUF 元数据）
+        metadata = get_gguf_metadata(model_path)
+        preset = TextModelPresets.get_preset(model, metadata)
         if preset:
             print(f"📋 Applying preset for {model}")
             if n_ctx == 8192:  # 如果是默认值，使用预设
                 n_ctx = preset.get('n_ctx', n_ctx)
         
+        # 上下文长度不能超过模型训练长度（来自 GGUF 元数据）
+        fitted_ctx = fit_context_to_metadata(n_ctx, metadata)
+        if fitted_ctx != n_ctx:
+            print(f"📏 n_ctx {n_ctx} exceeds model context length, using {fitted_ctx}")
+            n_ctx = fitted_ctx
+        
         # 创建配置
         config = TextModelConfig(
             model_name=model,
@@ -218,7 +181,11 @@ class TextModelLoader:
         
         print(f"✅ Text model loaded: {model}")
         
-        return (config.to_dict(),)
+        # 后台开始加载，与其他上游节点并行；生成节点会等待加载完成
+        config_dict = config.to_dict()
+        get_inference_engine().preload_model(model_path, verbose=config.verbose, **load_kwargs_from_config(config_dict))
+        
+        return (config_dict,)
 
 
 class TextGenerationNode:
@@ -231,7 +198,7 @@ class TextGenerationNode:
     def _get_engine(cls):
         """获取推理引擎"""
         if cls._inference_engine is None:
-            cls._inference_engine = InferenceEngine()
+            cls._inference_engine = get_inference_engine()
         return cls._inference_engine
     
     @classmethod
@@ -286,6 +253,9 @@ class TextGenerationNode:
                     "tooltip": "输入提示词"
                 }),
             },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
         }
     
     RETURN_TYPES = ("STRING", "STRING")
@@ -351,7 +321,7 @@ class TextGenerationNode:
         
         return final_output, ""
     
-    def generate(self, model, prompt, max_tokens=512, temperature=0.7, top_p=0.9, top_k=40, repetition_penalty=1.1, enable_thinking=False):
+    def generate(self, model, prompt, max_tokens=512, temperature=0.7, top_p=0.9, top_k=40, repetition_penalty=1.1, enable_thinking=False, unique_id=None):
         """生成文本"""
         print("\n" + "="*80)
         print(" ComfyUI Text Generation - 开始生成")
@@ -375,14 +345,14 @@ class TextGenerationNode:
         print(f"  - repetition_penalty: {repetition_penalty}")
         print(f"  - enable_thinking: {enable_thinking}")
         
-        # 加载模型（如果未加载）
-        if not engine.is_model_loaded(model_path):
+        # 加载模型（未加载或加载参数不兼容时）
+        load_kwargs = load_kwargs_from_config(model)
+        if not engine.is_model_loaded(model_path, **load_kwargs):
             print(f"\n 加载模型中...")
             success = engine.load_model(
                 model_path=model_path,
-                n_ctx=model.get('n_ctx', 8192),
-                n_gpu_layers=model.get('n_gpu_layers', -1),
-                verbose=model.get('verbose', False)
+                verbose=model.get('verbose', False),
+                **load_kwargs
             )
             if not success:
                 raise RuntimeError(f"Failed to load model: {model_path}")
@@ -426,6 +396,9 @@ class TextGenerationNode:
         
         full_prompt = "\n\n".join(full_prompt_parts)
         
+        # 系统提示词部分在多次运行间不变，其 KV 缓存可以复用
+        prompt_prefix = f"{full_prompt_parts[0]}\n\nUser: " if len(full_prompt_parts) > 2 else None
+        
         print(f"\n💬 用户输入:")
         print(f"  - 长度: {len(prompt)} 字符")
         print(f"  - 预览: {prompt[:100].replace(chr(10), ' ')}...")
@@ -447,6 +420,8 @@ class TextGenerationNode:
             print(f"  - Stop 序列: {stop_sequences}")
             print(f"  - 建议: 如果输出过长，请降低 max_tokens 到 256-300")
             
+            # 流式生成：部分文本推送到进度条和前端
+            progress = StreamProgress(max_tokens, node_id=unique_id)
             raw_output = engine.generate_text(
                 model_path=model_path,
                 prompt=full_prompt,
@@ -455,8 +430,12 @@ class TextGenerationNode:
                 top_p=top_p,
                 top_k=top_k,
                 repeat_penalty=repetition_penalty,
-                stop=stop_sequences
+                stop=stop_sequences,
+                prefix=prompt_prefix,
+                on_token=progress,
+                metrics=progress.metrics
             )
+            progress.finish()
             
             print(f"\n📤 原始输出:")
             print(f"  - 长度: {len(raw_output)} 字符")
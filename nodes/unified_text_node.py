@@ -15,24 +15,69 @@ module_path = Path(__file__).parent.parent
 if str(module_path) not in sys.path:
     sys.path.insert(0, str(module_path))
 
-from core.model_loader import ModelLoader
-from core.inference_engine import InferenceEngine
-from core.inference.unified_api_engine import get_unified_api_engine
+# 优先使用相对导入，保证与其他节点共享同一份模块（以及其中的全局实例）
+try:
+    from ..core.model_loader import ModelLoader
+    from ..core.inference_engine import get_inference_engine
+    from ..core.streaming import StreamProgress, ThinkingBudget
+    from ..core.load_spec import (
+        GGML_TYPES, KV_TYPE_DEFAULT_CHOICE, LOAD_PROFILES, LoadSpec,
+        get_load_profile, kv_load_options, load_kwargs_from_config,
+    )
+    from ..core.model_pool import format_kv_options
+    from ..core.token_counter import auto_context_config, get_token_counter, resolve_auto_context
+    from ..core.autotune import apply_tuned_params
+    from ..core.model_catalog import get_local_text_models
+    from ..utils.registry import get_registry_manager
+    from ..utils.gguf_reader import get_gguf_metadata
+    from ..models.text_models import fit_context_to_metadata
+    from ..core.inference.unified_api_engine import get_unified_api_engine
+    from ..config.node_definitions import THINKING_BUDGET_INPUT
+except ImportError:
+    from core.model_loader import ModelLoader
+    from core.inference_engine import get_inference_engine
+    from core.streaming import StreamProgress, ThinkingBudget
+    from core.load_spec import (
+        GGML_TYPES, KV_TYPE_DEFAULT_CHOICE, LOAD_PROFILES, LoadSpec,
+        get_load_profile, kv_load_options, load_kwargs_from_config,
+    )
+    from core.model_pool import format_kv_options
+    from core.token_counter import auto_context_config, get_token_counter, resolve_auto_context
+    from core.autotune import apply_tuned_params
+    from core.model_catalog import get_local_text_models
+    from utils.registry import get_registry_manager
+    from utils.gguf_reader import get_gguf_metadata
+    from models.text_models import fit_context_to_metadata
+    from core.inference.unified_api_engine import get_unified_api_engine
+    from config.node_definitions import THINKING_BUDGET_INPUT
 import requests
 
 
+# 本地生成的 stop 序列
+LOCAL_STOP_SEQUENCES = ["User:", "System:", "\n\n\n", "\n\n##", "\n\nNote:", "\n\nThis "]
+
+
 class LocalTextModelLoader:
     """本地 GGUF 文本模型加载器"""
     
+    # 全局实例
+    _model_loader = None
+    _registry = None
+    
+    @classmethod
+    def _get_instances(cls):
+        """获取全局实例"""
+        if cls._model_loader is None:
+            cls._model_loader = ModelLoader()
+        # 共享注册表实例；配置文件修改后自动重新加载
+        cls._registry = get_registry_manager()
+        return cls._model_loader, cls._registry
+    
     @classmethod
     def INPUT_TYPES(cls):
-        # 获取本地 GGUF 模型
-        loader = ModelLoader()
-        local_models = loader.list_models()
-        
-        # 过滤文本模型
-        vision_keywords = ['llava', 'vision', 'vl', 'multimodal', 'mm', 'clip', 'qwen-vl', 'qwen2-vl']
-        text_models = [m for m in local_models if not any(kw in m.lower() for kw in vision_keywords)]
+        # 获取本地 GGUF 文本模型（目录未变化时直接命中缓存）
+        loader, registry = cls._get_instances()
+        text_models = get_local_text_models(loader, registry)
         
         return {
             "required": {
@@ -58,6 +103,26 @@ class LocalTextModelLoader:
                     "multiline": True,
                     "tooltip": "系统提示词（可选）"
                 }),
+                "n_ctx_mode": (["fixed", "auto"], {
+                    "default": "fixed",
+                    "tooltip": "fixed=使用 n_ctx；auto=按 prompt、图像和 max_tokens 的 token 数选择最小的上下文档位（n_ctx 作为上限）"
+                }),
+                "load_profile": (list(LOAD_PROFILES), {
+                    "default": get_load_profile().name,
+                    "tooltip": "加载档位：lean=最小内存（小批次、q8_0 K 缓存）；balanced=默认；logprobs=保留全部 logits（仅在需要逐 token logprobs 时使用）"
+                }),
+                "type_k": ([KV_TYPE_DEFAULT_CHOICE] + list(GGML_TYPES), {
+                    "default": KV_TYPE_DEFAULT_CHOICE,
+                    "tooltip": "K 缓存类型（default=按加载档位/调优结果；q8_0 约为 f16 的一半内存，精度损失很小）"
+                }),
+                "type_v": ([KV_TYPE_DEFAULT_CHOICE] + list(GGML_TYPES), {
+                    "default": KV_TYPE_DEFAULT_CHOICE,
+                    "tooltip": "V 缓存类型（量化类型会自动开启 flash attention）"
+                }),
+                "flash_attn": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "启用 flash attention（减小计算缓冲区，长上下文时更快；需要 llama.cpp 后端支持）"
+                }),
             }
         }
     
@@ -66,7 +131,9 @@ class LocalTextModelLoader:
     FUNCTION = "load_model"
     CATEGORY = "🤖 GGUF-VLM/💬 Text Models"
     
-    def load_model(self, model, n_ctx=8192, device="Auto", system_prompt=""):
+    def load_model(self, model, n_ctx=8192, device="Auto", system_prompt="", load_profile=None,
+                   type_k=KV_TYPE_DEFAULT_CHOICE, type_v=KV_TYPE_DEFAULT_CHOICE, flash_attn=False,
+                   n_ctx_mode="fixed"):
         """加载本地 GGUF 模型"""
         print(f"\n{'='*80}")
         print(f" 🖥️  Local Text Model Loader")
@@ -78,14 +145,20 @@ class LocalTextModelLoader:
             return ({"error": error_msg},)
         
         # 获取模型路径
-        loader = ModelLoader()
+        loader, registry = self._get_instances()
         model_path = loader.find_model(model)
         
-        if not os.path.exists(model_path):
+        if not model_path or not os.path.exists(model_path):
             error_msg = f"❌ Model file not found: {model_path}"
             print(error_msg)
             return ({"error": error_msg},)
         
+        # 上下文长度不能超过模型训练长度（来自 GGUF 元数据）
+        fitted_ctx = fit_context_to_metadata(n_ctx, get_gguf_metadata(model_path))
+        if fitted_ctx != n_ctx:
+            print(f"📏 n_ctx {n_ctx} exceeds model context length, using {fitted_ctx}")
+            n_ctx = fitted_ctx
+        
         # 根据设备选项设置 n_gpu_layers
         if device == "Auto":
             try:
@@ -107,16 +180,34 @@ class LocalTextModelLoader:
             "model_name": model,
             "n_ctx": n_ctx,
             "n_gpu_layers": n_gpu_layers,
-            "system_prompt": system_prompt
+            "system_prompt": system_prompt,
+            # 批大小、KV 类型、logits_all 等由加载档位决定
+            "profile": get_load_profile(load_profile).name,
         }
+        # 本机对该模型的自动调优结果（批大小、线程数等），节点上显式选择的 KV 选项优先
+        config = {**apply_tuned_params(config, model_path, device), **kv_load_options(type_k, type_v, flash_attn)}
+        
+        # 报告各 KV 缓存类型在当前上下文长度（自动模式为上限）下的占用
+        kv_spec = LoadSpec.from_kwargs(model_path, **load_kwargs_from_config(config))
+        kv_report = format_kv_options(model_path, n_ctx, (kv_spec.type_k, kv_spec.type_v))
+        if kv_report:
+            print(kv_report)
+        
+        # 自动上下文：生成节点按实际 token 数确定 n_ctx，先按初始档位预加载
+        if n_ctx_mode == "auto":
+            config.update(auto_context_config(n_ctx))
         
         print(f"✅ Local model configured")
         print(f"   Model: {model}")
         print(f"   Path: {model_path}")
-        print(f"   Context: {n_ctx}")
+        print(f"   Context: {f'auto (up to {n_ctx})' if n_ctx_mode == 'auto' else n_ctx}")
         print(f"   Device: {device}")
+        print(f"   Load profile: {config['profile']}")
         print(f"{'='*80}\n")
         
+        # 后台开始加载，与其他上游节点并行；生成节点会等待加载完成
+        get_inference_engine().preload_model(model_path, **load_kwargs_from_config(config))
+        
         return (config,)
 
 
@@ -274,7 +365,7 @@ class TextGeneration:
     def _get_engine(cls):
         """获取推理引擎"""
         if cls._inference_engine is None:
-            cls._inference_engine = InferenceEngine()
+            cls._inference_engine = get_inference_engine()
         return cls._inference_engine
     
     @classmethod
@@ -329,6 +420,10 @@ class TextGeneration:
                     "tooltip": "输入提示词"
                 }),
             },
+            "optional": dict(THINKING_BUDGET_INPUT),
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
         }
     
     RETURN_TYPES = ("STRING", "STRING")
@@ -390,7 +485,7 @@ class TextGeneration:
         
         return final_output, "" if not enable_thinking else thinking
     
-    def generate(self, model_config, prompt, max_tokens=256, temperature=0.7, top_p=0.9, top_k=40, repetition_penalty=1.1, enable_thinking=False):
+    def generate(self, model_config, prompt, max_tokens=256, temperature=0.7, top_p=0.9, top_k=40, repetition_penalty=1.1, enable_thinking=False, thinking_budget=-1, unique_id=None):
         """生成文本"""
         print("\n" + "="*80)
         print(" Unified Text Generation")
@@ -403,6 +498,18 @@ class TextGeneration:
             return (error_msg, "")
         
         mode = model_config.get("mode", "local")
+        system_prompt = self._resolve_system_prompt(model_config, enable_thinking)
+        
+        if mode == "local":
+            # 本地 GGUF 模式
+            return self._generate_local(model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking, unique_id, thinking_budget)
+        else:
+            # 远程 API 模式
+            return self._generate_remote(model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking, thinking_budget)
+    
+    @staticmethod
+    def _resolve_system_prompt(model_config, enable_thinking):
+        """获取系统提示词（禁用思考时追加 no_think）"""
         system_prompt = model_config.get("system_prompt", "")
         
         # 处理思考控制
@@ -414,38 +521,38 @@ class TextGeneration:
             system_prompt = "no_think"
             print(f"  🚫 Thinking disabled")
         
-        if mode == "local":
-            # 本地 GGUF 模式
-            return self._generate_local(model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking)
-        else:
-            # 远程 API 模式
-            return self._generate_remote(model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking)
+        return system_prompt
     
-    def _generate_local(self, model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking):
-        """本地 GGUF 生成"""
-        engine = self._get_engine()
-        model_path = model_config["model_path"]
-        
-        print(f"🖥️  Local GGUF Generation")
-        print(f"   Model: {model_config['model_name']}")
-        print(f"   Path: {model_path}")
+    @staticmethod
+    def _ensure_local_model(engine, model_config):
+        """
+        加载本地模型（未加载或加载参数不兼容时）
         
-        # 加载模型（如果未加载）
-        if not engine.is_model_loaded(model_path):
+        Returns:
+            是否可用
+        """
+        model_path = model_config["model_path"]
+        load_kwargs = load_kwargs_from_config(model_config)
+        if not engine.is_model_loaded(model_path, **load_kwargs):
             print(f"\n⏳ Loading model...")
             success = engine.load_model(
                 model_path=model_path,
-                n_ctx=model_config.get('n_ctx', 8192),
-                n_gpu_layers=model_config.get('n_gpu_layers', -1),
-                verbose=False
+                verbose=False,
+                **load_kwargs
             )
             if not success:
-                error_msg = "❌ Failed to load model"
-                print(error_msg)
-                return (error_msg, "")
+                return False
             print(f"✅ Model loaded")
+        return True
+    
+    @staticmethod
+    def _build_local_prompt(prompt, system_prompt):
+        """
+        构建本地模型的完整 prompt
         
-        # 构建完整的 prompt
+        Returns:
+            (完整 prompt, 跨运行不变的前缀或 None)
+        """
         full_prompt_parts = []
         
         if system_prompt:
@@ -456,14 +563,58 @@ class TextGeneration:
         
         full_prompt = "\n\n".join(full_prompt_parts)
         
+        # 系统提示词部分在多次运行间不变，其 KV 缓存可以复用
+        prompt_prefix = f"{full_prompt_parts[0]}\n\nUser: " if len(full_prompt_parts) > 2 else None
+        
+        return full_prompt, prompt_prefix
+    
+    def _postprocess_local(self, raw_output, enable_thinking):
+        """
+        本地生成结果的后处理（提取思考内容、合并段落）
+        
+        Returns:
+            (最终输出, 思考内容)
+        """
+        # 提取思考内容
+        final_output, thinking = self._extract_thinking(raw_output, enable_thinking)
+        
+        # 后处理：合并多段落
+        paragraphs = [p.strip() for p in final_output.split('\n\n') if p.strip()]
+        if len(paragraphs) > 1:
+            final_output = ' '.join(paragraphs)
+            print(f"   📝 Merged {len(paragraphs)} paragraphs into one")
+        
+        return final_output.strip(), thinking
+    
+    def _generate_local(self, model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking, unique_id=None, thinking_budget=-1):
+        """本地 GGUF 生成"""
+        engine = self._get_engine()
+        model_path = model_config["model_path"]
+        
+        print(f"🖥️  Local GGUF Generation")
+        print(f"   Model: {model_config['model_name']}")
+        print(f"   Path: {model_path}")
+        
+        # 自动上下文模式：按本次 prompt 和 max_tokens 选择 n_ctx
+        model_config = resolve_auto_context(model_config, [system_prompt, prompt], max_tokens)
+        
+        if not self._ensure_local_model(engine, model_config):
+            error_msg = "❌ Failed to load model"
+            print(error_msg)
+            return (error_msg, "")
+        
+        full_prompt, prompt_prefix = self._build_local_prompt(prompt, system_prompt)
+        
         print(f"\n💬 Generating...")
         print(f"   Max tokens: {max_tokens}")
         print(f"   Temperature: {temperature}")
         
-        # 设置 stop 序列
-        stop_sequences = ["User:", "System:", "\n\n\n", "\n\n##", "\n\nNote:", "\n\nThis "]
+        if thinking_budget >= 0:
+            print(f"   Thinking budget: {thinking_budget} tokens")
         
         try:
+            # 流式生成：部分文本推送到进度条和前端
+            progress = StreamProgress(max_tokens, node_id=unique_id)
             raw_output = engine.generate_text(
                 model_path=model_path,
                 prompt=full_prompt,
@@ -472,19 +623,15 @@ class TextGeneration:
                 top_p=top_p,
                 top_k=top_k,
                 repeat_penalty=repetition_penalty,
-                stop=stop_sequences
+                stop=LOCAL_STOP_SEQUENCES,
+                prefix=prompt_prefix,
+                on_token=progress,
+                metrics=progress.metrics,
+                thinking_budget=thinking_budget
             )
+            progress.finish()
             
-            # 提取思考内容
-            final_output, thinking = self._extract_thinking(raw_output, enable_thinking)
-            
-            # 后处理：合并多段落
-            paragraphs = [p.strip() for p in final_output.split('\n\n') if p.strip()]
-            if len(paragraphs) > 1:
-                final_output = ' '.join(paragraphs)
-                print(f"   📝 Merged {len(paragraphs)} paragraphs into one")
-            
-            final_output = final_output.strip()
+            final_output, thinking = self._postprocess_local(raw_output, enable_thinking)
             
             if enable_thinking and thinking:
                 print(f"   💭 Thinking extracted ({len(thinking)} chars)")
@@ -501,7 +648,7 @@ class TextGeneration:
             traceback.print_exc()
             return (error_msg, "")
     
-    def _generate_remote(self, model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking):
+    def _generate_remote(self, model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking, thinking_budget=-1):
         """远程 API 生成"""
         base_url = model_config["base_url"]
         api_type = model_config["api_type"]
@@ -539,18 +686,35 @@ class TextGeneration:
         print(f"   Messages: {len(messages)}")
         
         try:
-            response = engine.chat_completion(
-                model=model_name,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens,
-                top_p=top_p,
-                top_k=top_k,
-                repetition_penalty=repetition_penalty
-            )
-            
-            # 提取生成的文本
-            raw_output = response['choices'][0]['message']['content']
+            if thinking_budget >= 0:
+                # OpenAI 兼容接口无法预填充助手回复，超出思考预算时只能停止流式请求
+                print(f"   Thinking budget: {thinking_budget} tokens")
+                budget = ThinkingBudget(thinking_budget)
+                raw_output = engine.stream_chat_completion(
+                    model=model_name,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    top_p=top_p,
+                    top_k=top_k,
+                    repetition_penalty=repetition_penalty,
+                    should_stop=budget.feed
+                )
+                if budget.exceeded:
+                    print(f"   ✂️  Thinking budget reached ({thinking_budget} tokens), request stopped; the answer may be empty")
+            else:
+                response = engine.chat_completion(
+                    model=model_name,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    top_p=top_p,
+                    top_k=top_k,
+                    repetition_penalty=repetition_penalty
+                )
+                
+                # 提取生成的文本
+                raw_output = response['choices'][0]['message']['content']
             
             # 提取思考内容
             final_output, thinking = self._extract_thinking(raw_output, enable_thinking)
@@ -579,15 +743,160 @@ class TextGeneration:
             return (error_msg, "")
 
 
+class BatchTextGeneration(TextGeneration):
+    """批量文本生成节点 - 一次处理多个 prompt（本地模型在同一上下文中并行解码）"""
+    
+    @classmethod
+    def INPUT_TYPES(cls):
+        required = dict(super().INPUT_TYPES()["required"])
+        required.pop("prompt")
+        required["parallel_slots"] = ("INT", {
+            "default": 4,
+            "min": 1,
+            "max": 64,
+            "step": 1,
+            "tooltip": "并行序列数（同一上下文中同时解码的 prompt 数，1 为逐个生成）"
+        })
+        required["seed"] = ("INT", {
+            "default": -1,
+            "min": -1,
+            "max": 0x7fffffff,
+            "tooltip": "随机种子（-1 为随机；固定时第 i 个 prompt 使用 seed + i）"
+        })
+        required["prompts"] = (IO.STRING, {
+            "default": "",
+            "multiline": True,
+            "tooltip": "提示词列表：连接字符串列表，或每行一个提示词"
+        })
+        # 设置思考预算时本地模型改为逐个生成（并行解码不支持中途闭合思考块）
+        return {"required": required, "optional": dict(THINKING_BUDGET_INPUT)}
+    
+    INPUT_IS_LIST = True
+    RETURN_TYPES = ("STRING", "STRING")
+    RETURN_NAMES = ("context", "thinking")
+    OUTPUT_IS_LIST = (True, True)
+    FUNCTION = "generate_batch"
+    CATEGORY = "🤖 GGUF-VLM/💬 Text Models"
+    OUTPUT_NODE = True
+    
+    @staticmethod
+    def _split_prompts(prompts):
+        """展开提示词列表（只有一个字符串时按行拆分）"""
+        if len(prompts) == 1:
+            prompts = prompts[0].splitlines()
+        return [p.strip() for p in prompts if p and p.strip()]
+    
+    def generate_batch(self, model_config, prompts, max_tokens, temperature, top_p, top_k, repetition_penalty,
+                       enable_thinking, parallel_slots, seed, thinking_budget=(-1,)):
+        """批量生成文本"""
+        # INPUT_IS_LIST：除 prompts 外的输入都只取第一个值
+        (model_config, max_tokens, temperature, top_p, top_k, repetition_penalty, enable_thinking, parallel_slots,
+         seed, thinking_budget) = (
+            value[0] for value in (model_config, max_tokens, temperature, top_p, top_k, repetition_penalty,
+                                   enable_thinking, parallel_slots, seed, thinking_budget)
+        )
+        prompt_list = self._split_prompts(prompts)
+        
+        print("\n" + "="*80)
+        print(f" Batch Text Generation ({len(prompt_list)} prompts)")
+        print("="*80)
+        
+        if "error" in model_config:
+            error_msg = model_config["error"]
+            print(f"❌ {error_msg}")
+            return ([error_msg], [""])
+        
+        if not prompt_list:
+            error_msg = "❌ No prompts provided"
+            print(error_msg)
+            return ([error_msg], [""])
+        
+        system_prompt = self._resolve_system_prompt(model_config, enable_thinking)
+        
+        if model_config.get("mode", "local") != "local":
+            # 远程 API 逐个请求
+            outputs = [
+                self._generate_remote(model_config, prompt, system_prompt, max_tokens, temperature, top_p, top_k,
+                                      repetition_penalty, enable_thinking, thinking_budget)
+                for prompt in prompt_list
+            ]
+            return ([text for text, _ in outputs], [thinking for _, thinking in outputs])
+        
+        engine = self._get_engine()
+        model_path = model_config["model_path"]
+        
+        # 自动上下文模式：按最长的 prompt 选择 n_ctx（逐个生成时复用模型自身的上下文）
+        if model_config.get("n_ctx_auto"):
+            counter = get_token_counter()
+            longest = max(prompt_list, key=lambda text: counter.count(model_path, text))
+            model_config = resolve_auto_context(model_config, [system_prompt, longest], max_tokens)
+        
+        if not self._ensure_local_model(engine, model_config):
+            error_msg = "❌ Failed to load model"
+            print(error_msg)
+            return ([error_msg], [""])
+        
+        full_prompts = [self._build_local_prompt(prompt, system_prompt)[0] for prompt in prompt_list]
+        
+        print(f"\n💬 Generating...")
+        print(f"   Max tokens: {max_tokens}")
+        print(f"   Temperature: {temperature}")
+        print(f"   Parallel slots: {parallel_slots}")
+        if thinking_budget >= 0:
+            print(f"   Thinking budget: {thinking_budget} tokens")
+        
+        try:
+            import comfy.utils
+            pbar = comfy.utils.ProgressBar(len(full_prompts))
+        except Exception:
+            pbar = None
+        completed = []
+        
+        def on_result(index, text):
+            completed.append(index)
+            if pbar is not None:
+                pbar.update_absolute(len(completed), len(full_prompts))
+            print(f"   ✅ [{len(completed)}/{len(full_prompts)}] prompt #{index + 1}: {len(text)} characters")
+        
+        try:
+            raw_outputs = engine.generate_batch(
+                model_path,
+                full_prompts,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                n_parallel=parallel_slots,
+                on_result=on_result,
+                top_k=top_k,
+                repeat_penalty=repetition_penalty,
+                stop=LOCAL_STOP_SEQUENCES,
+                seed=seed if seed >= 0 else None,
+                thinking_budget=thinking_budget
+            )
+        except Exception as e:
+            error_msg = f"❌ Batch generation failed: {str(e)}"
+            print(error_msg)
+            import traceback
+            traceback.print_exc()
+            return ([error_msg], [""])
+        
+        outputs = [self._postprocess_local(raw_output, enable_thinking) for raw_output in raw_outputs]
+        print("="*80 + "\n")
+        
+        return ([text for text, _ in outputs], [thinking for _, thinking in outputs])
+
+
 # 节点映射
 NODE_CLASS_MAPPINGS = {
     "LocalTextModelLoader": LocalTextModelLoader,
     "RemoteTextModelSelector": RemoteTextModelSelector,
     "TextGeneration": TextGeneration,
+    "BatchTextGeneration": BatchTextGeneration,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "LocalTextModelLoader": "🖥️ Local Text Model Loader (GGUF)",
     "RemoteTextModelSelector": "🌐 Remote Text Model Selector",
     "TextGeneration": "🤖 Text Generation",
+    "BatchTextGeneration": "📚 Batch Text Generation",
 }
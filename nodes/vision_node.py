@@ -19,11 +19,22 @@ if str(module_path) not in sys.path:
 
 # 使用相对导入
 from ..core.model_loader import ModelLoader
-from ..core.inference_engine import InferenceEngine
-from ..core.cache_manager import CacheManager
-from ..utils.registry import RegistryManager
+from ..core.inference_engine import get_inference_engine
+from ..core.streaming import StreamProgress
+from ..core.cache_manager import get_cache_manager
+from ..core.model_catalog import get_vision_model_catalog
+from ..core.load_spec import (
+    GGML_TYPES, KV_TYPE_DEFAULT_CHOICE, LOAD_PROFILES, LoadSpec,
+    get_load_profile, kv_load_options, load_kwargs_from_config,
+)
+from ..core.model_pool import format_kv_options
+from ..core.token_counter import auto_context_config, resolve_auto_context
+from ..core.autotune import apply_tuned_params
+from ..utils.registry import get_registry_manager
 from ..utils.downloader import FileDownloader
 from ..models.vision_models import VisionModelConfig, VisionModelPresets
+from ..models.text_models import fit_context_to_metadata
+from ..utils.gguf_reader import get_gguf_metadata
 from ..utils.device_optimizer import DeviceOptimizer
 
 # 可选导入
@@ -53,9 +64,9 @@ class VisionModelLoader:
         if cls._model_loader is None:
             cls._model_loader = ModelLoader()
         if cls._cache_manager is None:
-            cls._cache_manager = CacheManager()
-        if cls._registry is None:
-            cls._registry = RegistryManager()
+            cls._cache_manager = get_cache_manager()
+        # 共享注册表实例；配置文件修改后自动重新加载
+        cls._registry = get_registry_manager()
         if cls._device_optimizer is None:
             cls._device_optimizer = DeviceOptimizer()
         return cls._model_loader, cls._cache_manager, cls._registry, cls._device_optimizer
@@ -64,39 +75,8 @@ class VisionModelLoader:
     def INPUT_TYPES(cls):
         loader, cache, registry, optimizer = cls._get_instances()
         
-        # 获取本地模型
-        all_local_models = loader.list_models()
-        
-        # 过滤本地模型：只显示视觉语言类型的模型
-        local_models = []
-        for model_file in all_local_models:
-            model_info = registry.find_model_by_filename(model_file)
-            # 如果找到模型信息且是图像/视频分析类型，或者找不到信息（未知模型，保留）
-            if model_info is None or model_info.get('business_type') in ['image_analysis', 'video_analysis']:
-                local_models.append(model_file)
-        
-        # 获取不同类型的可下载模型（传递 loader 以检查下载状态）
-        image_models = registry.get_downloadable_models(business_type='image_analysis', model_loader=loader)
-        video_models = registry.get_downloadable_models(business_type='video_analysis', model_loader=loader)
-        
-        # 添加类型标签
-        categorized_models = []
-        
-        # 添加分组标题
-        if image_models:
-            categorized_models.append("--- 🖼️ 图像分析模型 ---")
-            categorized_models.extend([name for name, _ in image_models])
-        
-        if video_models:
-            categorized_models.append("--- 🎥 视频分析模型 ---")
-            categorized_models.extend([name for name, _ in video_models])
-        
-        if local_models:
-            categorized_models.append("--- 💾 本地模型 ---")
-            categorized_models.extend(local_models)
-        
-        if not categorized_models:
-            categorized_models = ["No models found"]
+        # 预热模型列表缓存（目录未变化时直接命中，实际列表由前端 🔄 Refresh Models 获取）
+        get_vision_model_catalog(loader, registry)
         
         return {
             "required": {
@@ -121,6 +101,26 @@ class VisionModelLoader:
                     "default": "",
                     "tooltip": "手动指定 mmproj 文件（可选）"
                 }),
+                "load_profile": (list(LOAD_PROFILES), {
+                    "default": get_load_profile().name,
+                    "tooltip": "加载档位：lean=最小内存（小批次、q8_0 K 缓存）；balanced=默认；logprobs=保留全部 logits（仅在需要逐 token logprobs 时使用）"
+                }),
+                "type_k": ([KV_TYPE_DEFAULT_CHOICE] + list(GGML_TYPES), {
+                    "default": KV_TYPE_DEFAULT_CHOICE,
+                    "tooltip": "K 缓存类型（default=按加载档位/调优结果；q8_0 约为 f16 的一半内存，精度损失很小）"
+                }),
+                "type_v": ([KV_TYPE_DEFAULT_CHOICE] + list(GGML_TYPES), {
+                    "default": KV_TYPE_DEFAULT_CHOICE,
+                    "tooltip": "V 缓存类型（量化类型会自动开启 flash attention）"
+                }),
+                "flash_attn": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "启用 flash attention（减小计算缓冲区，长上下文时更快；需要 llama.cpp 后端支持）"
+                }),
+                "n_ctx_mode": (["fixed", "auto"], {
+                    "default": "fixed",
+                    "tooltip": "fixed=使用 n_ctx；auto=按 prompt、图像和 max_tokens 的 token 数选择最小的上下文档位（n_ctx 作为上限）"
+                }),
             }
         }
     
@@ -129,9 +129,13 @@ class VisionModelLoader:
     FUNCTION = "load_model"
     CATEGORY = "🤖 GGUF-VLM/🖼️ Vision Models"
     
-    def load_model(self, model, n_ctx=8192, device="Auto", mmproj_file=""):
+    def load_model(self, model, n_ctx=8192, device="Auto", mmproj_file="", load_profile=None,
+                   type_k=KV_TYPE_DEFAULT_CHOICE, type_v=KV_TYPE_DEFAULT_CHOICE, flash_attn=False,
+                   n_ctx_mode="fixed"):
         """加载视觉语言模型"""
         loader, cache, registry, optimizer = self._get_instances()
+        profile = get_load_profile(load_profile)
+        kv_options = kv_load_options(type_k, type_v, flash_attn)
         
         # 检查 llama-cpp-python 安装状态
         llama_status = optimizer.check_llama_cpp_installation()
@@ -150,25 +154,6 @@ class VisionModelLoader:
         device_summary = optimizer.get_device_summary()
         print(f"\n{device_summary}\n")
         
-        # 根据设备选项设置参数
-        if device == "Auto":
-            # 使用智能优化
-            optimized_params = optimizer.get_optimized_params(model_size_gb=7.0)
-            n_gpu_layers = optimized_params['n_gpu_layers']
-            n_batch = optimized_params.get('n_batch', 512)
-            
-            print(f"🎯 Auto-optimized: {optimized_params['device_info']}")
-            print(f"   GPU layers: {n_gpu_layers}")
-            print(f"   Batch size: {n_batch}")
-        elif device == "GPU":
-            n_gpu_layers = -1
-            n_batch = 512
-            print(f"🎮 Using GPU (all layers)")
-        else:  # CPU
-            n_gpu_layers = 0
-            n_batch = 128
-            print(f"💻 Using CPU only")
-        
         # 检查是否是分组标题
         if model.startswith("---"):
             raise ValueError("请选择一个具体的模型，而不是分组标题")
@@ -274,12 +259,14 @@ class VisionModelLoader:
             from ..utils.mmproj_finder import MMProjFinder
             from ..utils.mmproj_validator import MMProjValidator
             
-            finder = MMProjFinder([os.path.dirname(model_path)])
             validator = MMProjValidator()
             
             # 获取建议
             suggestions = validator.suggest_mmproj_for_model(model)
-            available = finder.list_all_mmproj_files(os.path.dirname(model_path))
+            if loader.mmproj_index:
+                available = loader.mmproj_index.list_in_dir(os.path.dirname(model_path))
+            else:
+                available = MMProjFinder([]).list_all_mmproj_files(os.path.dirname(model_path))
             
             error_msg = f"❌ Could not find mmproj file for {model}.\n\n"
             
@@ -325,20 +312,68 @@ class VisionModelLoader:
             
             raise FileNotFoundError(error_msg)
         
-        # 应用预设配置
-        preset = VisionModelPresets.get_preset(model)
+        # 应用预设配置（结合 GGUF 元数据）
+        metadata = get_gguf_metadata(model_path)
+        preset = VisionModelPresets.get_preset(model, metadata)
         if preset:
             print(f"📋 Applying preset for {model}")
             if n_ctx == 8192:  # 如果是默认值，使用预设
                 n_ctx = preset.get('n_ctx', n_ctx)
         
+        # 上下文长度不能超过模型训练长度（来自 GGUF 元数据）
+        fitted_ctx = fit_context_to_metadata(n_ctx, metadata)
+        if fitted_ctx != n_ctx:
+            print(f"📏 n_ctx {n_ctx} exceeds model context length, using {fitted_ctx}")
+            n_ctx = fitted_ctx
+        
+        # KV 缓存类型（显式选择优先于加载档位），并报告各 KV 类型的占用
+        kv_spec = LoadSpec.from_kwargs(model_path, n_ctx=n_ctx, profile=profile.name, **kv_options)
+        kv_report = format_kv_options(model_path, n_ctx, (kv_spec.type_k, kv_spec.type_v))
+        if kv_report:
+            print(kv_report)
+        
+        # 根据设备选项设置参数
+        if device == "Auto":
+            # 使用智能优化（按 GGUF 张量大小、mmproj 和 KV 缓存规划 GPU 卸载层数）
+            optimized_params = optimizer.get_optimized_params(
+                model_path=model_path, mmproj_path=mmproj_path, n_ctx=n_ctx,
+                type_k=kv_spec.type_k, type_v=kv_spec.type_v, flash_attn=kv_spec.flash_attn
+            )
+            n_gpu_layers = optimized_params['n_gpu_layers']
+            n_batch = optimized_params.get('n_batch', 512)
+            
+            # 模型已在显存中时可用显存不包含它自身，沿用当前的卸载层数避免重新加载
+            loaded_info = get_inference_engine().loaded_models.get_info(model_path)
+            if loaded_info and 'offload_plan' in optimized_params:
+                n_gpu_layers = loaded_info.get('n_gpu_layers', n_gpu_layers)
+                print(f"ℹ️ Model already loaded, keeping n_gpu_layers={n_gpu_layers}")
+            
+            print(f"🎯 Auto-optimized: {optimized_params['device_info']}")
+            print(f"   GPU layers: {n_gpu_layers}")
+            print(f"   Batch size: {n_batch}")
+            print(f"   Threads: {optimized_params['n_threads']} decode / {optimized_params['n_threads_batch']} prefill")
+        elif device == "GPU":
+            n_gpu_layers = -1
+            n_batch = 512
+            print(f"🎮 Using GPU (all layers)")
+        else:  # CPU
+            n_gpu_layers = 0
+            n_batch = 128
+            print(f"💻 Using CPU only")
+        
+        # 加载档位限制批大小（批次越大，logits 和计算缓冲区越大）
+        if n_batch > profile.n_batch:
+            print(f"📉 Load profile {profile.name}: n_batch {n_batch} -> {profile.n_batch}")
+            n_batch = profile.n_batch
+        
         # 创建配置
         config = VisionModelConfig(
             model_name=model,
             model_path=model_path,
             mmproj_path=mmproj_path,
             n_ctx=n_ctx,
-            n_gpu_layers=n_gpu_layers
+            n_gpu_layers=n_gpu_layers,
+            n_batch=n_batch
         )
         
         # 验证配置
@@ -349,7 +384,15 @@ class VisionModelLoader:
         print(f"✅ Vision model loaded: {model}")
         print(f"📁 Using mmproj: {os.path.basename(mmproj_path)}")
         
-        return (config.to_dict(),)
+        # 本机对该模型的自动调优结果（批大小、线程数等），节点上显式选择的 KV 选项优先
+        config_dict = {**apply_tuned_params({**config.to_dict(), 'profile': profile.name}, model_path, device),
+                       **kv_options}
+        
+        # 自动上下文：GPU 卸载按上限规划，生成节点按实际 token 数（含图像 token）确定 n_ctx
+        if n_ctx_mode == "auto":
+            config_dict.update(auto_context_config(n_ctx))
+            print(f"📏 Auto n_ctx (up to {n_ctx})")
+        return (config_dict,)
 
 
 class VisionLanguageNode:
@@ -362,7 +405,7 @@ class VisionLanguageNode:
     def _get_engine(cls):
         """获取推理引擎"""
         if cls._inference_engine is None:
-            cls._inference_engine = InferenceEngine()
+            cls._inference_engine = get_inference_engine()
         return cls._inference_engine
     
     @classmethod
@@ -424,7 +467,10 @@ class VisionLanguageNode:
                     "multiline": True,
                     "tooltip": "系统提示词（可自定义模型行为）"
                 }),
-            }
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
+            },
         }
     
     RETURN_TYPES = ("STRING",)
@@ -435,11 +481,10 @@ class VisionLanguageNode:
     
     def describe_image(self, model, prompt, max_tokens=512, 
                       temperature=0.7, top_p=0.9, top_k=40, seed=0,
-                      image=None, video=None, system_prompt=None):
+                      image=None, video=None, system_prompt=None, unique_id=None):
         """生成图像/视频描述，也支持纯文本对话"""
         try:
-            from llama_cpp import Llama
-            from llama_cpp.llama_chat_format import Qwen25VLChatHandler
+            import llama_cpp  # noqa: F401  检查依赖是否已安装
             
             # 允许纯文本模式（无图像/视频）
             if image is not None and video is not None:
@@ -463,26 +508,30 @@ class VisionLanguageNode:
                 if is_video:
                     print(f"🎬 视频帧数: {input_data.shape[0]}")
             
-            # 加载模型（如果未加载）
-            if not engine.is_model_loaded(model_path):
+            # 自动上下文模式：按提示词、图像/视频帧和 max_tokens 选择 n_ctx
+            if not text_only_mode:
+                frames = min(input_data.shape[0], 8) if is_video else 1
+                images = [(int(input_data.shape[2]), int(input_data.shape[1]))] * frames
+            else:
+                images = []
+            model = resolve_auto_context(model, [system_prompt, prompt], max_tokens, images, 'qwen25vl')
+            
+            # 通过共享引擎加载模型（已加载且参数兼容时直接复用同一份权重）
+            load_kwargs = load_kwargs_from_config(model)
+            if not engine.is_model_loaded(model_path, **load_kwargs):
                 print(f"🔄 Loading vision model into memory...")
                 print(f"📁 Model: {os.path.basename(model_path)}")
                 print(f"📁 mmproj: {os.path.basename(mmproj_path)}")
-                
-                chat_handler = Qwen25VLChatHandler(clip_model_path=mmproj_path)
-                llm = Llama(
-                    model_path=model_path,
-                    chat_handler=chat_handler,
-                    n_ctx=model.get('n_ctx', 8192),
-                    n_gpu_layers=model.get('n_gpu_layers', -1),
-                    verbose=model.get('verbose', False),
-                    seed=seed
-                )
-                
-                engine.loaded_models[model_path] = llm
-                print(f"✅ Vision model loaded successfully")
-            else:
-                llm = engine.loaded_models[model_path]
+            
+            success = engine.load_model(
+                model_path=model_path,
+                mmproj_path=mmproj_path,
+                chat_handler='qwen25vl',
+                verbose=model.get('verbose', False),
+                **load_kwargs
+            )
+            if not success:
+                raise RuntimeError(f"Failed to load vision model: {os.path.basename(model_path)}")
             
             # 处理图像或视频帧
             image_paths = []
@@ -542,17 +591,20 @@ class VisionLanguageNode:
                 print(f"🤖 Generating {'video' if is_video else 'image'} description...")
             print(f"📝 用户提示词: {prompt[:50]}...")
             
-            # 生成描述
-            response = llm.create_chat_completion(
-                messages=messages,
+            # 生成描述（流式输出，部分文本推送到进度条和前端）
+            progress = StreamProgress(max_tokens, node_id=unique_id)
+            output_text = engine.chat_completion(
+                model_path,
+                messages,
+                on_token=progress,
+                metrics=progress.metrics,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 top_p=top_p,
                 top_k=top_k,
-                stream=False
+                seed=seed
             )
-            
-            output_text = response["choices"][0]["message"]["content"]
+            progress.finish()
             
             # 清理输出文本：去除首尾空白和多余空行
             output_text = output_text.strip()
@@ -28,6 +28,7 @@ try:
         REPETITION_PENALTY_INPUT,
         PROMPT_INPUT,
         SYSTEM_PROMPT_INPUT,
+        THINKING_BUDGET_INPUT,
         TRANSFORMERS_QUANTIZATION_INPUT,
         TRANSFORMERS_ATTENTION_INPUT,
         TRANSFORMERS_PIXELS_INPUT,
@@ -47,6 +48,7 @@ except ImportError:
         REPETITION_PENALTY_INPUT,
         PROMPT_INPUT,
         SYSTEM_PROMPT_INPUT,
+        THINKING_BUDGET_INPUT,
         TRANSFORMERS_QUANTIZATION_INPUT,
         TRANSFORMERS_ATTENTION_INPUT,
         TRANSFORMERS_PIXELS_INPUT,
@@ -171,7 +173,8 @@ class VisionLanguageNodeTransformers:
                 {
                     "image": ("IMAGE",),
                 },
-                SYSTEM_PROMPT_INPUT
+                SYSTEM_PROMPT_INPUT,
+                THINKING_BUDGET_INPUT
             )
         }
     
@@ -192,7 +195,8 @@ class VisionLanguageNodeTransformers:
         max_tokens,
         seed,
         image=None,
-        system_prompt=""
+        system_prompt="",
+        thinking_budget=-1
     ):
         """生成文本（使用 Qwen3-VL 新 API）"""
         
@@ -267,6 +271,8 @@ class VisionLanguageNodeTransformers:
             print(f"   - Top-p: {top_p}")
             print(f"   - Top-k: {top_k}")
             print(f"   - Repetition penalty: {repetition_penalty}")
+            if thinking_budget >= 0:
+                print(f"   - Thinking budget: {thinking_budget} tokens")
             
             # 限制 max_tokens 避免过长输出（但允许更长的描述）
             safe_max_tokens = min(max_tokens, 1024)
@@ -280,7 +286,8 @@ class VisionLanguageNodeTransformers:
                 seed=seed,
                 top_p=top_p,
                 top_k=top_k,
-                repetition_penalty=repetition_penalty
+                repetition_penalty=repetition_penalty,
+                thinking_budget=thinking_budget
             )
             
             print(f"✅ Generated text ({len(result)} chars)")
@@ -296,7 +303,7 @@ class VisionLanguageNodeTransformers:
                 engine.unload()
             
             return (result,)
-            
+        
         except Exception as e:
             print(f"❌ Generation failed: {e}")
             import traceback
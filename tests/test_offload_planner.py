@@ -0,0 +1,164 @@
+"""
+Offload Planner 测试
+使用合成的 ModelLayout 和模拟的可用显存，不需要 GPU 或真实模型文件
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import offload_planner
+from utils.offload_planner import ModelLayout, estimate_compute_buffer, plan_gpu_layers, plan_offload
+
+
+MB = 1024 ** 2
+N_CTX = 1024
+
+
+def make_layout(n_layers=4, layer_mb=100, kv_mb=10, output_mb=50):
+    return ModelLayout(
+        n_layers=n_layers,
+        layer_bytes=[layer_mb * MB] * n_layers,
+        output_bytes=output_mb * MB,
+        cpu_bytes=30 * MB,
+        kv_bytes_per_layer=kv_mb * MB,
+        n_vocab=1000,
+        n_embd=64,
+        n_head=4,
+    )
+
+
+def fixed_bytes(layout, mmproj_bytes=0, reserve_bytes=0):
+    """计算缓冲区 + mmproj + 预留显存"""
+    return estimate_compute_buffer(layout, N_CTX) + mmproj_bytes + reserve_bytes
+
+
+def test_full_offload_includes_output_layer():
+    layout = make_layout()
+    # 4 × (100 + 10) + 50 = 490 MB
+    free = fixed_bytes(layout) + 490 * MB
+    plan = plan_offload(layout, free, N_CTX, reserve_bytes=0)
+    
+    assert plan.full
+    assert plan.n_gpu_layers == -1
+    assert plan.offloaded_layers == 4
+    assert plan.breakdown['output'] == 50 * MB
+    assert plan.breakdown['kv_cache'] == 40 * MB
+    assert plan.breakdown['layers'] == 400 * MB
+    assert plan.gpu_bytes == free
+
+
+def test_output_layer_left_on_cpu_when_it_does_not_fit():
+    layout = make_layout()
+    # 所有重复层都放得下，但输出层还差 1 MB
+    free = fixed_bytes(layout) + 489 * MB
+    plan = plan_offload(layout, free, N_CTX, reserve_bytes=0)
+    
+    assert not plan.full
+    assert plan.n_gpu_layers == 4
+    assert plan.offloaded_layers == 4
+    assert plan.breakdown['output'] == 0
+
+
+def test_partial_offload():
+    layout = make_layout()
+    # 2.5 层的空间：只能卸载 2 层
+    free = fixed_bytes(layout) + 275 * MB
+    plan = plan_offload(layout, free, N_CTX, reserve_bytes=0)
+    
+    assert plan.n_gpu_layers == 2
+    assert plan.offloaded_layers == 2
+    assert plan.breakdown['layers'] == 200 * MB
+    assert plan.breakdown['kv_cache'] == 20 * MB
+
+
+def test_partial_offload_counts_layers_from_the_end():
+    layout = make_layout()
+    # 最后一层更大：预算只够它一层，即使前面的小层能放下两层
+    layout.layer_bytes = [50 * MB, 50 * MB, 50 * MB, 150 * MB]
+    free = fixed_bytes(layout) + 170 * MB
+    plan = plan_offload(layout, free, N_CTX, reserve_bytes=0)
+    
+    assert plan.n_gpu_layers == 1
+
+
+def test_nothing_fits_keeps_model_on_cpu():
+    layout = make_layout()
+    plan = plan_offload(layout, fixed_bytes(layout) + 50 * MB, N_CTX, reserve_bytes=0)
+    
+    assert plan.n_gpu_layers == 0
+    assert plan.offloaded_layers == 0
+
+
+def test_mmproj_and_reserve_are_deducted():
+    layout = make_layout()
+    free = fixed_bytes(layout) + 490 * MB
+    assert plan_offload(layout, free, N_CTX, reserve_bytes=0).full
+    
+    # mmproj 占用 200 MB 后只剩 290 MB：2 层
+    plan = plan_offload(layout, free, N_CTX, mmproj_bytes=200 * MB, reserve_bytes=0)
+    assert plan.n_gpu_layers == 2
+    assert plan.breakdown['mmproj'] == 200 * MB
+    
+    # 预留显存同样从预算中扣除
+    plan = plan_offload(layout, free, N_CTX, reserve_bytes=200 * MB)
+    assert plan.n_gpu_layers == 2
+    assert plan.breakdown['reserve'] == 200 * MB
+
+
+def test_compute_buffer_is_deducted():
+    layout = make_layout()
+    compute = estimate_compute_buffer(layout, N_CTX)
+    assert compute > 0
+    
+    # 可用显存恰好是全部层的大小，但没有留出计算缓冲区
+    plan = plan_offload(layout, 490 * MB, N_CTX, reserve_bytes=0)
+    assert not plan.full
+    assert plan.breakdown['compute'] == compute
+    
+    # flash attention 不分配注意力分数矩阵，计算缓冲区更小
+    assert estimate_compute_buffer(layout, N_CTX, flash_attn=True) < compute
+
+
+def test_reserve_env_override(monkeypatch):
+    layout = make_layout()
+    free = fixed_bytes(layout) + 490 * MB
+    monkeypatch.setenv(offload_planner.RESERVE_ENV, "200")
+    
+    plan = plan_offload(layout, free, N_CTX)
+    assert plan.breakdown['reserve'] == 200 * MB
+    assert plan.n_gpu_layers == 2
+
+
+@pytest.fixture
+def synthetic_layout(monkeypatch):
+    layout = make_layout()
+    monkeypatch.setattr(ModelLayout, 'from_gguf', classmethod(lambda cls, *args, **kwargs: layout))
+    monkeypatch.setenv(offload_planner.RESERVE_ENV, "0")
+    return layout
+
+
+def test_plan_gpu_layers_uses_memory_probe(synthetic_layout):
+    free = fixed_bytes(synthetic_layout) + 275 * MB
+    plan = plan_gpu_layers("model.gguf", n_ctx=N_CTX, memory_probe=lambda: (free, 8 * 1024 * MB))
+    
+    assert plan.n_gpu_layers == 2
+    assert plan.free_bytes == free
+
+
+def test_plan_gpu_layers_reads_mmproj_size(synthetic_layout, tmp_path):
+    mmproj = tmp_path / "mmproj.gguf"
+    with open(mmproj, 'wb') as f:
+        f.truncate(200 * MB)
+    free = fixed_bytes(synthetic_layout) + 490 * MB
+    plan = plan_gpu_layers("model.gguf", str(mmproj), n_ctx=N_CTX, memory_probe=lambda: (free, free))
+    
+    assert plan.breakdown['mmproj'] == 200 * MB
+    assert plan.n_gpu_layers == 2
+
+
+def test_plan_gpu_layers_without_gpu(synthetic_layout):
+    assert plan_gpu_layers("model.gguf", n_ctx=N_CTX, memory_probe=lambda: None) is None
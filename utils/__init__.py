@@ -4,21 +4,31 @@ Utility module for GGUF operations
 
 from .downloader import FileDownloader
 from .validator import ModelValidator
-from .registry import RegistryManager
+from .registry import RegistryManager, get_registry_manager
 from .device_optimizer import DeviceOptimizer
 from .mmproj_finder import MMProjFinder
 from .mmproj_validator import MMProjValidator
 from .system_prompts import SystemPromptsManager
 from .download_manager import DownloadManager, get_download_manager
+from .gguf_reader import GGUFMetadata, read_gguf_metadata, get_gguf_metadata
+from .offload_planner import ModelLayout, OffloadPlan, plan_offload, plan_gpu_layers
 
 __all__ = [
     'FileDownloader', 
     'ModelValidator', 
     'RegistryManager',
+    'get_registry_manager',
     'DeviceOptimizer',
     'MMProjFinder',
     'MMProjValidator',
     'SystemPromptsManager',
     'DownloadManager',
     'get_download_manager',
+    'GGUFMetadata',
+    'read_gguf_metadata',
+    'get_gguf_metadata',
+    'ModelLayout',
+    'OffloadPlan',
+    'plan_offload',
+    'plan_gpu_layers',
 ]
@@ -3,9 +3,182 @@ Device Optimizer - 智能设备检测和参数优化
 自动检测GPU型号、显存大小，并提供优化参数
 """
 
+import os
 import subprocess
 import re
-from typing import Dict, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from .offload_planner import OffloadPlan, plan_gpu_layers
+except ImportError:
+    from utils.offload_planner import OffloadPlan, plan_gpu_layers
+
+
+# ubatch（一次送入计算图的物理批大小）上限，与 llama.cpp 默认值一致
+DEFAULT_UBATCH = 512
+
+
+def _parse_cpu_list(text: str) -> Set[int]:
+    """解析 Linux CPU 列表格式（如 "0-3,8-11"）"""
+    cpus = set()
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """
+    读取 cgroup CPU 配额（容器内可用的 CPU 数，可能是小数）
+    
+    Returns:
+        可用 CPU 数，没有限制或无法读取时返回 None
+    """
+    # cgroup v2：当前进程所在 cgroup 的 cpu.max（"配额 周期" 或 "max 周期"）
+    candidates = []
+    cgroup = _read_text('/proc/self/cgroup') or ''
+    for line in cgroup.splitlines():
+        if line.startswith('0::'):
+            candidates.append(os.path.join('/sys/fs/cgroup', line[3:].lstrip('/'), 'cpu.max'))
+    candidates.append('/sys/fs/cgroup/cpu.max')
+    for path in candidates:
+        value = _read_text(path)
+        if value:
+            quota, _, period = value.partition(' ')
+            if quota == 'max':
+                return None
+            try:
+                return int(quota) / int(period or 100000)
+            except ValueError:
+                return None
+    
+    # cgroup v1
+    for base in ('/sys/fs/cgroup/cpu', '/sys/fs/cgroup/cpu,cpuacct'):
+        quota = _read_text(os.path.join(base, 'cpu.cfs_quota_us'))
+        period = _read_text(os.path.join(base, 'cpu.cfs_period_us'))
+        if quota and period:
+            try:
+                quota, period = int(quota), int(period)
+            except ValueError:
+                return None
+            return quota / period if quota > 0 and period > 0 else None
+    return None
+
+
+@lru_cache(maxsize=1)
+def detect_cpu_topology() -> Dict:
+    """
+    检测当前进程可用的 CPU 资源
+    
+    综合 os.sched_getaffinity（taskset / cpuset）、cgroup CPU 配额、
+    sysfs 中的物理核心（同一核心的超线程只算一次）和 NUMA 节点信息
+    
+    Returns:
+        {'logical', 'physical', 'quota', 'numa_nodes', 'largest_node_physical'}
+    """
+    try:
+        cpus = set(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = set(range(os.cpu_count() or 1))
+    
+    # 物理核心：(封装 ID, 核心 ID) 去重
+    cores: Dict[int, Tuple[str, str]] = {}
+    for cpu in cpus:
+        topology = f'/sys/devices/system/cpu/cpu{cpu}/topology'
+        core_id = _read_text(os.path.join(topology, 'core_id'))
+        package_id = _read_text(os.path.join(topology, 'physical_package_id'))
+        if core_id is None or package_id is None:
+            cores = {}
+            break
+        cores[cpu] = (package_id, core_id)
+    
+    if cores:
+        physical = len(set(cores.values()))
+    else:
+        physical = None
+        try:
+            import psutil
+            total_physical = psutil.cpu_count(logical=False)
+            total_logical = psutil.cpu_count(logical=True)
+            if total_physical and total_logical:
+                physical = max(1, round(len(cpus) * total_physical / total_logical))
+        except ImportError:
+            pass
+        if physical is None:
+            # 无法确定超线程情况时沿用 llama.cpp 的假设（逻辑核心数的一半）
+            physical = max(1, len(cpus) // 2)
+    
+    # NUMA 节点（只统计包含可用 CPU 的节点）
+    node_cpus: List[Set[int]] = []
+    node_root = '/sys/devices/system/node'
+    if os.path.isdir(node_root):
+        for name in sorted(os.listdir(node_root)):
+            if not re.fullmatch(r'node\d+', name):
+                continue
+            cpulist = _read_text(os.path.join(node_root, name, 'cpulist'))
+            if cpulist:
+                try:
+                    usable = _parse_cpu_list(cpulist) & cpus
+                except ValueError:
+                    continue
+                if usable:
+                    node_cpus.append(usable)
+    
+    largest_node_physical = physical
+    if len(node_cpus) > 1 and cores:
+        largest_node_physical = max(len({cores[cpu] for cpu in node}) for node in node_cpus)
+    
+    return {
+        'logical': len(cpus),
+        'physical': physical,
+        'quota': _cgroup_cpu_quota(),
+        'numa_nodes': max(1, len(node_cpus)),
+        'largest_node_physical': largest_node_physical,
+    }
+
+
+def recommend_threads() -> Dict[str, int]:
+    """
+    推荐 llama.cpp 的线程数
+    
+    - 解码（n_threads）受内存带宽限制，超线程没有收益：使用物理核心数；
+      多 NUMA 节点时只用一个节点的核心，避免跨节点访存
+    - 预填充（n_threads_batch）是计算密集型：使用全部可用的逻辑核心
+    - 两者都不超过 cgroup 配额，避免容器内线程超额订阅
+    
+    Returns:
+        {'n_threads', 'n_threads_batch'}
+    """
+    topology = detect_cpu_topology()
+    n_threads = topology['largest_node_physical']
+    n_threads_batch = topology['logical']
+    if topology['quota'] is not None:
+        limit = max(1, int(topology['quota']))
+        n_threads = min(n_threads, limit)
+        n_threads_batch = min(n_threads_batch, limit)
+    return {
+        'n_threads': max(1, n_threads),
+        'n_threads_batch': max(1, n_threads_batch, n_threads),
+    }
+
+
+def recommend_ubatch(n_batch: int) -> int:
+    """推荐的物理批大小（不超过逻辑批大小）"""
+    return max(1, min(int(n_batch), DEFAULT_UBATCH))
 
 
 class DeviceOptimizer:
@@ -44,6 +217,7 @@ class DeviceOptimizer:
     def __init__(self):
         self.gpu_info = None
         self.cuda_available = False
+        self.cpu_info = detect_cpu_topology()
         self._detect_hardware()
     
     def _detect_hardware(self):
@@ -104,21 +278,49 @@ class DeviceOptimizer:
         
         return "Unknown", "Unknown", 0
     
-    def get_optimized_params(self, model_size_gb: float = 7.0) -> Dict:
+    def plan_offload(self, model_path: str, mmproj_path: str = None, n_ctx: int = 8192,
+                     **kwargs) -> Optional[OffloadPlan]:
+        """
+        按模型实际大小规划 GPU 卸载层数（GGUF 每层张量大小 + mmproj + KV 缓存 + 计算缓冲区）
+        
+        Args:
+            model_path: GGUF 模型文件路径
+            mmproj_path: mmproj 文件路径（视觉模型）
+            n_ctx: 上下文长度
+            **kwargs: plan_gpu_layers 的其他参数（type_k, type_v, n_ubatch, flash_attn, free_bytes）
+        
+        Returns:
+            OffloadPlan，没有 CUDA GPU 或无法读取模型布局时返回 None
+        """
+        if not self.cuda_available:
+            return None
+        return plan_gpu_layers(model_path, mmproj_path, n_ctx, **kwargs)
+    
+    def get_optimized_params(self, model_size_gb: float = 7.0, model_path: str = None,
+                             mmproj_path: str = None, n_ctx: int = None, **plan_kwargs) -> Dict:
         """
         根据硬件获取优化参数
         
+        提供 model_path 时按 GGUF 张量大小和当前可用显存规划 n_gpu_layers（见 plan_offload），
+        否则按显存档位估算
+        
         Args:
-            model_size_gb: 模型大小（GB）
+            model_size_gb: 模型大小（GB），提供 model_path 时使用实际文件大小
+            model_path: GGUF 模型文件路径（可选）
+            mmproj_path: mmproj 文件路径（可选）
+            n_ctx: 上下文长度（可选，默认使用档位值）
+            **plan_kwargs: 传给 plan_offload 的 KV 参数（type_k, type_v, flash_attn）
         
         Returns:
             优化参数字典
         """
+        if model_path and os.path.exists(model_path):
+            model_size_gb = os.path.getsize(model_path) / 1024 ** 3
+        
         params = {
             'n_gpu_layers': 0,
             'n_ctx': 2048,
             'n_batch': 512,
-            'n_threads': 4,
             'use_mmap': True,
             'use_mlock': False,
             'device_info': 'CPU only',
@@ -126,7 +328,10 @@ class DeviceOptimizer:
             'rope_freq_scale': 1.0,
         }
         
+        params.update(recommend_threads())
+        
         if not self.cuda_available or not self.gpu_info:
+            params['n_ubatch'] = recommend_ubatch(params['n_batch'])
             return params
         
         vram_mb = self.gpu_info['vram_mb']
@@ -138,7 +343,6 @@ class DeviceOptimizer:
                 'n_gpu_layers': -1,
                 'n_ctx': 8192,
                 'n_batch': 1024,
-                'n_threads': 8,
                 'use_mlock': True,
                 'device_info': f'{gpu_name} (High VRAM mode - Optimized for {vram_mb}MB)'
             })
@@ -147,7 +351,6 @@ class DeviceOptimizer:
                 'n_gpu_layers': -1,
                 'n_ctx': 8192,
                 'n_batch': 512,
-                'n_threads': 8,
                 'device_info': f'{gpu_name} (High VRAM mode - {vram_mb}MB)'
             })
         elif vram_mb >= 20000:  # 20GB+ (RTX 4090, 3090, A30)
@@ -155,7 +358,6 @@ class DeviceOptimizer:
                 'n_gpu_layers': -1,
                 'n_ctx': 4096,
                 'n_batch': 512,
-                'n_threads': 6,
                 'device_info': f'{gpu_name} (Normal VRAM mode - {vram_mb}MB)'
             })
         elif vram_mb >= 10000:  # 10GB+ (RTX 3080, 4070)
@@ -163,7 +365,6 @@ class DeviceOptimizer:
                 'n_gpu_layers': -1,
                 'n_ctx': 2048,
                 'n_batch': 256,
-                'n_threads': 4,
                 'device_info': f'{gpu_name} (Normal VRAM mode - {vram_mb}MB)'
             })
         elif vram_mb >= 6000:  # 6GB+ (RTX 3060, 2060)
@@ -172,7 +373,6 @@ class DeviceOptimizer:
                 'n_gpu_layers': max(20, min(estimated_layers, 50)),
                 'n_ctx': 2048,
                 'n_batch': 128,
-                'n_threads': 4,
                 'device_info': f'{gpu_name} (Low VRAM mode - Partial offload, {vram_mb}MB)'
             })
         else:  # <6GB
@@ -180,26 +380,41 @@ class DeviceOptimizer:
                 'n_gpu_layers': 0,
                 'n_ctx': 2048,
                 'n_batch': 128,
-                'n_threads': 4,
                 'device_info': f'{gpu_name} (CPU mode - Insufficient VRAM, {vram_mb}MB)'
             })
         
+        params['n_ubatch'] = recommend_ubatch(params['n_batch'])
+        
+        if model_path:
+            plan = self.plan_offload(model_path, mmproj_path, n_ctx or params['n_ctx'],
+                                     n_ubatch=params['n_ubatch'], **plan_kwargs)
+            if plan is not None:
+                params['n_gpu_layers'] = plan.n_gpu_layers
+                params['offload_plan'] = plan
+                params['device_info'] = f"{gpu_name} ({plan.describe()})"
+        
         return params
     
     def get_device_summary(self) -> str:
         """获取设备摘要信息"""
+        cpu = self.cpu_info
+        quota = f", quota {cpu['quota']:.1f}" if cpu['quota'] is not None else ""
+        numa = f", {cpu['numa_nodes']} NUMA nodes" if cpu['numa_nodes'] > 1 else ""
+        cpu_summary = f"   CPU: {cpu['physical']} cores / {cpu['logical']} threads usable{quota}{numa}"
+        
         if not self.cuda_available:
-            return "❌ No CUDA GPU detected"
+            return f"❌ No CUDA GPU detected\n{cpu_summary}"
         
         if not self.gpu_info:
-            return "⚠️  GPU detected but info unavailable"
+            return f"⚠️  GPU detected but info unavailable\n{cpu_summary}"
         
         info = self.gpu_info
         return (
             f"✅ {info['name']}\n"
             f"   VRAM: {info['vram_mb']} MB\n"
             f"   Architecture: {info['architecture']}\n"
-            f"   Compute Capability: {info['compute_capability']}"
+            f"   Compute Capability: {info['compute_capability']}\n"
+            f"{cpu_summary}"
         )
     
     def check_llama_cpp_installation(self) -> Dict[str, any]:
@@ -255,7 +470,7 @@ class DeviceOptimizer:
             
             if not result['cuda_support']:
                 result['issues'].append("CUDA support not detected - llama-cpp-python may not be compiled with CUDA")
-            
+        
         except ImportError as e:
             result['issues'].append(f"llama-cpp-python not installed: {e}")
             result['issues'].append("Install with: pip install llama-cpp-python")
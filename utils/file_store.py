@@ -0,0 +1,99 @@
+"""
+File Store - 模型文件指纹与 JSON 状态文件
+供前缀缓存、自动调优和使用历史共用
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+
+# 计算文件指纹时读取的首尾字节数
+FINGERPRINT_CHUNK = 4 * 1024 * 1024
+
+
+@lru_cache(maxsize=64)
+def _fingerprint(path: str, size: int, mtime_ns: int) -> str:
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(str(size).encode())
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if size > 2 * FINGERPRINT_CHUNK:
+            f.seek(size - FINGERPRINT_CHUNK)
+        digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str) -> Optional[str]:
+    """
+    计算模型文件指纹（文件大小 + 首尾各 4 MB 的内容摘要）
+    
+    完整哈希数 GB 的模型比预填充本身还慢；首尾内容已包含 GGUF 头和张量数据，
+    足以区分不同的模型文件，且与文件名、路径无关（文件改名或移动后仍能匹配）
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        十六进制指纹，文件不可读时返回 None
+    """
+    try:
+        stat = os.stat(path)
+        return _fingerprint(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+
+
+def load_json(path: Optional[str], key: str, name: str) -> Dict:
+    """
+    读取 JSON 状态文件中 key 对应的字典
+    
+    Args:
+        path: 文件路径，None 或文件不存在时返回空字典
+        key: 顶层键
+        name: 用于日志的内容名称
+    
+    Returns:
+        字典（文件损坏时返回空字典）
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f).get(key, {})
+        if isinstance(data, dict):
+            return data
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"⚠️  Ignoring unreadable {name}: {e}")
+    return {}
+
+
+def save_json(path: Optional[str], key: str, data: Dict, name: str) -> bool:
+    """
+    把字典保存到 JSON 状态文件（先写临时文件再替换，避免读到半个文件）
+    
+    Args:
+        path: 文件路径，None 时不保存
+        key: 顶层键
+        data: 要保存的字典
+        name: 用于日志的内容名称
+    
+    Returns:
+        是否保存成功
+    """
+    if not path:
+        return False
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({key: data}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        print(f"⚠️  Failed to save {name}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
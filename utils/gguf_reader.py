@@ -0,0 +1,512 @@
+"""
+GGUF Reader - 纯 Python 的 GGUF 头部/元数据解析器
+通过 mmap 只读取 KV 元数据区，大数组（词表等）只记录长度不解码，
+结果按 (path, size, mtime) 缓存，重复查询为微秒级
+"""
+
+import mmap
+import os
+import struct
+import threading
+from collections import namedtuple
+from typing import Any, Dict, Optional
+
+# GGUF 值类型
+GGUF_TYPE_UINT8 = 0
+GGUF_TYPE_INT8 = 1
+GGUF_TYPE_UINT16 = 2
+GGUF_TYPE_INT16 = 3
+GGUF_TYPE_UINT32 = 4
+GGUF_TYPE_INT32 = 5
+GGUF_TYPE_FLOAT32 = 6
+GGUF_TYPE_BOOL = 7
+GGUF_TYPE_STRING = 8
+GGUF_TYPE_ARRAY = 9
+GGUF_TYPE_UINT64 = 10
+GGUF_TYPE_INT64 = 11
+GGUF_TYPE_FLOAT64 = 12
+
+_SCALAR_FORMATS = {
+    GGUF_TYPE_UINT8: 'B',
+    GGUF_TYPE_INT8: 'b',
+    GGUF_TYPE_UINT16: 'H',
+    GGUF_TYPE_INT16: 'h',
+    GGUF_TYPE_UINT32: 'I',
+    GGUF_TYPE_INT32: 'i',
+    GGUF_TYPE_FLOAT32: 'f',
+    GGUF_TYPE_BOOL: '?',
+    GGUF_TYPE_UINT64: 'Q',
+    GGUF_TYPE_INT64: 'q',
+    GGUF_TYPE_FLOAT64: 'd',
+}
+_SCALAR_STRUCTS = {t: struct.Struct('<' + f) for t, f in _SCALAR_FORMATS.items()}
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+GGUF_MAGIC = b'GGUF'
+
+# 超过此长度的数组只记录类型和长度（例如 tokenizer.ggml.tokens）
+MAX_DECODED_ARRAY = 256
+
+# KV 缓存各数据类型每个元素占用的字节数（量化类型按块大小折算）
+KV_CACHE_TYPE_BYTES = {
+    'f32': 4.0,
+    'f16': 2.0,
+    'bf16': 2.0,
+    'q8_0': 34 / 32,
+    'q5_1': 24 / 32,
+    'q5_0': 22 / 32,
+    'q4_1': 20 / 32,
+    'q4_0': 18 / 32,
+    'iq4_nl': 18 / 32,
+}
+
+# 不需要 flash attention 的 V 缓存类型（llama.cpp 中量化的 V 缓存只能配合 flash attention 使用）
+UNQUANTIZED_KV_TYPES = ('f32', 'f16', 'bf16')
+
+# llama.cpp 的 general.file_type 枚举
+FILE_TYPE_NAMES = {
+    0: 'F32', 1: 'F16', 2: 'Q4_0', 3: 'Q4_1', 7: 'Q8_0', 8: 'Q5_0', 9: 'Q5_1',
+    10: 'Q2_K', 11: 'Q3_K_S', 12: 'Q3_K_M', 13: 'Q3_K_L', 14: 'Q4_K_S', 15: 'Q4_K_M',
+    16: 'Q5_K_S', 17: 'Q5_K_M', 18: 'Q6_K', 19: 'IQ2_XXS', 20: 'IQ2_XS', 21: 'Q2_K_S',
+    22: 'IQ3_XS', 23: 'IQ3_XXS', 24: 'IQ1_S', 25: 'IQ4_NL', 26: 'IQ3_S', 27: 'IQ3_M',
+    28: 'IQ2_S', 29: 'IQ2_M', 30: 'IQ4_XS', 31: 'IQ1_M', 32: 'BF16', 36: 'TQ1_0', 37: 'TQ2_0',
+}
+
+# 语言模型本身即为多模态结构的架构
+VISION_ARCHITECTURES = {
+    'qwen2vl', 'qwen25vl', 'qwen3vl', 'qwen3vlmoe', 'minicpmv', 'llava', 'mllama',
+}
+
+# 聊天模板中的图像占位符（出现即说明模型需要配合 mmproj 使用）
+VISION_TEMPLATE_MARKERS = (
+    '<|vision_start|>', '<|image_pad|>', '<start_of_image>', '<|image|>', '[IMG]', '<image>',
+)
+
+# 未解码的大数组
+GGUFArraySummary = namedtuple('GGUFArraySummary', ['item_type', 'count'])
+
+
+class GGUFFormatError(ValueError):
+    """GGUF 文件格式错误"""
+    pass
+
+
+class GGUFMetadata:
+    """GGUF 文件元数据"""
+    
+    def __init__(self, path: str, version: int, tensor_count: int, kv: Dict[str, Any],
+                 tensor_info_offset: int = None):
+        self.path = path
+        self.version = version
+        self.tensor_count = tensor_count
+        self.kv = kv
+        # 张量信息区在文件中的起始位置（KV 元数据之后），按需解析
+        self.tensor_info_offset = tensor_info_offset
+        self._tensor_sizes: Optional[Dict[str, int]] = None
+    
+    def get(self, key: str, default=None):
+        """读取原始 KV 值"""
+        return self.kv.get(key, default)
+    
+    def _arch_value(self, suffix: str):
+        """读取 {architecture}.{suffix}"""
+        arch = self.architecture
+        if not arch:
+            return None
+        return self.kv.get(f"{arch}.{suffix}")
+    
+    @property
+    def architecture(self) -> Optional[str]:
+        return self.kv.get('general.architecture')
+    
+    @property
+    def name(self) -> Optional[str]:
+        return self.kv.get('general.name')
+    
+    @property
+    def file_type(self) -> Optional[int]:
+        return self.kv.get('general.file_type')
+    
+    @property
+    def file_type_name(self) -> Optional[str]:
+        """量化类型名称（如 Q4_K_M）"""
+        file_type = self.file_type
+        if file_type is None:
+            return None
+        return FILE_TYPE_NAMES.get(file_type, f"type_{file_type}")
+    
+    @property
+    def context_length(self) -> Optional[int]:
+        """训练上下文长度"""
+        return self._arch_value('context_length')
+    
+    @property
+    def block_count(self) -> Optional[int]:
+        return self._arch_value('block_count')
+    
+    @property
+    def embedding_length(self) -> Optional[int]:
+        return self._arch_value('embedding_length')
+    
+    @property
+    def has_vision_encoder(self) -> bool:
+        return bool(self.kv.get('clip.has_vision_encoder', False))
+    
+    @property
+    def projector_type(self) -> Optional[str]:
+        return self.kv.get('clip.projector_type')
+    
+    @property
+    def chat_template(self) -> Optional[str]:
+        return self.kv.get('tokenizer.chat_template')
+    
+    @property
+    def head_count(self) -> Optional[int]:
+        return self._per_layer_max(self._arch_value('attention.head_count'))
+    
+    @property
+    def head_count_kv(self) -> Optional[int]:
+        value = self._arch_value('attention.head_count_kv')
+        if value is None:
+            return self.head_count
+        return self._per_layer_max(value)
+    
+    @staticmethod
+    def _per_layer_max(value):
+        """部分架构按层给出数组（如滑动窗口层），取最大值"""
+        if isinstance(value, list):
+            return max(value) if value else None
+        return value
+    
+    def kv_cache_bytes(self, n_ctx: int, type_k: str = 'f16', type_v: str = 'f16') -> Optional[int]:
+        """
+        估算指定上下文长度下 KV 缓存占用的字节数
+        
+        Args:
+            n_ctx: 上下文长度
+            type_k: K 缓存数据类型
+            type_v: V 缓存数据类型
+        
+        Returns:
+            字节数，元数据不完整时返回 None
+        """
+        n_layers = self.block_count
+        n_head = self.head_count
+        n_head_kv = self.head_count_kv
+        if not n_layers or not n_head or not n_head_kv:
+            return None
+        
+        embedding_length = self.embedding_length
+        key_length = self._arch_value('attention.key_length')
+        value_length = self._arch_value('attention.value_length')
+        if not key_length:
+            if not embedding_length:
+                return None
+            key_length = embedding_length // n_head
+        value_length = value_length or key_length
+        
+        bytes_k = KV_CACHE_TYPE_BYTES.get(str(type_k).lower(), 2.0)
+        bytes_v = KV_CACHE_TYPE_BYTES.get(str(type_v).lower(), 2.0)
+        per_token = n_layers * n_head_kv * (key_length * bytes_k + value_length * bytes_v)
+        return int(per_token * n_ctx)
+    
+    def tensor_sizes(self) -> Dict[str, int]:
+        """
+        各张量在文件中占用的字节数（按需解析张量信息区，结果缓存）
+        
+        大小由相邻张量的数据偏移相减得到（包含对齐填充），不需要各量化类型的块大小表
+        
+        Returns:
+            {张量名: 字节数}
+        
+        Raises:
+            GGUFFormatError: 张量信息区损坏
+            OSError: 文件无法读取
+        """
+        if self._tensor_sizes is not None:
+            return self._tensor_sizes
+        if self.tensor_info_offset is None:
+            raise GGUFFormatError("Tensor info offset unknown")
+        
+        with open(self.path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                cursor = _Cursor(buf, self.tensor_info_offset)
+                offsets = []
+                try:
+                    for _ in range(self.tensor_count):
+                        name = cursor.read_string()
+                        n_dims = cursor.unpack(_U32)
+                        cursor.offset += 8 * n_dims
+                        cursor.unpack(_U32)  # ggml_type
+                        offsets.append((cursor.unpack(_U64), name))
+                except (struct.error, OverflowError) as e:
+                    raise GGUFFormatError(f"Truncated or corrupt GGUF tensor info: {e}")
+                
+                alignment = int(self.kv.get('general.alignment', 32)) or 32
+                data_start = (cursor.offset + alignment - 1) // alignment * alignment
+        
+        offsets.sort()
+        sizes = {}
+        for i, (offset, name) in enumerate(offsets):
+            end = offsets[i + 1][0] if i + 1 < len(offsets) else file_size - data_start
+            sizes[name] = max(0, end - offset)
+        self._tensor_sizes = sizes
+        return sizes
+    
+    @property
+    def vocab_size(self) -> Optional[int]:
+        tokens = self.kv.get('tokenizer.ggml.tokens')
+        if isinstance(tokens, GGUFArraySummary):
+            return tokens.count
+        if isinstance(tokens, list):
+            return len(tokens)
+        return None
+    
+    @property
+    def is_mmproj(self) -> bool:
+        """是否为 mmproj（CLIP 投影）文件"""
+        return self.architecture == 'clip' or 'clip.has_vision_encoder' in self.kv
+    
+    @property
+    def is_vision(self) -> bool:
+        """是否为需要配合 mmproj 使用的视觉语言模型"""
+        if self.is_mmproj:
+            return False
+        if self.architecture in VISION_ARCHITECTURES:
+            return True
+        template = self.chat_template or ''
+        return any(marker in template for marker in VISION_TEMPLATE_MARKERS)
+    
+    @property
+    def model_kind(self) -> str:
+        """模型类别: 'mmproj' / 'vision' / 'text'"""
+        if self.is_mmproj:
+            return 'mmproj'
+        if self.is_vision:
+            return 'vision'
+        return 'text'
+    
+    def to_dict(self) -> Dict:
+        """转换为摘要字典（不包含大数组）"""
+        return {
+            'version': self.version,
+            'architecture': self.architecture,
+            'name': self.name,
+            'file_type': self.file_type_name,
+            'context_length': self.context_length,
+            'block_count': self.block_count,
+            'embedding_length': self.embedding_length,
+            'kind': self.model_kind,
+            'has_chat_template': self.chat_template is not None,
+        }
+    
+    def __repr__(self):
+        return (f"GGUFMetadata({os.path.basename(self.path)!r}, arch={self.architecture!r}, "
+                f"kind={self.model_kind!r}, ctx={self.context_length})")
+
+
+class _Cursor:
+    """在 mmap 缓冲区上顺序读取"""
+    
+    def __init__(self, buf, offset: int = 0):
+        self.buf = buf
+        self.offset = offset
+    
+    def unpack(self, st: struct.Struct):
+        value = st.unpack_from(self.buf, self.offset)[0]
+        self.offset += st.size
+        return value
+    
+    def read_string(self) -> str:
+        length = self.unpack(_U64)
+        end = self.offset + length
+        if end > len(self.buf):
+            raise GGUFFormatError("String extends past end of file")
+        value = self.buf[self.offset:end].decode('utf-8', errors='replace')
+        self.offset = end
+        return value
+    
+    def skip_string(self):
+        length = self.unpack(_U64)
+        self.offset += length
+        if self.offset > len(self.buf):
+            raise GGUFFormatError("String extends past end of file")
+    
+    def read_value(self, value_type: int):
+        if value_type in _SCALAR_STRUCTS:
+            return self.unpack(_SCALAR_STRUCTS[value_type])
+        if value_type == GGUF_TYPE_STRING:
+            return self.read_string()
+        if value_type == GGUF_TYPE_ARRAY:
+            return self.read_array()
+        raise GGUFFormatError(f"Unknown GGUF value type: {value_type}")
+    
+    def skip_value(self, value_type: int):
+        if value_type in _SCALAR_STRUCTS:
+            self.offset += _SCALAR_STRUCTS[value_type].size
+        elif value_type == GGUF_TYPE_STRING:
+            self.skip_string()
+        elif value_type == GGUF_TYPE_ARRAY:
+            item_type = self.unpack(_U32)
+            count = self.unpack(_U64)
+            self._skip_items(item_type, count)
+        else:
+            raise GGUFFormatError(f"Unknown GGUF value type: {value_type}")
+    
+    def _skip_items(self, item_type: int, count: int):
+        if item_type in _SCALAR_STRUCTS:
+            # 定长元素：直接跳过整段
+            self.offset += _SCALAR_STRUCTS[item_type].size * count
+            if self.offset > len(self.buf):
+                raise GGUFFormatError("Array extends past end of file")
+        elif item_type == GGUF_TYPE_STRING:
+            # 字符串数组（词表）：只累加长度，不解码
+            buf, offset, unpack_from = self.buf, self.offset, _U64.unpack_from
+            for _ in range(count):
+                offset += 8 + unpack_from(buf, offset)[0]
+            self.offset = offset
+            if self.offset > len(self.buf):
+                raise GGUFFormatError("Array extends past end of file")
+        else:
+            for _ in range(count):
+                self.skip_value(item_type)
+    
+    def read_array(self):
+        item_type = self.unpack(_U32)
+        count = self.unpack(_U64)
+        
+        if count > MAX_DECODED_ARRAY:
+            self._skip_items(item_type, count)
+            return GGUFArraySummary(item_type, count)
+        
+        if item_type in _SCALAR_FORMATS:
+            st = struct.Struct(f"<{count}{_SCALAR_FORMATS[item_type]}")
+            values = list(st.unpack_from(self.buf, self.offset))
+            self.offset += st.size
+            return values
+        
+        return [self.read_value(item_type) for _ in range(count)]
+
+
+def read_gguf_metadata(path: str) -> GGUFMetadata:
+    """
+    解析 GGUF 文件的头部和 KV 元数据（不读取张量数据）
+    
+    Args:
+        path: GGUF 文件路径
+    
+    Returns:
+        GGUFMetadata 实例
+    
+    Raises:
+        GGUFFormatError: 文件不是有效的 GGUF 文件
+        OSError: 文件无法读取
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < 24:
+            raise GGUFFormatError("File too small to be a GGUF file")
+        
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if buf[:4] != GGUF_MAGIC:
+                raise GGUFFormatError("Invalid GGUF file: magic number mismatch")
+            
+            cursor = _Cursor(buf, 4)
+            try:
+                version = cursor.unpack(_U32)
+                if version < 2:
+                    raise GGUFFormatError(f"Unsupported GGUF version: {version}")
+                
+                tensor_count = cursor.unpack(_U64)
+                kv_count = cursor.unpack(_U64)
+                
+                kv = {}
+                for _ in range(kv_count):
+                    key = cursor.read_string()
+                    value_type = cursor.unpack(_U32)
+                    kv[key] = cursor.read_value(value_type)
+            except (struct.error, OverflowError, MemoryError) as e:
+                raise GGUFFormatError(f"Truncated or corrupt GGUF header: {e}")
+    
+    return GGUFMetadata(path, version, tensor_count, kv, tensor_info_offset=cursor.offset)
+
+
+class GGUFMetadataCache:
+    """GGUF 元数据缓存（按 path + size + mtime 失效）"""
+    
+    def __init__(self, max_entries: int = 1024):
+        """
+        初始化缓存
+        
+        Args:
+            max_entries: 最大缓存条目数
+        """
+        self.max_entries = max_entries
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, path: str) -> Optional[GGUFMetadata]:
+        """
+        获取文件元数据，文件未变化时直接返回缓存
+        
+        Args:
+            path: GGUF 文件路径
+        
+        Returns:
+            GGUFMetadata 实例，无法解析时返回 None
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        
+        signature = (stat.st_size, stat.st_mtime_ns)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        
+        try:
+            metadata = read_gguf_metadata(path)
+        except (GGUFFormatError, OSError, ValueError) as e:
+            print(f"⚠️  Cannot read GGUF metadata from {os.path.basename(path)}: {e}")
+            metadata = None
+        
+        with self._lock:
+            if len(self._entries) >= self.max_entries and path not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[path] = (signature, metadata)
+        
+        return metadata
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局单例
+_metadata_cache = None
+
+
+def get_metadata_cache() -> GGUFMetadataCache:
+    """获取全局元数据缓存实例"""
+    global _metadata_cache
+    if _metadata_cache is None:
+        _metadata_cache = GGUFMetadataCache()
+    return _metadata_cache
+
+
+def get_gguf_metadata(path: str) -> Optional[GGUFMetadata]:
+    """
+    获取 GGUF 文件元数据（带缓存）
+    
+    Args:
+        path: GGUF 文件路径
+    
+    Returns:
+        GGUFMetadata 实例，文件不存在或无法解析时返回 None
+    """
+    if not path:
+        return None
+    return get_metadata_cache().get(path)
@@ -1,13 +1,58 @@
 """
 MMProj Finder - 智能查找 mmproj 文件
-支持多种命名模式和自动匹配
+支持多种命名模式和自动匹配；MMProjIndex 基于模型索引一次性建立
+"基础模型名 -> mmproj 文件" 映射，查找时不再逐个 os.path.exists
 """
 
 import os
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 import re
 
+from .gguf_reader import get_gguf_metadata
+
+
+# 末尾的量化/精度后缀（Q4_K_M、IQ4_XS、Q8_0、F16、BF16 等）
+_QUANT_SUFFIX_RE = re.compile(r'[-_.](?:i?q\d+(?:_[a-z0-9]+)*|f16|f32|bf16|fp16|fp32)$')
+# 独立的 mmproj 标记（mmproj-xxx、xxx.mmproj-f16、xxx_mmproj 等）
+_MMPROJ_TOKEN_RE = re.compile(r'(?:^|[-_.])mmproj(?=$|[-_.])')
+
+
+@lru_cache(maxsize=4096)
+def mmproj_base_key(filename: str) -> str:
+    """
+    生成模型/mmproj 文件的规范化基础名（去掉扩展名、mmproj 标记和量化后缀）
+    
+    例如 Qwen2.5-VL-7B-Instruct-Q4_K_M.gguf 与 mmproj-Qwen2.5-VL-7B-Instruct-f16.gguf
+    都得到 qwen2.5-vl-7b-instruct
+    
+    Args:
+        filename: 文件名
+    
+    Returns:
+        规范化基础名
+    """
+    name = os.path.basename(filename).lower()
+    if name.endswith('.gguf'):
+        name = name[:-5]
+    
+    name = _MMPROJ_TOKEN_RE.sub('', name)
+    
+    previous = None
+    while previous != name:
+        previous = name
+        name = _QUANT_SUFFIX_RE.sub('', name)
+    
+    return name.strip('-_.')
+
+
+def is_mmproj_filename(filename: str) -> bool:
+    """判断文件名是否为 mmproj 文件"""
+    name = filename.lower()
+    return 'mmproj' in name and name.endswith('.gguf')
+
 
 class MMProjFinder:
     """MMProj 文件查找器"""
@@ -236,3 +281,165 @@ class MMProjFinder:
         # 移除量化后缀
         base_name = re.sub(r'[-.]Q\d+_\d+\.gguf$', '', model_filename)
         return base_name + ".mmproj-f16.gguf"
+
+
+class MMProjIndex:
+    """mmproj 配对索引（基于 ModelIndex 的文件列表一次性构建）"""
+    
+    def __init__(self, model_index):
+        """
+        初始化 mmproj 索引
+        
+        Args:
+            model_index: ModelIndex 实例
+        """
+        self.model_index = model_index
+        self._lock = threading.Lock()
+        self._generation = None
+        self._by_key: Dict[str, List[str]] = {}
+        self._by_dir: Dict[str, List[str]] = {}
+    
+    def _ensure_built(self):
+        """模型索引发生变化时重建映射"""
+        self.model_index.get_models()  # 触发模型索引的增量刷新
+        if self._generation == self.model_index.generation:
+            return
+        
+        with self._lock:
+            if self._generation == self.model_index.generation:
+                return
+            
+            by_key: Dict[str, List[str]] = {}
+            by_dir: Dict[str, List[str]] = {}
+            for root, rel_path, _, _ in self.model_index.get_file_entries():
+                filename = os.path.basename(rel_path)
+                if not is_mmproj_filename(filename):
+                    continue
+                full_path = os.path.join(root, rel_path)
+                by_key.setdefault(mmproj_base_key(filename), []).append(full_path)
+                by_dir.setdefault(os.path.dirname(full_path), []).append(full_path)
+            
+            self._by_key = by_key
+            self._by_dir = by_dir
+            self._generation = self.model_index.generation
+    
+    def list_in_dir(self, directory: str) -> List[str]:
+        """
+        列出目录中的 mmproj 文件（替代 os.walk）
+        
+        Args:
+            directory: 目录路径
+        
+        Returns:
+            mmproj 完整路径列表（包含子目录）
+        """
+        self._ensure_built()
+        directory = os.path.normcase(os.path.realpath(directory))
+        prefix = directory.rstrip(os.sep) + os.sep
+        
+        result = []
+        for dir_path, paths in self._by_dir.items():
+            if dir_path == directory or dir_path.startswith(prefix):
+                result.extend(paths)
+        return sorted(result)
+    
+    def candidates(self, model_filename: str) -> List[str]:
+        """
+        获取同一基础模型的 mmproj 文件（字典查找）
+        
+        精确匹配优先；没有精确匹配时，使用基础名为模型名前缀的 mmproj
+        （例如微调模型 xxx-instruct-abliterated 使用 xxx-instruct 的 mmproj）
+        
+        Args:
+            model_filename: 模型文件名
+        
+        Returns:
+            候选 mmproj 完整路径列表
+        """
+        self._ensure_built()
+        key = mmproj_base_key(model_filename)
+        if key in self._by_key:
+            return list(self._by_key[key])
+        
+        # 去掉末尾最多两段后缀再查找（按分隔符截断）
+        parts = re.split(r'(?<=[^-_.])(?=[-_.])', key)
+        for end in range(len(parts) - 1, max(len(parts) - 3, 0), -1):
+            prefix = ''.join(parts[:end])
+            if prefix in self._by_key:
+                return list(self._by_key[prefix])
+        
+        return []
+    
+    @staticmethod
+    def _score(model_path: Optional[str], mmproj_path: str) -> Tuple[int, int]:
+        """
+        计算配对得分
+        
+        元数据只用于排序，不排除候选：新版转换脚本在 clip.vision.projection_dim 中保存 LLM 的 n_embd，
+        旧版 llava / qwen2vl surgery 脚本生成的 mmproj 保存的是视觉投影宽度（如 LLaVA-1.5 为 768），
+        与 n_embd 不同时仍可能是正确的配对
+        
+        Returns:
+            (元数据兼容性, 是否同目录)；元数据兼容性 1 表示一致，0 表示未知，-1 表示不一致
+        """
+        metadata_score = 0
+        if model_path:
+            model_meta = get_gguf_metadata(model_path)
+            mmproj_meta = get_gguf_metadata(mmproj_path)
+            if model_meta is not None and mmproj_meta is not None:
+                projection_dim = mmproj_meta.get('clip.vision.projection_dim')
+                embedding_length = model_meta.embedding_length
+                if projection_dim and embedding_length:
+                    metadata_score = 1 if projection_dim == embedding_length else -1
+        
+        same_dir = int(bool(model_path) and os.path.dirname(model_path) == os.path.dirname(mmproj_path))
+        return metadata_score, same_dir
+    
+    def rank(self, model_filename: str, model_path: str = None) -> List[Tuple[str, Tuple[int, int]]]:
+        """
+        对候选 mmproj 文件排序
+        
+        Args:
+            model_filename: 模型文件名
+            model_path: 模型完整路径（用于读取元数据和判断目录）
+        
+        Returns:
+            [(mmproj_path, score), ...]，按得分从高到低排序
+        """
+        scored = [(path, self._score(model_path, path)) for path in self.candidates(model_filename)]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+    
+    def find(self, model_filename: str, model_path: str = None) -> Optional[str]:
+        """
+        查找最匹配的 mmproj 文件（元数据一致的优先）
+        
+        Args:
+            model_filename: 模型文件名
+            model_path: 模型完整路径
+        
+        Returns:
+            mmproj 完整路径，未找到返回 None
+        """
+        ranked = self.rank(model_filename, model_path)
+        return ranked[0][0] if ranked else None
+
+
+# 全局索引缓存（按模型索引区分）
+_mmproj_indexes: Dict[int, MMProjIndex] = {}
+
+
+def get_mmproj_index(model_index) -> MMProjIndex:
+    """
+    获取模型索引对应的 mmproj 索引（带缓存）
+    
+    Args:
+        model_index: ModelIndex 实例
+    
+    Returns:
+        MMProjIndex 实例
+    """
+    key = id(model_index)
+    if key not in _mmproj_indexes:
+        _mmproj_indexes[key] = MMProjIndex(model_index)
+    return _mmproj_indexes[key]
@@ -6,6 +6,8 @@ MMProj Validator - 验证 mmproj 文件兼容性
 import os
 from typing import Dict, Optional, Tuple
 
+from .mmproj_finder import mmproj_base_key
+
 
 class MMProjValidator:
     """MMProj 文件验证器"""
@@ -72,11 +74,12 @@ class MMProjValidator:
             'suggestions': []
         }
         
-        base_model = MMProjValidator.extract_base_model_name(model_filename)
-        base_mmproj = MMProjValidator.extract_base_model_name(mmproj_filename)
+        # 规范化基础名（带缓存，重复检查只是字典查找）
+        base_model = mmproj_base_key(model_filename)
+        base_mmproj = mmproj_base_key(mmproj_filename)
         
         # 检查是否是完全匹配
-        if base_model in base_mmproj or base_mmproj in base_model:
+        if base_mmproj and (base_model in base_mmproj or base_mmproj in base_model):
             result['confidence'] = 'high'
             result['compatible'] = True
             return result
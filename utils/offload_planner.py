@@ -0,0 +1,300 @@
+"""
+Offload Planner - GPU 层卸载规划
+根据 GGUF 头部中的层数和每层张量大小，加上 mmproj、KV 缓存和计算缓冲区的占用，
+计算在设备可用显存内最多能卸载多少层（n_gpu_layers）
+
+设备显存通过参数或可替换的探测函数传入，核心计算不依赖 GPU
+"""
+
+import os
+import re
+import subprocess
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+try:
+    from .gguf_reader import GGUFFormatError, get_gguf_metadata
+except ImportError:
+    from utils.gguf_reader import GGUFFormatError, get_gguf_metadata
+
+
+# 为 CUDA 上下文、显存碎片等预留的显存
+DEFAULT_RESERVE_BYTES = 512 * 1024 ** 2
+
+# 环境变量：覆盖预留显存（MB）
+RESERVE_ENV = "GGUF_VLM_GPU_RESERVE_MB"
+
+_BLOCK_TENSOR = re.compile(r'^blk\.(\d+)\.')
+
+
+@dataclass
+class ModelLayout:
+    """模型在 llama.cpp 中的层布局"""
+    
+    n_layers: int
+    # 每个重复层（blk.N.*）的权重字节数
+    layer_bytes: List[int]
+    # 输出层（output / output_norm），n_gpu_layers > n_layers 时卸载
+    output_bytes: int
+    # 始终留在 CPU 的张量（token_embd 等）
+    cpu_bytes: int
+    # 每层 KV 缓存字节数（offload_kqv 时随层卸载）
+    kv_bytes_per_layer: int = 0
+    n_vocab: int = 0
+    n_embd: int = 0
+    n_head: int = 0
+    
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.layer_bytes) + self.output_bytes + self.cpu_bytes
+    
+    @classmethod
+    def from_gguf(cls, model_path: str, n_ctx: int, type_k: str = 'f16', type_v: str = 'f16') -> Optional['ModelLayout']:
+        """
+        从 GGUF 头部读取层布局
+        
+        Args:
+            model_path: GGUF 模型文件路径
+            n_ctx: 上下文长度（用于 KV 缓存大小）
+            type_k: K 缓存类型
+            type_v: V 缓存类型
+        
+        Returns:
+            ModelLayout，元数据不完整时返回 None
+        """
+        metadata = get_gguf_metadata(model_path)
+        if metadata is None or not metadata.block_count:
+            return None
+        try:
+            sizes = metadata.tensor_sizes()
+        except (GGUFFormatError, OSError) as e:
+            print(f"⚠️  Cannot read tensor sizes from {os.path.basename(model_path)}: {e}")
+            return None
+        
+        n_layers = metadata.block_count
+        layer_bytes = [0] * n_layers
+        output_bytes = 0
+        cpu_bytes = 0
+        for name, size in sizes.items():
+            match = _BLOCK_TENSOR.match(name)
+            if match and int(match.group(1)) < n_layers:
+                layer_bytes[int(match.group(1))] += size
+            elif name.startswith('output'):
+                output_bytes += size
+            else:
+                cpu_bytes += size
+        # 输出层与词嵌入共享权重时，卸载输出层需要在 GPU 上复制一份 token_embd
+        if 'output.weight' not in sizes:
+            output_bytes += sizes.get('token_embd.weight', 0)
+        
+        kv_bytes = metadata.kv_cache_bytes(n_ctx, type_k, type_v) or 0
+        return cls(
+            n_layers=n_layers,
+            layer_bytes=layer_bytes,
+            output_bytes=output_bytes,
+            cpu_bytes=cpu_bytes,
+            kv_bytes_per_layer=kv_bytes // n_layers,
+            n_vocab=metadata.vocab_size or 0,
+            n_embd=metadata.embedding_length or 0,
+            n_head=metadata.head_count or 0,
+        )
+
+
+@dataclass
+class OffloadPlan:
+    """卸载规划结果"""
+    
+    # 传给 llama.cpp 的 n_gpu_layers（-1 表示全部）
+    n_gpu_layers: int
+    n_layers: int
+    # 卸载的重复层数
+    offloaded_layers: int
+    # 预计占用的显存
+    gpu_bytes: int
+    free_bytes: int
+    # 显存占用明细
+    breakdown: dict = field(default_factory=dict)
+    
+    @property
+    def full(self) -> bool:
+        return self.n_gpu_layers == -1
+    
+    def describe(self) -> str:
+        """描述规划结果（用于日志）"""
+        gb = 1024 ** 3
+        if self.full:
+            layers = f"all {self.n_layers} layers + output"
+        else:
+            layers = f"{self.offloaded_layers}/{self.n_layers} layers"
+        return f"{layers} on GPU, ~{self.gpu_bytes / gb:.2f} GB of {self.free_bytes / gb:.2f} GB free"
+
+
+def estimate_compute_buffer(layout: ModelLayout, n_ctx: int, n_ubatch: int = 512, flash_attn: bool = False) -> int:
+    """
+    估算 GPU 计算缓冲区大小（偏保守）
+    
+    主要由输出 logits（n_ubatch × n_vocab）、注意力分数矩阵（未启用 flash attention 时为
+    n_ubatch × n_ctx × n_head）和若干个 n_ubatch × n_embd 的中间张量组成
+    
+    Args:
+        layout: 模型层布局
+        n_ctx: 上下文长度
+        n_ubatch: 物理批大小
+        flash_attn: 是否启用 flash attention
+    
+    Returns:
+        字节数
+    """
+    per_token = layout.n_vocab + 8 * layout.n_embd
+    if not flash_attn:
+        per_token += n_ctx * layout.n_head
+    return int(n_ubatch * per_token * 4)
+
+
+def _reserve_bytes() -> int:
+    value = os.environ.get(RESERVE_ENV)
+    if value:
+        try:
+            return int(float(value) * 1024 ** 2)
+        except ValueError:
+            print(f"⚠️  Ignoring invalid {RESERVE_ENV}={value!r}")
+    return DEFAULT_RESERVE_BYTES
+
+
+def plan_offload(
+    layout: ModelLayout,
+    free_bytes: int,
+    n_ctx: int,
+    mmproj_bytes: int = 0,
+    n_ubatch: int = 512,
+    flash_attn: bool = False,
+    reserve_bytes: int = None,
+) -> OffloadPlan:
+    """
+    计算在可用显存内能卸载的最多层数
+    
+    与 llama.cpp 的分配方式一致：从最后一层开始向前卸载，n_gpu_layers 超过层数时输出层也放到 GPU；
+    每个卸载的层同时占用其权重和对应的 KV 缓存
+    
+    Args:
+        layout: 模型层布局
+        free_bytes: 设备可用显存
+        n_ctx: 上下文长度
+        mmproj_bytes: mmproj（视觉编码器）大小，加载在 GPU 上
+        n_ubatch: 物理批大小（影响计算缓冲区）
+        flash_attn: 是否启用 flash attention（影响计算缓冲区）
+        reserve_bytes: 预留显存，None 时使用默认值或环境变量
+    
+    Returns:
+        OffloadPlan
+    """
+    if reserve_bytes is None:
+        reserve_bytes = _reserve_bytes()
+    compute_bytes = estimate_compute_buffer(layout, n_ctx, n_ubatch, flash_attn)
+    fixed = mmproj_bytes + compute_bytes + reserve_bytes
+    budget = free_bytes - fixed
+    
+    used = 0
+    offloaded = 0
+    for index in reversed(range(layout.n_layers)):
+        cost = layout.layer_bytes[index] + layout.kv_bytes_per_layer
+        if used + cost > budget:
+            break
+        used += cost
+        offloaded += 1
+    
+    full = offloaded == layout.n_layers and used + layout.output_bytes <= budget
+    if full:
+        used += layout.output_bytes
+    
+    breakdown = {
+        'layers': used - (layout.output_bytes if full else 0) - offloaded * layout.kv_bytes_per_layer,
+        'kv_cache': offloaded * layout.kv_bytes_per_layer,
+        'output': layout.output_bytes if full else 0,
+        'mmproj': mmproj_bytes,
+        'compute': compute_bytes,
+        'reserve': reserve_bytes,
+    }
+    gpu_bytes = used + (fixed if offloaded else mmproj_bytes)
+    return OffloadPlan(
+        n_gpu_layers=-1 if full else offloaded,
+        n_layers=layout.n_layers,
+        offloaded_layers=offloaded,
+        gpu_bytes=gpu_bytes,
+        free_bytes=free_bytes,
+        breakdown=breakdown,
+    )
+
+
+def probe_device_memory(device_index: int = 0) -> Optional[Tuple[int, int]]:
+    """
+    查询 GPU 的可用显存和总显存
+    
+    Args:
+        device_index: GPU 序号
+    
+    Returns:
+        (可用字节数, 总字节数)，没有 GPU 或无法查询时返回 None
+    """
+    try:
+        import torch
+        if torch.cuda.is_available():
+            free, total = torch.cuda.mem_get_info(device_index)
+            return int(free), int(total)
+    except Exception:
+        pass
+    try:
+        result = subprocess.run(
+            ['nvidia-smi', f'--id={device_index}', '--query-gpu=memory.free,memory.total',
+             '--format=csv,noheader,nounits'],
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=5
+        )
+        free_mb, total_mb = result.stdout.strip().split('\n')[0].split(',')
+        return int(float(free_mb)) * 1024 ** 2, int(float(total_mb)) * 1024 ** 2
+    except Exception:
+        return None
+
+
+def plan_gpu_layers(
+    model_path: str,
+    mmproj_path: str = None,
+    n_ctx: int = 8192,
+    type_k: str = 'f16',
+    type_v: str = 'f16',
+    n_ubatch: int = 512,
+    flash_attn: bool = False,
+    free_bytes: int = None,
+    memory_probe: Callable[[], Optional[Tuple[int, int]]] = probe_device_memory,
+) -> Optional[OffloadPlan]:
+    """
+    为模型规划 n_gpu_layers
+    
+    Args:
+        model_path: GGUF 模型文件路径
+        mmproj_path: mmproj 文件路径（视觉模型）
+        n_ctx: 上下文长度
+        type_k: K 缓存类型
+        type_v: V 缓存类型
+        n_ubatch: 物理批大小
+        flash_attn: 是否启用 flash attention
+        free_bytes: 设备可用显存，None 时调用 memory_probe 查询
+        memory_probe: 显存查询函数，返回 (可用, 总量)（测试时可替换为模拟设备）
+    
+    Returns:
+        OffloadPlan，没有 GPU 或无法读取模型布局时返回 None
+    """
+    if free_bytes is None:
+        memory = memory_probe()
+        if memory is None:
+            return None
+        free_bytes = memory[0]
+    
+    layout = ModelLayout.from_gguf(model_path, n_ctx, type_k, type_v)
+    if layout is None:
+        return None
+    
+    mmproj_bytes = os.path.getsize(mmproj_path) if mmproj_path and os.path.exists(mmproj_path) else 0
+    return plan_offload(layout, free_bytes, n_ctx, mmproj_bytes, n_ubatch, flash_attn)
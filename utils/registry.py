@@ -1,40 +1,202 @@
 """
 Registry Manager - 管理模型注册表
+进程内共享一个实例（get_registry_manager），YAML 修改后按 mtime 自动重新加载，
+解析结果以 JSON 快照保存在缓存目录中，冷启动时跳过 YAML 解析
 """
 
+import copy
+import hashlib
+import json
 import os
+import threading
 import yaml
 import re
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
+try:
+    from ..config.paths import PathConfig
+except (ImportError, ValueError):
+    try:
+        from config.paths import PathConfig
+    except ImportError:
+        PathConfig = None
+
+# 优先使用 libyaml 的 C 解析器
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# 快照格式版本（快照结构变化时递增）
+_SNAPSHOT_VERSION = 2
+
+
+def _default_config_path() -> str:
+    """默认注册表文件路径"""
+    return os.path.join(os.path.dirname(__file__), "..", "model_registry.yaml")
+
 
 class RegistryManager:
     """模型注册表管理器 - 重构版"""
     
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, use_snapshot: bool = True):
         """
         初始化注册表管理器
         
         Args:
             config_path: YAML 配置文件路径
+            use_snapshot: 是否使用（并写入）预解析的 JSON 快照
         """
         if config_path is None:
-            config_path = os.path.join(os.path.dirname(__file__), "..", "model_registry.yaml")
+            config_path = _default_config_path()
         
         self.config_path = config_path
-        self.config = self._load_config()
+        self.use_snapshot = use_snapshot
         self._cache = {}
+        self._signature = self._file_signature()
+        
+        if not self._load_snapshot(self._signature):
+            self.config = self._load_config()
+            self._save_snapshot(self._signature)
+        self._build_indexes()
     
     def _load_config(self) -> dict:
         """加载 YAML 配置文件"""
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+                return yaml.load(f, Loader=_YAML_LOADER) or {}
         except Exception as e:
             print(f"❌ Failed to load registry config: {e}")
             return {}
     
+    def _file_signature(self) -> Optional[Tuple[int, int]]:
+        """获取配置文件签名 (mtime_ns, size)，文件不存在时返回 None"""
+        try:
+            stat = os.stat(self.config_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+    
+    def _snapshot_path(self) -> Optional[str]:
+        """获取快照文件路径（按配置文件路径区分）"""
+        if not self.use_snapshot or PathConfig is None:
+            return None
+        try:
+            cache_dir = PathConfig.get_cache_dir()
+        except Exception:
+            return None
+        path_hash = hashlib.sha1(os.path.abspath(self.config_path).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(cache_dir, f"registry_{path_hash}.json")
+    
+    def _load_snapshot(self, signature: Optional[Tuple[int, int]]) -> bool:
+        """
+        从快照恢复解析后的配置（索引由调用方重新构建）
+        
+        Args:
+            signature: 当前配置文件签名
+        
+        Returns:
+            是否成功恢复（快照缺失或已过期时返回 False）
+        """
+        snapshot_path = self._snapshot_path()
+        if signature is None or snapshot_path is None or not os.path.exists(snapshot_path):
+            return False
+        
+        try:
+            with open(snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable registry snapshot: {e}")
+            return False
+        
+        if (not isinstance(snapshot, dict)
+                or snapshot.get('version') != _SNAPSHOT_VERSION
+                or snapshot.get('signature') != list(signature)
+                or not isinstance(snapshot.get('config'), dict)):
+            return False
+        
+        self.config = snapshot['config']
+        return True
+    
+    def _save_snapshot(self, signature: Optional[Tuple[int, int]]):
+        """将解析后的配置写入快照（先写临时文件再替换，避免读到半个文件）"""
+        snapshot_path = self._snapshot_path()
+        if signature is None or snapshot_path is None:
+            return
+        
+        snapshot = {'version': _SNAPSHOT_VERSION, 'signature': list(signature), 'config': self.config}
+        
+        tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                # YAML 中的日期等非 JSON 类型会抛出 TypeError，此时不写快照
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, snapshot_path)
+        except Exception as e:
+            print(f"⚠️  Failed to write registry snapshot: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    def reload_if_changed(self) -> bool:
+        """
+        配置文件的 mtime/大小发生变化时重新加载
+        
+        Returns:
+            是否重新加载
+        """
+        signature = self._file_signature()
+        if signature == self._signature:
+            return False
+        
+        self.reload()
+        return True
+    
+    def _build_indexes(self):
+        """
+        构建只读索引（加载/重新加载配置时执行一次）
+        
+        - 文件名 -> 模型信息
+        - 业务类型 -> 模型列表
+        - (系列, 模型名) -> mmproj
+        - 预编译的 matching_rules 正则
+        """
+        models = tuple(self._collect_models())
+        
+        by_business_type: Dict[str, List[Dict]] = {}
+        by_filename: Dict[str, Dict] = {}
+        mmproj_by_model: Dict[Tuple[str, str], Optional[str]] = {}
+        
+        for model in models:
+            by_business_type.setdefault(model['business_type'], []).append(model)
+            mmproj_by_model.setdefault((model['series_key'], model['model_name']), model.get('mmproj'))
+            
+            for variant in model['variants']:
+                # 与线性查找保持一致：同名文件以第一个出现的为准
+                by_filename.setdefault(variant['file'].lower(), {
+                    'file': variant['file'],
+                    'repo': model['repo'],
+                    'mmproj': model['mmproj'],
+                    'mmproj_repo': model.get('mmproj_repo'),
+                    'series': model['series'],
+                    'model_name': model['model_name'],
+                    'business_type': model['business_type']
+                })
+        
+        matching_rules = []
+        for rule in (self.config.get('matching_rules') or {}).get('patterns', []) or []:
+            try:
+                compiled = re.compile(rule.get('pattern', ''))
+            except re.error as e:
+                print(f"⚠️  Invalid registry matching rule {rule.get('pattern')!r}: {e}")
+                continue
+            matching_rules.append((compiled, rule.get('series'), rule.get('model')))
+        
+        self._models = models
+        self._by_business_type = {key: tuple(value) for key, value in by_business_type.items()}
+        self._by_filename = by_filename
+        self._mmproj_by_model = mmproj_by_model
+        self._matching_rules = tuple(matching_rules)
+    
     def get_all_models(self, business_type: str = None) -> List[Dict]:
         """
         获取所有模型列表
@@ -43,8 +205,16 @@ class RegistryManager:
             business_type: 业务类型过滤
         
         Returns:
-            模型信息列表
+            模型信息列表（深拷贝，修改不会影响索引）
         """
+        if business_type:
+            models = self._by_business_type.get(business_type, ())
+        else:
+            models = self._models
+        return copy.deepcopy(list(models))
+    
+    def _collect_models(self) -> List[Dict]:
+        """从配置中展开所有模型信息"""
         models = []
         
         for category_key, category_data in self.config.items():
@@ -58,9 +228,6 @@ class RegistryManager:
                 series_name = series_data.get('series_name', series_key)
                 series_business_type = series_data.get('business_type', 'unknown')
                 
-                if business_type and series_business_type != business_type:
-                    continue
-                
                 models_list = series_data.get('models', [])
                 if not isinstance(models_list, list):
                     continue
@@ -109,10 +276,10 @@ class RegistryManager:
         models = self.get_all_models(business_type)
         
         # 获取本地已有模型列表
-        local_models = []
+        local_models = set()
         if model_loader:
             try:
-                local_models = [m.lower() for m in model_loader.list_models()]
+                local_models = {m.lower() for m in model_loader.list_models()}
             except:
                 pass
         
@@ -157,23 +324,8 @@ class RegistryManager:
         Returns:
             模型信息字典
         """
-        filename_lower = filename.lower()
-        
-        models = self.get_all_models()
-        for model in models:
-            for variant in model['variants']:
-                if variant['file'].lower() == filename_lower:
-                    return {
-                        'file': variant['file'],
-                        'repo': model['repo'],
-                        'mmproj': model['mmproj'],
-                        'mmproj_repo': model.get('mmproj_repo'),
-                        'series': model['series'],
-                        'model_name': model['model_name'],
-                        'business_type': model['business_type']
-                    }
-        
-        return None
+        model_info = self._by_filename.get(filename.lower())
+        return dict(model_info) if model_info else None
     
     def smart_match_mmproj(self, model_filename: str) -> Optional[str]:
         """
@@ -193,20 +345,14 @@ class RegistryManager:
         if model_info and model_info.get('mmproj'):
             return model_info['mmproj']
         
-        # 使用匹配规则
-        matching_rules = self.config.get('matching_rules', {}).get('patterns', [])
+        # 使用匹配规则（正则已预编译）
         filename_lower = model_filename.lower()
         
-        for rule in matching_rules:
-            pattern = rule.get('pattern', '')
-            if re.search(pattern, filename_lower):
-                series_key = rule.get('series')
-                model_name = rule.get('model')
-                
-                models = self.get_all_models()
-                for model in models:
-                    if model['series_key'] == series_key and model['model_name'] == model_name:
-                        return model.get('mmproj')
+        for pattern, series_key, model_name in self._matching_rules:
+            if pattern.search(filename_lower):
+                key = (series_key, model_name)
+                if key in self._mmproj_by_model:
+                    return self._mmproj_by_model[key]
         
         return None
     
@@ -253,6 +399,38 @@ class RegistryManager:
     
     def reload(self):
         """重新加载配置文件"""
+        signature = self._file_signature()
         self.config = self._load_config()
         self._cache.clear()
+        self._build_indexes()
+        self._signature = signature
+        self._save_snapshot(signature)
         print("🔄 Registry reloaded")
+
+
+# 全局实例（按配置文件路径区分）
+_registry_managers: Dict[str, RegistryManager] = {}
+_registry_lock = threading.Lock()
+
+
+def get_registry_manager(config_path: str = None) -> RegistryManager:
+    """
+    获取共享的注册表管理器实例（配置文件变化时自动重新加载）
+    
+    Args:
+        config_path: YAML 配置文件路径，为 None 时使用默认注册表
+    
+    Returns:
+        RegistryManager 实例
+    """
+    key = os.path.abspath(config_path or _default_config_path())
+    
+    with _registry_lock:
+        registry = _registry_managers.get(key)
+        if registry is None:
+            registry = RegistryManager(config_path)
+            _registry_managers[key] = registry
+            return registry
+        
+        registry.reload_if_changed()
+        return registry
@@ -7,6 +7,11 @@ import re
 from typing import Dict, List, Optional
 from pathlib import Path
 
+try:
+    from .gguf_reader import GGUFFormatError, read_gguf_metadata
+except (ImportError, ValueError):
+    from utils.gguf_reader import GGUFFormatError, read_gguf_metadata
+
 
 class ModelValidator:
     """模型验证器"""
@@ -28,6 +33,7 @@ class ModelValidator:
             'is_gguf': False,
             'readable': False,
             'size': 0,
+            'metadata': None,
             'errors': []
         }
         
@@ -45,16 +51,14 @@ class ModelValidator:
         
         result['is_gguf'] = True
         
-        # 检查文件是否可读
+        # 检查文件是否可读，并解析头部元数据（只读取 KV 区，不读取张量数据）
         try:
-            with open(file_path, 'rb') as f:
-                # 读取前几个字节检查 GGUF 魔数
-                magic = f.read(4)
-                if magic != b'GGUF':
-                    result['errors'].append("Invalid GGUF file: magic number mismatch")
-                    return result
-            
+            metadata = read_gguf_metadata(file_path)
             result['readable'] = True
+            result['metadata'] = metadata.to_dict()
+        except GGUFFormatError as e:
+            result['errors'].append(str(e))
+            return result
         except Exception as e:
             result['errors'].append(f"Cannot read file: {e}")
             return result